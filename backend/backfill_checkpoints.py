@@ -0,0 +1,54 @@
+"""Checkpoints für fortsetzbare Backfills pro (Ticker, Provider, Fenster).
+
+Redis Hash backfill_checkpoint:{ticker}, Feld "{provider}|{window_start}|{window_end}" -> JSON
+{"candles": n, "inserted": n, "time": ISO}. Ein Fenster wird erst nach erfolgreichem Insert + Commit
+markiert; nur abgeschlossene Fenster (Ende auf UTC-Mitternacht und in der Vergangenheit) werden markiert,
+das laufende Fenster mit dem heutigen Tag wird bei jedem Lauf neu geholt.
+"""
+import json
+from datetime import datetime
+
+KEY_PREFIX = 'backfill_checkpoint'
+
+
+def window_closed(we, now=None):
+    now = now or datetime.utcnow()
+    return (we.hour, we.minute, we.second, we.microsecond) == (0, 0, 0, 0) and we <= now
+
+
+class BackfillCheckpoints:
+    def __init__(self, redis_client, ttl_days=120):
+        self.r = redis_client
+        self.ttl_seconds = ttl_days * 86400
+
+    @staticmethod
+    def _key(ticker):
+        return f'{KEY_PREFIX}:{ticker}'
+
+    @staticmethod
+    def _field(provider, ws, we):
+        return f'{provider}|{ws.isoformat()}|{we.isoformat()}'
+
+    def is_done(self, ticker, provider, ws, we):
+        return bool(self.r.hexists(self._key(ticker), self._field(provider, ws, we)))
+
+    def done_by(self, ticker, ws, we, providers):
+        """Erster Provider mit Checkpoint für das Fenster oder None."""
+        vals = self.r.hmget(self._key(ticker), [self._field(p, ws, we) for p in providers])
+        for p, v in zip(providers, vals):
+            if v is not None:
+                return p
+        return None
+
+    def mark(self, ticker, provider, ws, we, candles, inserted):
+        if not window_closed(we):
+            return False
+        key = self._key(ticker)
+        self.r.hset(key, self._field(provider, ws, we), json.dumps({
+            'candles': candles, 'inserted': inserted, 'time': datetime.utcnow().isoformat()
+        }))
+        self.r.expire(key, self.ttl_seconds)
+        return True
+
+    def clear(self, ticker):
+        self.r.delete(self._key(ticker))
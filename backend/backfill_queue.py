@@ -0,0 +1,128 @@
+"""Deduplizierte Prioritäts-Queue für Backfills (Redis).
+
+Keys:
+    backfill_queue            ZSET ticker -> Priorität (ein Eintrag pro Ticker, die höhere Priorität bleibt)
+    backfill_queue:payload    Hash ticker -> JSON Auftrag ({"days": n} oder {"ranges": [[start, end], ...]})
+    backfill_lease:{ticker}   String Token, SET NX EX = Ticker wird gerade gebackfillt
+    backfill_inflight         ZSET ticker -> Lease-Ablauf (Zählung laufender Backfills für den Consumer)
+
+Enqueue und Claim laufen als Lua Scripts (atomar, ohne ZADD GT / ZPOPMAX -> auch mit älteren Redis Versionen).
+
+Priorität = Daten-Defizit (0..1) * 100 + Bonus für gehaltene Positionen (portfolio_positions) und grok_top10.
+"""
+import json
+import time
+import uuid
+
+QUEUE_KEY = 'backfill_queue'
+PAYLOAD_KEY = 'backfill_queue:payload'
+INFLIGHT_KEY = 'backfill_inflight'
+LEASE_PREFIX = 'backfill_lease'
+
+DEFICIT_WEIGHT = 100.0
+PORTFOLIO_BONUS = 50.0
+TOP10_BONUS = 25.0
+
+_ENQUEUE_LUA = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return 0
+end
+local cur = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if (not cur) or tonumber(ARGV[2]) > tonumber(cur) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+return 1
+"""
+
+# Freie Slots prüfen, höchste Priorität entnehmen + Lease setzen (ein Script: parallele Drains können max_inflight
+# nicht gemeinsam überschreiten); läuft der Ticker bereits wird der Eintrag verworfen
+_CLAIM_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[4])
+if redis.call('ZCARD', KEYS[3]) >= tonumber(ARGV[5]) then
+    return false
+end
+local top = redis.call('ZREVRANGE', KEYS[1], 0, 0)
+if #top == 0 then
+    return false
+end
+local ticker = top[1]
+redis.call('ZREM', KEYS[1], ticker)
+local payload = redis.call('HGET', KEYS[2], ticker) or ''
+redis.call('HDEL', KEYS[2], ticker)
+local lease_key = ARGV[1] .. ':' .. ticker
+if not redis.call('SET', lease_key, ARGV[2], 'NX', 'EX', tonumber(ARGV[3])) then
+    return {ticker, payload, 0}
+end
+redis.call('ZADD', KEYS[3], tonumber(ARGV[4]) + tonumber(ARGV[3]), ticker)
+return {ticker, payload, 1}
+"""
+
+# Lease nur freigeben wenn sie noch dem Aufrufer gehört (abgelaufene Lease evtl. neu vergeben)
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    redis.call('ZREM', KEYS[2], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+def backfill_priority(deficit, held=False, top10=False):
+    deficit = min(max(float(deficit), 0.0), 1.0)
+    return round(deficit * DEFICIT_WEIGHT + (PORTFOLIO_BONUS if held else 0.0) + (TOP10_BONUS if top10 else 0.0), 3)
+
+
+class BackfillQueue:
+    def __init__(self, redis_client, lease_seconds=1800):
+        self.r = redis_client
+        self.lease_seconds = lease_seconds
+        self._enqueue = self.r.register_script(_ENQUEUE_LUA)
+        self._claim = self.r.register_script(_CLAIM_LUA)
+        self._release = self.r.register_script(_RELEASE_LUA)
+
+    @staticmethod
+    def _lease_key(ticker):
+        return f'{LEASE_PREFIX}:{ticker}'
+
+    def in_flight(self, ticker):
+        return bool(self.r.exists(self._lease_key(ticker)))
+
+    def enqueue(self, ticker, priority, payload):
+        """False wenn der Ticker gerade läuft (in-flight Dedupe), sonst eingereiht/aktualisiert."""
+        return bool(self._enqueue(keys=[QUEUE_KEY, PAYLOAD_KEY, self._lease_key(ticker)],
+                                  args=[ticker, priority, json.dumps(payload)]))
+
+    def inflight_count(self):
+        self.r.zremrangebyscore(INFLIGHT_KEY, '-inf', time.time())
+        return int(self.r.zcard(INFLIGHT_KEY))
+
+    def claim(self, max_inflight, max_items):
+        """Höchste Prioritäten entnehmen und leasen -> [(ticker, payload, token)], begrenzt durch max_inflight.
+
+        Die Inflight-Prüfung läuft je Claim im Lua Script, parallele Consumer zählen also gemeinsam.
+        """
+        claimed = []
+        while len(claimed) < max_items:
+            token = uuid.uuid4().hex
+            res = self._claim(keys=[QUEUE_KEY, PAYLOAD_KEY, INFLIGHT_KEY],
+                              args=[LEASE_PREFIX, token, self.lease_seconds, time.time(), max_inflight])
+            if not res:
+                break  # Queue leer oder alle Slots belegt
+            ticker, raw, leased = [x.decode() if isinstance(x, bytes) else x for x in res]
+            if not int(leased):
+                continue  # läuft bereits (paralleler Consumer / manueller Backfill)
+            claimed.append((ticker, json.loads(raw) if raw else {}, token))
+        return claimed
+
+    def release(self, ticker, token):
+        return bool(self._release(keys=[self._lease_key(ticker), INFLIGHT_KEY], args=[token, ticker]))
+
+    def snapshot(self, limit=20):
+        items = self.r.zrevrange(QUEUE_KEY, 0, limit - 1, withscores=True)
+        return {
+            'queued': int(self.r.zcard(QUEUE_KEY)),
+            'inflight': self.inflight_count(),
+            'top': [{'ticker': m.decode() if isinstance(m, bytes) else m, 'priority': s} for m, s in items]
+        }
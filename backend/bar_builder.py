@@ -0,0 +1,123 @@
+"""15-Minuten OHLCV Bar-Builder aus Snapshot-Quotes (fetch_data, alle 5 Minuten).
+
+Jeder Snapshot wird dem UTC-aligned Slot floor(ts / 900) * 900 zugeordnet. Pro (Ticker, Slot)
+hält ein Redis Hash die laufenden OHLC Werte und das Volumen-Delta (Quote-Volumen ist kumulatives
+Tagesvolumen -> Differenz zum letzten Snapshot). Abgelaufene Slots werden genau einmal mit einem
+einzigen Bulk-Insert in market_data finalisiert. Snapshot-Bars sind die ungenaueste Quelle (~3 Samples
+je Slot): vorhandene Provider-/Backfill-/Stream-Candles werden nie überschrieben (ON CONFLICT DO NOTHING),
+verspätete Snapshots für bereits abgelaufene Slots werden verworfen statt den Slot erneut zu öffnen. Die Bars
+tragen source 'snapshot', damit später eintreffende Provider-Candles sie ersetzen (historical_candles.insert_candles).
+
+Redis Keys:
+    bar_builder:{ticker}:{slot}   Hash open/high/low/close/volume/updates
+    bar_builder:open_slots        Set "{ticker}|{slot}" noch nicht finalisierter Slots
+    bar_builder:last_volume       Hash ticker -> letztes kumulatives Volumen
+"""
+import logging
+from datetime import datetime, timezone
+from psycopg2.extras import execute_values
+
+SLOT_SECONDS = 900
+KEY_PREFIX = 'bar_builder'
+KEY_OPEN_SLOTS = f'{KEY_PREFIX}:open_slots'
+KEY_LAST_VOLUME = f'{KEY_PREFIX}:last_volume'
+
+# Atomare Aktualisierung (mehrere fetch_data Läufe können sich überlappen)
+_UPDATE_LUA = """
+local k = KEYS[1]
+local p = tonumber(ARGV[1])
+local cum = tonumber(ARGV[2])
+local ticker = ARGV[3]
+local delta = 0
+if cum >= 0 then
+    local last = redis.call('HGET', KEYS[2], ticker)
+    if last then
+        last = tonumber(last)
+        if cum >= last then delta = cum - last else delta = cum end
+    end
+    redis.call('HSET', KEYS[2], ticker, cum)
+end
+if redis.call('EXISTS', k) == 0 then
+    redis.call('HMSET', k, 'open', p, 'high', p, 'low', p, 'close', p, 'volume', delta, 'updates', 1)
+else
+    if p > tonumber(redis.call('HGET', k, 'high')) then redis.call('HSET', k, 'high', p) end
+    if p < tonumber(redis.call('HGET', k, 'low')) then redis.call('HSET', k, 'low', p) end
+    redis.call('HSET', k, 'close', p)
+    redis.call('HINCRBYFLOAT', k, 'volume', delta)
+    redis.call('HINCRBY', k, 'updates', 1)
+end
+redis.call('EXPIRE', k, tonumber(ARGV[4]))
+redis.call('SADD', KEYS[3], ARGV[5])
+return 1
+"""
+
+
+def slot_start(epoch, slot_seconds=SLOT_SECONDS):
+    return int(epoch // slot_seconds) * slot_seconds
+
+
+class SnapshotBarBuilder:
+    def __init__(self, redis_client, slot_seconds=SLOT_SECONDS, ttl_seconds=6 * 3600):
+        self.r = redis_client
+        self.slot_seconds = slot_seconds
+        self.ttl_seconds = ttl_seconds
+        self._update = self.r.register_script(_UPDATE_LUA)
+
+    def _key(self, ticker, slot):
+        return f'{KEY_PREFIX}:{ticker}:{slot}'
+
+    def update(self, ticker, price, cum_volume=None, ts=None):
+        """Registriert einen Snapshot. cum_volume = kumulatives Tagesvolumen (None/0 -> kein Delta)."""
+        if price is None:
+            return None
+        epoch = (ts or datetime.now(timezone.utc)).timestamp()
+        slot = slot_start(epoch, self.slot_seconds)
+        if slot + self.slot_seconds <= datetime.now(timezone.utc).timestamp():
+            # Slot ist abgelaufen (ggf. schon finalisiert) -> nicht erneut öffnen
+            return None
+        self._update(
+            keys=[self._key(ticker, slot), KEY_LAST_VOLUME, KEY_OPEN_SLOTS],
+            args=[float(price), float(cum_volume) if cum_volume else -1, ticker, self.ttl_seconds, f'{ticker}|{slot}']
+        )
+        return slot
+
+    def finalize_due(self, cur, now=None):
+        """Finalisiert alle Slots deren Ende <= now mit einem einzigen Insert. Liefert Anzahl Bars."""
+        now_epoch = (now or datetime.now(timezone.utc)).timestamp()
+        members = [m.decode() if isinstance(m, bytes) else m for m in self.r.smembers(KEY_OPEN_SLOTS)]
+        due = []
+        for m in members:
+            ticker, slot = m.rsplit('|', 1)
+            if int(slot) + self.slot_seconds <= now_epoch:
+                due.append((m, ticker, int(slot)))
+        if not due:
+            return 0
+        rows = []
+        for member, ticker, slot in due:
+            # SREM als Claim: nur ein paralleler Lauf finalisiert den Slot
+            if not self.r.srem(KEY_OPEN_SLOTS, member):
+                continue
+            key = self._key(ticker, slot)
+            h = self.r.hgetall(key)
+            if not h:
+                continue
+            h = {k.decode(): v.decode() for k, v in h.items()}
+            rows.append((
+                datetime.fromtimestamp(slot, tz=timezone.utc), ticker,
+                float(h['open']), float(h['high']), float(h['low']), float(h['close']),
+                int(float(h.get('volume') or 0))
+            ))
+        if not rows:
+            return 0
+        try:
+            execute_values(cur, """
+                INSERT INTO market_data (time, ticker, open, high, low, close, volume, source) VALUES %s
+                ON CONFLICT (time, ticker) DO NOTHING
+            """, rows, template="(%s, %s, %s, %s, %s, %s, %s, 'snapshot')", page_size=1000)
+        except Exception as e:
+            # Slots wieder freigeben, damit der nächste Lauf es erneut versucht
+            logging.error(f"Bar finalize failed ({len(rows)} slots): {e}")
+            self.r.sadd(KEY_OPEN_SLOTS, *[f'{t}|{int(ts.timestamp())}' for ts, t, *_ in rows])
+            return 0
+        self.r.delete(*[self._key(t, int(ts.timestamp())) for ts, t, *_ in rows])
+        return len(rows)
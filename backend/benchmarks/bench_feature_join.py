@@ -0,0 +1,98 @@
+"""Benchmark: YFinance Enhanced Feature-Join (feature_join.py) vs. bisherige Schleife aus worker.py.
+
+Synthetische, realistische Größen: Trainingsfenster 14 Tage 15m Candles pro Ticker, 365 Tage
+yfinance historical_data pro Ticker. Prüft zusätzlich, dass beide Varianten identische Werte liefern.
+
+    python benchmarks/bench_feature_join.py --tickers 20 --days 14
+    python benchmarks/bench_feature_join.py --tickers 100 --skip-legacy
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from feature_join import yfinance_frame, join_yfinance_features, YF_FEATURES, YF_TECHNICAL  # noqa: E402
+
+
+def make_training_frame(tickers, days, rng):
+    end = pd.Timestamp.now('UTC').floor('D')
+    sessions = pd.bdate_range(end - pd.Timedelta(days=days), end, tz='UTC')
+    slots = np.concatenate([(d + pd.Timedelta(hours=13, minutes=30) + pd.to_timedelta(np.arange(26) * 15, unit='min')).values
+                            for d in sessions])
+    times = pd.to_datetime(slots, utc=True)
+    frames = []
+    for t in tickers:
+        close = 100 + rng.standard_normal(len(times)).cumsum()
+        frames.append(pd.DataFrame({'ticker': t, 'time': times, 'open': close, 'high': close + 1,
+                                    'low': close - 1, 'close': close, 'volume': 1000}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def make_payloads(tickers, yf_days, rng):
+    dates = pd.bdate_range(end=pd.Timestamp.now('UTC').floor('D'), periods=yf_days).strftime('%Y-%m-%d')
+    payloads = {}
+    for t in tickers:
+        hist = [{'date': d, **{c: float(v) for c, v in zip(YF_TECHNICAL, rng.random(len(YF_TECHNICAL)))}} for d in dates]
+        payloads[t] = {'historical_data': hist, 'fundamentals': {'pe_ratio': 25.0, 'market_cap': 1e12, 'beta': 1.1},
+                       'news': [{}] * 5}
+    return payloads
+
+
+def legacy_join(df, payloads):
+    """Bisherige Implementierung (worker._add_yfinance_enhanced_features vor dem Umbau), Payloads statt Redis."""
+    for feature in YF_FEATURES:
+        df[feature] = None
+    for ticker, yf_data in payloads.items():
+        fundamentals = yf_data.get('fundamentals', {})
+        news_count = len(yf_data.get('news', []))
+        for hist_row in yf_data.get('historical_data', []):
+            ticker_mask = df['ticker'] == ticker
+            date_mask = pd.to_datetime(df['time']).dt.strftime('%Y-%m-%d') == hist_row['date']
+            m = ticker_mask & date_mask
+            if m.any():
+                for c in YF_TECHNICAL:
+                    df.loc[m, c] = hist_row.get(c)
+                df.loc[m, 'pe_ratio'] = fundamentals.get('pe_ratio')
+                df.loc[m, 'market_cap'] = fundamentals.get('market_cap')
+                df.loc[m, 'beta'] = fundamentals.get('beta')
+                df.loc[m, 'news_sentiment_avg'] = 0.5
+                df.loc[m, 'news_count'] = news_count
+    return df
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--tickers', type=int, default=20)
+    p.add_argument('--days', type=int, default=14)
+    p.add_argument('--yf-days', type=int, default=250)
+    p.add_argument('--repeat', type=int, default=5)
+    p.add_argument('--skip-legacy', action='store_true')
+    args = p.parse_args()
+
+    rng = np.random.default_rng(42)
+    tickers = [f'T{i:03d}' for i in range(args.tickers)]
+    df = make_training_frame(tickers, args.days, rng)
+    payloads = make_payloads(tickers, args.yf_days, rng)
+    print(f"rows={len(df)} tickers={len(tickers)} yf_rows={len(tickers) * args.yf_days}")
+
+    best = float('inf')
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        new = join_yfinance_features(df, yfinance_frame(payloads))
+        best = min(best, time.perf_counter() - t0)
+    print(f"feature_join: {best * 1000:.1f} ms (best of {args.repeat})")
+
+    if not args.skip_legacy:
+        t0 = time.perf_counter()
+        old = legacy_join(df.copy(), payloads)
+        legacy = time.perf_counter() - t0
+        print(f"legacy loop:  {legacy:.2f} s  -> speedup x{legacy / best:.0f}")
+        same = np.allclose(old[YF_FEATURES].astype(float).values, new[YF_FEATURES].astype(float).values, equal_nan=True)
+        print(f"identical values: {same}")
+
+
+if __name__ == '__main__':
+    main()
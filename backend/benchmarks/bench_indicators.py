@@ -0,0 +1,104 @@
+"""Benchmark: Indikator-Kernels (indicators.py, Ticker x Zeit Matrix) vs. pandas rolling/ewm pro Ticker.
+
+Synthetische 15m Candles (26 Slots je Handelstag). Misst Batch über alle Ticker, den inkrementellen Schritt
+(eine neue Bar je Ticker) und die Pipeline-Stufe (Long-Frame -> Matrix -> Long-Frame). Prüft, dass SMA/RSI/
+Bollinger/ATR mit der pandas-Variante übereinstimmen.
+
+    python benchmarks/bench_indicators.py --tickers 20 --days 30
+    python benchmarks/bench_indicators.py --tickers 500 --days 30
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import indicators  # noqa: E402
+from feature_pipeline import FeaturePipeline, Indicators  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_feature_join import make_training_frame  # noqa: E402
+
+
+def pandas_per_ticker(df):
+    """Bisheriger Stil (yfinance_enhanced_service.py): pandas rolling je Ticker."""
+    out = []
+    for _, g in df.groupby('ticker', sort=False):
+        close = g['close']
+        res = pd.DataFrame(index=g.index)
+        res['ind_sma_20'] = close.rolling(20).mean()
+        res['ind_sma_50'] = close.rolling(50).mean()
+        delta = close.diff()
+        gain = delta.where(delta > 0, 0).rolling(14).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+        res['ind_rsi_14'] = 100 - 100 / (1 + gain / loss)
+        res['ind_macd'] = close.ewm(span=12).mean() - close.ewm(span=26).mean()
+        res['ind_macd_signal'] = res['ind_macd'].ewm(span=9).mean()
+        mid = close.rolling(20).mean()
+        sd = close.rolling(20).std()
+        res['ind_bb_upper'] = mid + 2 * sd
+        res['ind_bb_lower'] = mid - 2 * sd
+        prev = close.shift()
+        tr = pd.concat([g['high'] - g['low'], (g['high'] - prev).abs(), (g['low'] - prev).abs()], axis=1).max(axis=1)
+        res['ind_atr_14'] = tr.rolling(14).mean()
+        day = pd.to_datetime(g['time']).dt.tz_convert('US/Eastern').dt.date
+        tp = (g['high'] + g['low'] + g['close']) / 3
+        res['ind_vwap'] = (tp * g['volume']).groupby(day).cumsum() / g['volume'].groupby(day).cumsum()
+        out.append(res)
+    return pd.concat(out)
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--tickers', type=int, default=20)
+    p.add_argument('--days', type=int, default=30)
+    p.add_argument('--repeat', type=int, default=5)
+    args = p.parse_args()
+
+    rng = np.random.default_rng(42)
+    tickers = [f'T{i:03d}' for i in range(args.tickers)]
+    df = make_training_frame(tickers, args.days, rng)
+    df['high'] = df['close'] + rng.random(len(df))
+    df['low'] = df['close'] - rng.random(len(df))
+    df['volume'] = rng.integers(1000, 5000, len(df)).astype(float)
+    print(f"rows={len(df)} tickers={len(tickers)}")
+
+    pipeline = FeaturePipeline(derive_steps=[Indicators()])
+    t_pipe, derived = best_of(lambda: pipeline.derive(df.copy()), args.repeat)
+    print(f"pipeline stage (long -> matrix -> long): {t_pipe * 1000:.1f} ms")
+
+    n_bars = len(df) // len(tickers)
+    arrays = {c: (df[c].values.reshape(len(tickers), n_bars) if c != 'time'
+                  else np.tile(((df['time'][:n_bars] - pd.Timestamp(0, tz='UTC')) / pd.Timedelta('1s')).values, (len(tickers), 1)))
+              for c in indicators.INPUT_COLUMNS}
+    t_kernel, _ = best_of(lambda: indicators.compute(arrays), args.repeat)
+    print(f"kernels only ({len(tickers)}x{n_bars}): {t_kernel * 1000:.1f} ms")
+
+    tail = {c: v[:, :-1][:, -indicators.LOOKBACK:] for c, v in arrays.items()}
+    new = {c: v[:, -1:] for c, v in arrays.items()}
+    t_inc, _ = best_of(lambda: indicators.update(tail, new), args.repeat)
+    print(f"incremental (1 new bar per ticker): {t_inc * 1000:.2f} ms")
+
+    t_pd, ref = best_of(lambda: pandas_per_ticker(df), max(1, args.repeat // 2))
+    print(f"pandas per ticker: {t_pd * 1000:.1f} ms -> speedup x{t_pd / t_pipe:.1f} (pipeline stage)")
+    for c in ['ind_sma_20', 'ind_sma_50', 'ind_rsi_14', 'ind_bb_upper', 'ind_bb_lower', 'ind_atr_14', 'ind_vwap']:
+        a = derived[c].values
+        b = ref.loc[derived.index, c].values
+        mask = ~np.isnan(a)
+        print(f"  {c}: max abs diff {np.nanmax(np.abs(a[mask] - b[mask])):.2e}")
+
+
+if __name__ == '__main__':
+    main()
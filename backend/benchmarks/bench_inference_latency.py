@@ -0,0 +1,89 @@
+"""Benchmark: Inferenz-Latenz mit/ohne Latenz-Budget (TRAIN_PRESETS / TRAIN_INFER_LIMIT_MS, training_orchestrator.py).
+
+Synthetischer Trainingsframe wie bench_ticker_encoding, Training über training_orchestrator.train_horizon (gleicher
+Code-Pfad wie train_model). Je Variante: Fit-Dauer, MAE auf den jüngsten 20% (Holdout), gewähltes Modell und die von
+train_horizon gemessene predict() Latenz für Batch 1 und Batch = Anzahl Ticker. Benötigt autogluon.
+
+    python benchmarks/bench_inference_latency.py --tickers 100 --days 14 --time-limit 120
+    python benchmarks/bench_inference_latency.py --tickers 500 --limits 0.05 0.2
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from feature_pipeline import FeaturePipeline  # noqa: E402
+from training_orchestrator import write_dataset, train_horizon  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_feature_join import make_training_frame  # noqa: E402
+
+
+def variants(limits):
+    out = {'default': {}, 'deployment': {'TRAIN_PRESETS': 'medium_quality,optimize_for_deployment'}}
+    for ms in limits:
+        out[f'infer_limit={ms}ms'] = {'TRAIN_INFER_LIMIT_MS': str(ms)}
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--tickers', type=int, default=100)
+    p.add_argument('--days', type=int, default=14)
+    p.add_argument('--time-limit', type=int, default=120)
+    p.add_argument('--limits', type=float, nargs='+', default=[0.05, 0.2], help='ms je Zeile')
+    p.add_argument('--num-cpus', type=int, default=os.cpu_count() or 1)
+    args = p.parse_args()
+
+    rng = np.random.default_rng(42)
+    tickers = [f'T{i:03d}' for i in range(args.tickers)]
+    df = FeaturePipeline().derive(make_training_frame(tickers, args.days, rng))
+    df['target_15'] = df.groupby('ticker')['close'].shift(-1)
+    df['grok_sentiment'] = np.nan
+    df['grok_expected_gain'] = np.nan
+    df = df.dropna(subset=['target_15']).reset_index(drop=True)
+    pipeline = FeaturePipeline()
+    X = pipeline.encode(df, pipeline.fit(df), training=True)
+    features = list(X.columns)
+    data = X.assign(target_15=df['target_15'].values, time=df['time'].values)
+    cut = data['time'].quantile(0.8)
+    train, holdout = data[data['time'] < cut], data[data['time'] >= cut]
+    print(f"tickers={args.tickers} rows={len(data)} train={len(train)} holdout={len(holdout)} features={len(features)}")
+
+    from autogluon.tabular import TabularPredictor
+    work = tempfile.mkdtemp(prefix='bench_latency_')
+    try:
+        write_dataset(train, features, ['target_15'], directory=work)
+        for name, env in variants(args.limits).items():
+            saved = {k: os.environ.get(k) for k in ('TRAIN_PRESETS', 'TRAIN_INFER_LIMIT_MS')}
+            os.environ.pop('TRAIN_PRESETS', None)
+            os.environ.pop('TRAIN_INFER_LIMIT_MS', None)
+            os.environ.update(env)
+            path = os.path.join(work, name.replace('=', '_'))
+            try:
+                t0 = time.perf_counter()
+                res = train_horizon(work, 'target_15', path, args.time_limit, args.num_cpus,
+                                    infer_batch_size=args.tickers)
+                fit_s = time.perf_counter() - t0
+                predictor = TabularPredictor.load(path)
+                mae = float(np.mean(np.abs(predictor.predict(holdout[features]).values - holdout['target_15'].values)))
+            finally:
+                for k, v in saved.items():
+                    if v is None:
+                        os.environ.pop(k, None)
+                    else:
+                        os.environ[k] = v
+            inf = res['inference']
+            lat = ' '.join(f"batch {n}: {v['batch_ms']:.1f} ms ({v['row_ms']:.3f} ms/Zeile)" for n, v in inf['latency'].items())
+            print(f"  {name:20s} fit={fit_s:6.1f}s holdout mae={mae:.4f} model={inf['model_best']} | {lat}"
+                  + (f" | budget eingehalten={inf['within_budget']}" if inf['infer_limit_ms'] else ''))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark: Ticker-Encoding One-Hot (get_dummies, bisher) vs. category Spalte (+ optionale Target-Statistik).
+
+Synthetischer Trainingsframe (15m Candles, 26 Slots je Handelstag) über 20/100/500 Ticker. Misst Breite der
+Feature-Matrix, Speicher, fit+encode und die Einzelzeilen-Kodierung (Inferenz). Ist autogluon installiert,
+zusätzlich Trainingszeit, Modellgröße auf Platte und Latenz pro Zeile (--autogluon, kurzes time_limit).
+
+    python benchmarks/bench_ticker_encoding.py --tickers 20 100 500 --days 14
+    python benchmarks/bench_ticker_encoding.py --tickers 100 --autogluon --time-limit 60
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from feature_pipeline import FeaturePipeline, encode_steps  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_feature_join import make_training_frame  # noqa: E402
+
+VARIANTS = {
+    'onehot': dict(ticker_encoding='onehot', target_stats=False),
+    'category': dict(ticker_encoding='category', target_stats=False),
+    'category+stats': dict(ticker_encoding='category', target_stats=True),
+}
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def autogluon_fit(X, y, time_limit):
+    from autogluon.tabular import TabularPredictor
+    path = tempfile.mkdtemp(prefix='bench_enc_')
+    try:
+        data = X.assign(target=y.values)
+        t0 = time.perf_counter()
+        predictor = TabularPredictor(label='target', path=path, verbosity=0).fit(
+            data, time_limit=time_limit, presets='medium_quality')
+        fit_s = time.perf_counter() - t0
+        row = X.tail(1)
+        predictor.predict(row)
+        t_row, _ = best_of(lambda: predictor.predict(row), 5)
+        return {'fit_s': fit_s, 'disk_mb': dir_size(path) / 1e6, 'row_ms': t_row * 1000}
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--tickers', type=int, nargs='+', default=[20, 100, 500])
+    p.add_argument('--days', type=int, default=14)
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--autogluon', action='store_true')
+    p.add_argument('--time-limit', type=int, default=60)
+    args = p.parse_args()
+
+    rng = np.random.default_rng(42)
+    for n in args.tickers:
+        tickers = [f'T{i:03d}' for i in range(n)]
+        df = make_training_frame(tickers, args.days, rng)
+        df = FeaturePipeline().derive(df)
+        df['target_15'] = df.groupby('ticker')['close'].shift(-1)
+        df['grok_sentiment'] = np.where(rng.random(len(df)) < 0.5, rng.random(len(df)), np.nan)
+        df['grok_expected_gain'] = np.where(rng.random(len(df)) < 0.5, rng.random(len(df)), np.nan)
+        df = df.dropna(subset=['target_15'])
+        print(f"tickers={n} rows={len(df)}")
+        for name, kw in VARIANTS.items():
+            pipeline = FeaturePipeline(encode_steps=encode_steps(**kw))
+            t_enc, (state, X) = best_of(lambda: (lambda s: (s, pipeline.encode(df, s)))(pipeline.fit(df)), args.repeat)
+            row = df.tail(1)
+            t_row, _ = best_of(lambda: pipeline.encode(row, state), args.repeat * 10)
+            mem = X.memory_usage(deep=True).sum() / 1e6
+            line = (f"  {name:15s} width={X.shape[1]:4d} memory={mem:8.1f} MB fit+encode={t_enc * 1000:7.1f} ms "
+                    f"encode 1 row={t_row * 1000:.2f} ms")
+            if args.autogluon:
+                try:
+                    res = autogluon_fit(X, df['target_15'], args.time_limit)
+                    line += f" | ag fit={res['fit_s']:.1f}s disk={res['disk_mb']:.1f} MB predict 1 row={res['row_ms']:.1f} ms"
+                except ImportError:
+                    line += ' | autogluon nicht installiert'
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
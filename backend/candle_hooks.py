@@ -0,0 +1,34 @@
+"""Gemeinsamer Hook nach dem Schreiben (ggf. älterer) Candles in market_data.
+
+Feature Store Watermark und Trainings-Snapshot zurücksetzen, Online-State ab der frühesten neuen Candle verwerfen.
+worker._candles_inserted und import_bars.py (eigener Prozess ohne Celery/AutoGluon) nutzen dieselbe Funktion.
+"""
+from feature_store import FeatureStore
+from online_features import OnlineFeatures
+from training_snapshots import TrainingSnapshots
+
+
+def earliest_rows(rows):
+    """(time, ticker, ...) Tupel -> [(früheste time, ticker)] je Ticker."""
+    earliest = {}
+    for row in rows:
+        if row[1] not in earliest or row[0] < earliest[row[1]]:
+            earliest[row[1]] = row[0]
+    return [(t, ticker) for ticker, t in earliest.items()]
+
+
+class CandleHooks:
+    def __init__(self, redis_client, pipeline=None, feature_store=None, training_snapshots=None, online_features=None):
+        self.feature_store = feature_store or FeatureStore(redis_client, pipeline)
+        self.training_snapshots = training_snapshots or TrainingSnapshots(redis_client)
+        self.online_features = online_features or OnlineFeatures(redis_client, pipeline)
+
+    def inserted(self, rows):
+        rows = earliest_rows(rows)
+        if not rows:
+            return 0
+        self.feature_store.rewind_rows(rows)
+        self.training_snapshots.rewind_rows(rows)
+        for since, ticker in rows:
+            self.online_features.invalidate(ticker, since)
+        return len(rows)
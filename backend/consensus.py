@@ -0,0 +1,77 @@
+"""Vektorisierte Konsens-Preis Aggregation über (Ticker x Quellen).
+
+Gemeinsame Regel für worker.fetch_data und multi_api_enhanced_service:
+- Median je Ticker über alle vorhandenen Quellen (NaN = Quelle fehlt)
+- MAD-basierte Ausreißer-Erkennung (robuster z-Score), Konsens = Median der Inlier
+- Abweichung pro Quelle relativ zum Konsens
+- Primärquelle = erste vorhandene Inlier-Quelle gemäß Prioritätsliste
+
+Alles in einem NumPy Durchlauf für alle Ticker, Kosten wachsen nicht mit Python-Schleifen pro Reading.
+"""
+import warnings
+import numpy as np
+
+MAD_Z_THRESHOLD = 3.5
+MIN_REL_DEVIATION = 0.001  # Abweichungen < 0.1% nie als Ausreißer werten (Rundungsunterschiede)
+
+
+def readings_matrix(readings_by_ticker, sources, field='price'):
+    """{ticker: [ {source, price, ...}, ... ]} -> (tickers, ndarray[T, S]) mit NaN für fehlende Werte."""
+    tickers = list(readings_by_ticker.keys())
+    col = {s: i for i, s in enumerate(sources)}
+    mat = np.full((len(tickers), len(sources)), np.nan)
+    for i, t in enumerate(tickers):
+        for rd in readings_by_ticker[t]:
+            j = col.get(rd.get('source'))
+            val = rd.get(field)
+            if j is None or val is None:
+                continue
+            try:
+                mat[i, j] = float(val)
+            except (TypeError, ValueError):
+                continue
+    mat[mat <= 0] = np.nan
+    return tickers, mat
+
+
+def aggregate_consensus(prices, sources, priority, z_threshold=MAD_Z_THRESHOLD, min_rel_deviation=MIN_REL_DEVIATION):
+    """Berechnet Konsens für eine (T x S) Preis-Matrix.
+
+    Rückgabe dict mit Arrays:
+        consensus   (T,)   Median der Inlier (NaN wenn keine Quelle)
+        median      (T,)   Roh-Median aller Quellen
+        inlier      (T,S)  bool, Quelle vorhanden und kein Ausreißer
+        outlier     (T,S)  bool, Quelle vorhanden aber verworfen
+        deviation   (T,S)  (p - consensus) / consensus, NaN wenn Quelle fehlt
+        primary     (T,)   Spaltenindex der Primärquelle, -1 wenn keine
+        n_sources   (T,)   Anzahl vorhandener Quellen
+    """
+    prices = np.asarray(prices, dtype=float)
+    present = ~np.isnan(prices)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)  # All-NaN Zeilen
+        median = np.nanmedian(prices, axis=1)
+        abs_dev = np.abs(prices - median[:, None])
+        mad = np.nanmedian(abs_dev, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            robust_z = 0.6745 * abs_dev / mad[:, None]
+            rel_dev = abs_dev / median[:, None]
+        # mad == 0 (Mehrheit identisch): jede relevante Abweichung ist Ausreißer
+        z_outlier = np.where(mad[:, None] > 0, robust_z > z_threshold, abs_dev > 0)
+        outlier = present & z_outlier & (rel_dev > min_rel_deviation)
+        inlier = present & ~outlier
+        consensus = np.nanmedian(np.where(inlier, prices, np.nan), axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            deviation = (prices - consensus[:, None]) / consensus[:, None]
+    rank = np.array([priority.index(s) if s in priority else len(priority) for s in sources], dtype=float)
+    ranked = np.where(inlier, rank[None, :], np.inf)
+    primary = np.where(inlier.any(axis=1), np.argmin(ranked, axis=1), -1) if ranked.size else np.full(len(prices), -1)
+    return {
+        'consensus': consensus,
+        'median': median,
+        'inlier': inlier,
+        'outlier': outlier,
+        'deviation': deviation,
+        'primary': primary,
+        'n_sources': present.sum(axis=1),
+    }
@@ -0,0 +1,81 @@
+"""Cross-Section Stage: Markt- und Sektor-Aggregate einmal je 15m Zeitstempel, per Merge an jede Ticker-Zeile.
+
+Rendite je Zeile aus den zustandslosen Pipeline-Spalten (price_change / prev_close, price_change_5 / prev_close_5):
+- Markt je time: gleichgewichtetes Mittel über alle Ticker (Index-Proxy), Breadth (Anteil Ticker mit positiver
+  1-Bar Rendite), Dispersion (Std der 1-Bar Renditen). Weniger als MIN_MARKET_TICKERS Ticker -> NaN.
+- Sektor je (time, sector): Mittel und Breadth; Sektor aus yfinance_enhanced:{ticker} fundamentals.sector.
+  Ohne Sektor oder mit weniger als MIN_SECTOR_TICKERS Tickern -> NaN.
+- Relativ je Zeile: 1-Bar Rendite minus Markt- bzw. Sektormittel.
+Markt- und Sektor-Aggregate werden zu einem Frame je (time, sector) zusammengeführt und mit einem einzigen Merge an
+den Zeilen-Frame gehängt. Training rechnet über den ganzen Store-Frame (alle Ticker je Zeitstempel), die Inferenz
+über die letzte Zeile je Ticker (gemeinsamer letzter Slot) - keine Abfragen je Ticker.
+"""
+import numpy as np
+import pandas as pd
+
+UNKNOWN_SECTOR = 'Unknown'
+MIN_MARKET_TICKERS = 3
+MIN_SECTOR_TICKERS = 2
+RETURNS = {'ret_1': ('price_change', 'prev_close'), 'ret_5': ('price_change_5', 'prev_close_5')}
+
+MARKET_COLUMNS = ['mkt_ret_1', 'mkt_ret_5', 'mkt_breadth', 'mkt_dispersion']
+SECTOR_COLUMNS = ['sector_ret_1', 'sector_ret_5', 'sector_breadth']
+RELATIVE_COLUMNS = ['rel_mkt_ret_1', 'rel_sector_ret_1']
+CROSS_SECTION_COLUMNS = MARKET_COLUMNS + SECTOR_COLUMNS + RELATIVE_COLUMNS
+
+
+def ticker_sectors(payloads):
+    """{ticker: payload} (load_yfinance_payloads) -> {ticker: sector}."""
+    out = {}
+    for ticker, data in payloads.items():
+        sector = (data.get('fundamentals') or {}).get('sector')
+        if sector:
+            out[ticker] = sector
+    return out
+
+
+def _returns(df):
+    out = {}
+    for name, (change, base) in RETURNS.items():
+        c = pd.to_numeric(df[change], errors='coerce').to_numpy(dtype=float)
+        b = pd.to_numeric(df[base], errors='coerce').to_numpy(dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[name] = np.where(b != 0, c / b, np.nan)
+    return out
+
+
+def aggregates(times, sectors, rets):
+    """Aggregate je (time, sector) -> DataFrame [time, sector] + MARKET_COLUMNS + SECTOR_COLUMNS."""
+    ret_1 = rets['ret_1']
+    frame = pd.DataFrame({'time': times, 'sector': sectors, 'ret_1': ret_1, 'ret_5': rets['ret_5'],
+                          'up': np.where(np.isnan(ret_1), np.nan, (ret_1 > 0).astype(float))})
+    mkt = frame.groupby('time', sort=False).agg(
+        mkt_ret_1=('ret_1', 'mean'), mkt_ret_5=('ret_5', 'mean'), mkt_breadth=('up', 'mean'),
+        mkt_dispersion=('ret_1', 'std'), n=('ret_1', 'count'))
+    mkt.loc[mkt['n'] < MIN_MARKET_TICKERS, MARKET_COLUMNS] = np.nan
+    sec = frame.groupby(['time', 'sector'], sort=False).agg(
+        sector_ret_1=('ret_1', 'mean'), sector_ret_5=('ret_5', 'mean'), sector_breadth=('up', 'mean'),
+        n=('ret_1', 'count'))
+    unknown = sec.index.get_level_values('sector') == UNKNOWN_SECTOR
+    sec.loc[(sec['n'] < MIN_SECTOR_TICKERS).values | unknown, SECTOR_COLUMNS] = np.nan
+    return sec.drop(columns='n').join(mkt.drop(columns='n'), on='time').reset_index()
+
+
+def join_cross_section(df, sectors):
+    """Cross-Section Spalten an df (ticker, time, Pipeline-Spalten) hängen; vorhandene Spalten werden ersetzt."""
+    base = df.drop(columns=[c for c in CROSS_SECTION_COLUMNS if c in df.columns])
+    out = base.copy()
+    if base.empty:
+        for c in CROSS_SECTION_COLUMNS:
+            out[c] = np.nan
+        return out
+    rets = _returns(base)
+    keys = pd.DataFrame({'time': base['time'].values,
+                         'sector': base['ticker'].map(sectors).fillna(UNKNOWN_SECTOR).values})
+    agg = aggregates(keys['time'].values, keys['sector'].values, rets)
+    merged = keys.merge(agg, on=['time', 'sector'], how='left', sort=False)
+    for c in MARKET_COLUMNS + SECTOR_COLUMNS:
+        out[c] = merged[c].values
+    out['rel_mkt_ret_1'] = rets['ret_1'] - merged['mkt_ret_1'].values
+    out['rel_sector_ret_1'] = rets['ret_1'] - merged['sector_ret_1'].values
+    return out
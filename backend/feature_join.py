@@ -0,0 +1,89 @@
+"""Feature-Join Stage: YFinance Enhanced Daten (Redis yfinance_enhanced:{ticker}) an Trainingsdaten mergen.
+
+Ein normalisierter Frame (ticker, date, Features) aus allen Payloads, danach ein einziger Merge auf
+(ticker, date) statt Schleifen über Ticker x Tage mit Masken über den gesamten Trainingsframe.
+Semantik wie zuvor: Werte (inkl. Fundamentals/News) nur für Zeilen deren Kalendertag in historical_data vorkommt.
+"""
+import json
+import numpy as np
+import pandas as pd
+
+YF_TECHNICAL = ['sma_20', 'sma_50', 'sma_200', 'rsi', 'macd', 'macd_signal',
+                'bb_upper', 'bb_lower', 'volume_ratio']
+YF_STATIC = ['pe_ratio', 'market_cap', 'beta', 'news_sentiment_avg', 'news_count']
+YF_FEATURES = YF_TECHNICAL + YF_STATIC
+
+
+def load_yfinance_payloads(redis_client, tickers):
+    """Alle yfinance_enhanced:{ticker} Payloads mit einem MGET -> {ticker: dict}."""
+    tickers = list(tickers)
+    if not tickers:
+        return {}
+    raw = redis_client.mget([f'yfinance_enhanced:{t}' for t in tickers])
+    out = {}
+    for t, val in zip(tickers, raw):
+        if not val:
+            continue
+        try:
+            out[t] = json.loads(val)
+        except Exception:
+            continue
+    return out
+
+
+def yfinance_frame(payloads):
+    """{ticker: payload} -> DataFrame [ticker, date (datetime64[ns]), YF_FEATURES], eine Zeile je (ticker, date)."""
+    rows = []
+    tickers, counts = [], []
+    static = {c: [] for c in YF_STATIC}
+    for ticker, data in payloads.items():
+        hist = data.get('historical_data') or []
+        if not hist:
+            continue
+        rows.extend(hist)
+        tickers.append(ticker)
+        counts.append(len(hist))
+        fundamentals = data.get('fundamentals') or {}
+        static['pe_ratio'].append(fundamentals.get('pe_ratio'))
+        static['market_cap'].append(fundamentals.get('market_cap'))
+        static['beta'].append(fundamentals.get('beta'))
+        # News Sentiment (vereinfacht: Anzahl News als Proxy für Aktivität, neutrale Baseline)
+        static['news_sentiment_avg'].append(0.5)
+        static['news_count'].append(len(data.get('news') or []))
+    if not rows:
+        return pd.DataFrame(columns=['ticker', 'date'] + YF_FEATURES)
+    # Eine Konvertierung für alle Ticker (list-of-dicts -> Frame läuft in pandas C-Code)
+    yf = pd.DataFrame(rows, columns=['date'] + YF_TECHNICAL)
+    yf['ticker'] = np.repeat(np.array(tickers, dtype=object), counts)
+    yf['date'] = pd.to_datetime(yf['date'], format='%Y-%m-%d', errors='coerce')
+    for c in YF_TECHNICAL:
+        yf[c] = pd.to_numeric(yf[c], errors='coerce')
+    for c, vals in static.items():
+        yf[c] = np.repeat(pd.to_numeric(pd.Series(vals, dtype=object), errors='coerce').values, counts)
+    yf = yf.dropna(subset=['date']).drop_duplicates(['ticker', 'date'], keep='last')
+    return yf[['ticker', 'date'] + YF_FEATURES]
+
+
+def _calendar_day(times):
+    """Kalendertag in der Zeitzone der Werte (wie strftime('%Y-%m-%d')), als datetime64[ns]."""
+    t = pd.to_datetime(times)
+    if isinstance(t.dtype, pd.DatetimeTZDtype):
+        t = t.dt.tz_localize(None)
+    return t.dt.floor('D')
+
+
+def join_yfinance_features(df, yf):
+    """Merge (ticker, Kalendertag von df.time) gegen yfinance_frame; vorhandene YF Spalten werden ersetzt."""
+    base = df.drop(columns=[c for c in YF_FEATURES if c in df.columns])
+    if yf.empty:
+        out = base.copy()
+        for c in YF_FEATURES:
+            out[c] = np.nan
+        return out
+    day = _calendar_day(base['time'])
+    keys = pd.DataFrame({'ticker': base['ticker'].values, 'date': day.values})
+    merged = keys.merge(yf, on=['ticker', 'date'], how='left', sort=False)
+    out = base.copy()
+    for c in YF_FEATURES:
+        out[c] = merged[c].values
+    return out
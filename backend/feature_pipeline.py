@@ -0,0 +1,465 @@
+"""Deklarative Feature-Pipeline für train_model, generate_predictions und diagnose_predictions.
+
+Features werden einmal als Schritte deklariert und vektorisiert (pandas groupby/shift, NumPy) berechnet:
+
+    derive(df, mode)   zustandslose Features (Lags, Differenzen, Volatilität, Zeitanteile) pro Ticker
+                       mode='batch': alle Zeilen (Training), mode='last': nur letzte Zeile je Ticker (Inferenz)
+    derive_online()    dieselben Schritte auf Ringpuffern (online_features.py, O(1) je neuer Bar;
+                       Indikatoren aus indicators.py einmal vektorisiert über alle Ticker)
+    fit(df)            gelernter Zustand aus Trainingsdaten (Grok-Mediane, Ticker-Vokabular, Ticker-Target-Statistik)
+    encode(df, state)  Imputation + Missing-Flags + Ticker-Encoding (category oder One-Hot, optional Target-Statistik)
+                       -> finale Feature-Spalten in fester Reihenfolge; training=True für die Trainingsmatrix
+                       (Target-Statistik je Zeile nur aus zeitlich früheren Zeilen, kein Target-Leak)
+
+Passthrough-Spalten kommen aus vorgelagerten Stages über alle Ticker (feature_join.py: YFinance,
+cross_section.py: Markt-/Sektor-Aggregate je Zeitstempel); fehlende Spalten werden als NaN geführt.
+
+Der Fingerprint (sha256 über Spezifikation + Version) wird mit jedem Modell gespeichert
+(feature_pipeline.json im Modellverzeichnis); Inferenz prüft ihn gegen die aktuelle Pipeline.
+Das Artefakt ist zugleich die Schema-Registry der Modellversion: geordnete Feature-Liste + dtypes
+(schema), Ticker-Vokabular und Imputations-Mediane (state).
+"""
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from feature_join import YF_FEATURES
+from cross_section import CROSS_SECTION_COLUMNS
+import indicators
+
+PIPELINE_VERSION = 1
+ARTIFACT_FILE = 'feature_pipeline.json'
+BASE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+NAN = float('nan')
+
+
+class Lag:
+    def __init__(self, name, col, periods):
+        self.name, self.col, self.periods = name, col, periods
+
+    def spec(self):
+        return {'op': 'lag', 'name': self.name, 'col': self.col, 'periods': self.periods}
+
+    def apply(self, df, grouped):
+        df[self.name] = grouped[self.col].shift(self.periods)
+
+    def online(self, feat, buffers):
+        buf = buffers[self.col]
+        feat[self.name] = buf[-1 - self.periods] if len(buf) > self.periods else NAN
+
+
+class Diff:
+    def __init__(self, name, a, b):
+        self.name, self.a, self.b = name, a, b
+
+    def spec(self):
+        return {'op': 'diff', 'name': self.name, 'a': self.a, 'b': self.b}
+
+    def apply(self, df, grouped):
+        df[self.name] = df[self.a] - df[self.b]
+
+    def online(self, feat, buffers):
+        feat[self.name] = feat[self.a] - feat[self.b]
+
+
+class RelRange:
+    """(high - low) / base"""
+
+    def __init__(self, name, high, low, base):
+        self.name, self.high, self.low, self.base = name, high, low, base
+
+    def spec(self):
+        return {'op': 'rel_range', 'name': self.name, 'high': self.high, 'low': self.low, 'base': self.base}
+
+    def apply(self, df, grouped):
+        df[self.name] = (df[self.high] - df[self.low]) / df[self.base]
+
+    def online(self, feat, buffers):
+        base = feat[self.base]
+        feat[self.name] = (feat[self.high] - feat[self.low]) / base if base else NAN
+
+
+class TimePart:
+    def __init__(self, name, part):
+        self.name, self.part = name, part
+
+    def spec(self):
+        return {'op': 'time_part', 'name': self.name, 'part': self.part}
+
+    def apply(self, df, grouped):
+        df[self.name] = getattr(pd.to_datetime(df['time']).dt, self.part)
+
+    def online(self, feat, buffers):
+        t = feat['time']
+        feat[self.name] = t.weekday() if self.part == 'dayofweek' else getattr(t, self.part)
+
+
+class Indicators:
+    """Block-Schritt: technische Indikatoren (indicators.py) für alle Ticker auf einer (Ticker x Zeit) Matrix."""
+
+    def __init__(self):
+        self.outputs = list(indicators.INDICATOR_COLUMNS)
+        self.inputs = list(indicators.INPUT_COLUMNS)
+        self.lookback = indicators.LOOKBACK
+
+    def spec(self):
+        return {'op': 'indicators', 'outputs': self.outputs, 'lookback': self.lookback,
+                'sma': list(indicators.SMA_WINDOWS), 'rsi': indicators.RSI_WINDOW, 'atr': indicators.ATR_WINDOW,
+                'bb': [indicators.BB_WINDOW, indicators.BB_STD],
+                'macd': [indicators.MACD_FAST, indicators.MACD_SLOW, indicators.MACD_SIGNAL],
+                'ema_window_factor': indicators.EMA_WINDOW_FACTOR}
+
+    def apply(self, df, grouped):
+        if df.empty:
+            for c in self.outputs:
+                df[c] = np.nan
+            return
+        row = grouped.ngroup().values
+        pos = grouped.cumcount().values
+        shape = (row.max() + 1, pos.max() + 1)
+        arrays = {}
+        for c in self.inputs:
+            mat = np.full(shape, np.nan)
+            mat[row, pos] = _epoch_seconds(df[c]) if c == 'time' else pd.to_numeric(df[c], errors='coerce').values
+            arrays[c] = mat
+        for c, mat in indicators.compute(arrays).items():
+            df[c] = mat[row, pos]
+
+    def online_many(self, feats, buffers_list):
+        """Letzte Werte für mehrere Ticker auf einmal aus deren Ringpuffern (rechtsbündig, links NaN)."""
+        width = max(len(b['close']) for b in buffers_list)
+        arrays = {c: np.full((len(buffers_list), width), np.nan) for c in self.inputs}
+        for i, buffers in enumerate(buffers_list):
+            for c in self.inputs:
+                buf = buffers[c]
+                if len(buf):
+                    arrays[c][i, width - len(buf):] = buf
+        for c, mat in indicators.compute(arrays).items():
+            last = mat[:, -1]
+            for i, feat in enumerate(feats):
+                feat[c] = float(last[i])
+
+
+def _epoch_seconds(times):
+    t = pd.to_datetime(times, utc=True)
+    return ((t - pd.Timestamp(0, tz='UTC')) / pd.Timedelta('1s')).values
+
+
+class MedianImpute:
+    """Fehlende Werte mit Trainings-Median füllen, optional Missing-Flag Spalte {name}_missing."""
+
+    def __init__(self, name, flag=True):
+        self.name, self.flag = name, flag
+
+    def spec(self):
+        return {'op': 'median_impute', 'name': self.name, 'flag': self.flag}
+
+    def fit(self, df, state):
+        col = pd.to_numeric(df[self.name], errors='coerce') if self.name in df.columns else pd.Series(dtype=float)
+        state.setdefault('medians', {})[self.name] = float(col.median()) if not col.dropna().empty else 0.0
+
+    def columns(self, state):
+        return [self.name] + ([f'{self.name}_missing'] if self.flag else [])
+
+    def encode(self, df, state, out):
+        col = pd.to_numeric(df[self.name], errors='coerce') if self.name in df.columns else pd.Series(np.nan, index=df.index)
+        if self.flag:
+            out[f'{self.name}_missing'] = col.isna().astype(int).values
+        out[self.name] = col.fillna(state.get('medians', {}).get(self.name, 0.0)).values
+
+
+class OneHot:
+    """Ticker One-Hot mit im Training gelerntem Vokabular (unbekannte Ticker -> alle Spalten 0)."""
+
+    def __init__(self, name, prefix):
+        self.name, self.prefix = name, prefix
+
+    def spec(self):
+        return {'op': 'one_hot', 'name': self.name, 'prefix': self.prefix}
+
+    def fit(self, df, state):
+        state.setdefault('vocab', {})[self.name] = sorted(df[self.name].dropna().astype(str).unique().tolist())
+
+    def columns(self, state):
+        return [f'{self.prefix}_{v}' for v in state.get('vocab', {}).get(self.name, [])]
+
+    def encode(self, df, state, out):
+        vocab = state.get('vocab', {}).get(self.name, [])
+        codes = pd.Categorical(df[self.name].astype(str), categories=vocab).codes
+        mat = np.zeros((len(df), len(vocab)), dtype=np.uint8)
+        known = codes >= 0
+        mat[np.nonzero(known)[0], codes[known]] = 1
+        for j, v in enumerate(vocab):
+            out[f'{self.prefix}_{v}'] = mat[:, j]
+
+
+class TickerCategory:
+    """Ticker als eine pandas category Spalte (AutoGluon/LightGBM verarbeiten Kategorien nativ).
+
+    Breite bleibt 1 unabhängig von der Universumsgröße; unbekannte Ticker -> NaN (fehlende Kategorie).
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def spec(self):
+        return {'op': 'category', 'name': self.name}
+
+    def fit(self, df, state):
+        state.setdefault('vocab', {})[self.name] = sorted(df[self.name].dropna().astype(str).unique().tolist())
+
+    def columns(self, state):
+        return [self.name]
+
+    def encode(self, df, state, out):
+        out[self.name] = pd.Categorical(df[self.name].astype(str), categories=state.get('vocab', {}).get(self.name, []))
+
+
+class TickerTargetStats:
+    """Optionale Target-Statistik je Ticker: geglättetes Mittel/Std der relativen Rendite bis `target`.
+
+    Glättung Richtung globaler Wert mit Gewicht `smoothing` Zeilen; unbekannte Ticker -> globaler Wert.
+    fit() über alle Trainingszeilen liefert den Zustand für die Inferenz. Die Trainingsmatrix selbst
+    (encode_training) nutzt geordnete Statistiken: je Zeile nur Zeilen mit früherem Zeitstempel, damit weder
+    das eigene Target noch Targets der von AutoGluon gewählten Validierung in die Features gelangen.
+    """
+
+    def __init__(self, name, target, smoothing=50):
+        self.name, self.target, self.smoothing = name, target, smoothing
+
+    def spec(self):
+        return {'op': 'target_stats', 'name': self.name, 'target': self.target, 'smoothing': self.smoothing}
+
+    def _returns(self, df):
+        return (pd.to_numeric(df[self.target], errors='coerce') - df['close']) / df['close']
+
+    def fit(self, df, state):
+        ret = self._returns(df)
+        g = ret.groupby(df[self.name].astype(str))
+        n, mean, std = g.count(), g.mean(), g.std().fillna(0.0)
+        m = self.smoothing
+        g_mean = float(ret.mean()) if ret.notna().any() else 0.0
+        g_std = float(ret.std()) if ret.notna().sum() > 1 else 0.0
+        state['target_stats'] = {
+            'global': [g_mean, g_std],
+            'tickers': {t: [float((n[t] * mean[t] + m * g_mean) / (n[t] + m)),
+                            float((n[t] * std[t] + m * g_std) / (n[t] + m))] for t in n.index}
+        }
+
+    def columns(self, state):
+        return [f'{self.name}_ret_mean', f'{self.name}_ret_std']
+
+    def encode(self, df, state, out):
+        stats = state.get('target_stats', {'global': [0.0, 0.0], 'tickers': {}})
+        keys = df[self.name].astype(str)
+        for i, col in enumerate(self.columns(state)):
+            lookup = {t: v[i] for t, v in stats['tickers'].items()}
+            out[col] = keys.map(lookup).fillna(stats['global'][i]).astype(float).values
+
+    @staticmethod
+    def _mean_std(n, s, s2):
+        n = np.asarray(n, dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, s / n, 0.0)
+            var = np.where(n > 1, (s2 - n * mean ** 2) / (n - 1), 0.0)
+        return mean, np.sqrt(np.clip(var, 0.0, None))
+
+    def encode_training(self, df, state, out):
+        ret = self._returns(df).to_numpy(dtype=float)
+        known = ~np.isnan(ret)
+        r, r2 = np.where(known, ret, 0.0), np.where(known, ret ** 2, 0.0)
+        times = pd.to_datetime(df['time']).to_numpy()
+        # Summen aller Zeilen mit strikt früherem Zeitstempel (global bzw. je Ticker)
+        frame = pd.DataFrame({'ticker': df[self.name].astype(str).values, 'time': times,
+                              'n': known.astype(float), 's': r, 's2': r2})
+        per_time = frame.groupby('time', sort=True)[['n', 's', 's2']].sum()
+        prior = (per_time.cumsum() - per_time).reindex(times)
+        per_key = frame.groupby(['ticker', 'time'], sort=True)[['n', 's', 's2']].sum()
+        before = (per_key.groupby(level=0).cumsum() - per_key)
+        before = before.reindex(pd.MultiIndex.from_arrays([frame['ticker'], frame['time']]))
+        g_mean, g_std = self._mean_std(prior['n'].values, prior['s'].values, prior['s2'].values)
+        n = before['n'].values
+        mean, std = self._mean_std(n, before['s'].values, before['s2'].values)
+        m = self.smoothing
+        cols = self.columns(state)
+        out[cols[0]] = (n * mean + m * g_mean) / (n + m)
+        out[cols[1]] = (n * std + m * g_std) / (n + m)
+
+
+def encode_steps(ticker_encoding=None, target_stats=None):
+    """Encode-Schritte; TICKER_ENCODING=category (Default) | onehot, TICKER_TARGET_STATS=1 ergänzt Target-Statistiken."""
+    ticker_encoding = ticker_encoding or os.getenv('TICKER_ENCODING', 'category')
+    if target_stats is None:
+        target_stats = os.getenv('TICKER_TARGET_STATS', '0') == '1'
+    steps = [
+        MedianImpute('grok_sentiment', flag=True),
+        MedianImpute('grok_expected_gain', flag=True),
+    ]
+    if target_stats:
+        steps.append(TickerTargetStats('ticker', target='target_15'))
+    steps.append(OneHot('ticker', prefix='ticker') if ticker_encoding == 'onehot' else TickerCategory('ticker'))
+    return steps
+
+
+DERIVE_STEPS = [
+    Lag('prev_close', 'close', 1),
+    Lag('prev_close_5', 'close', 5),
+    Lag('prev_close_15', 'close', 15),
+    Diff('price_change', 'close', 'prev_close'),
+    Diff('price_change_5', 'close', 'prev_close_5'),
+    Diff('price_change_15', 'close', 'prev_close_15'),
+    RelRange('volatility', 'high', 'low', 'close'),
+    TimePart('hour', 'hour'),
+    TimePart('day_of_week', 'dayofweek'),
+    Indicators(),
+]
+ENCODE_STEPS = encode_steps()
+PASSTHROUGH = BASE_COLUMNS + YF_FEATURES + CROSS_SECTION_COLUMNS
+
+
+class FeaturePipeline:
+    def __init__(self, derive_steps=None, encode_steps=None, passthrough=None):
+        self.derive_steps = derive_steps or DERIVE_STEPS
+        self.encode_steps = encode_steps or ENCODE_STEPS
+        self.passthrough = passthrough or PASSTHROUGH
+
+    @property
+    def max_lag(self):
+        return max([s.periods for s in self.derive_steps if isinstance(s, Lag)] or [0])
+
+    @property
+    def lookback(self):
+        """Anzahl vorheriger Bars von denen die letzte Feature-Zeile abhängt (Lags + Indikator-Fenster)."""
+        return max([self.max_lag] + [s.lookback for s in self.derive_steps if isinstance(s, Indicators)])
+
+    @property
+    def lagged_columns(self):
+        """Spalten für die Online-State Ringpuffer braucht (time als Epoch-Sekunden)."""
+        cols = {s.col for s in self.derive_steps if isinstance(s, Lag)}
+        for s in self.derive_steps:
+            if isinstance(s, Indicators):
+                cols.update(s.inputs)
+        return sorted(cols)
+
+    @property
+    def derived_columns(self):
+        cols = []
+        for s in self.derive_steps:
+            cols += s.outputs if isinstance(s, Indicators) else [s.name]
+        return cols
+
+    def spec(self):
+        return {
+            'version': PIPELINE_VERSION,
+            'passthrough': self.passthrough,
+            'derive': [s.spec() for s in self.derive_steps],
+            'encode': [s.spec() for s in self.encode_steps],
+        }
+
+    @property
+    def fingerprint(self):
+        return hashlib.sha256(json.dumps(self.spec(), sort_keys=True).encode()).hexdigest()[:16]
+
+    @property
+    def derive_fingerprint(self):
+        """Nur zustandslose Schritte (Feature Store / Online-State hängen nicht vom Encoding ab)."""
+        spec = {'version': PIPELINE_VERSION, 'derive': [s.spec() for s in self.derive_steps]}
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+    def derive(self, df, mode='batch'):
+        """Zustandslose Features; df braucht ticker, time, OHLCV (nach Ticker/Zeit sortiert wird intern)."""
+        df = df.sort_values(['ticker', 'time'], kind='stable').reset_index(drop=True)
+        if mode == 'last':
+            # Nur so viel Historie wie Lags/Indikatoren brauchen
+            df = df.groupby('ticker', sort=False).tail(self.lookback + 1).reset_index(drop=True)
+        grouped = df.groupby('ticker', sort=False)
+        for step in self.derive_steps:
+            step.apply(df, grouped)
+        if mode == 'last':
+            df = df.groupby('ticker', sort=False).tail(1).reset_index(drop=True)
+        return df
+
+    def derive_online(self, feats, buffers_list):
+        """Skalare Variante von derive() für die letzte Zeile mehrerer Ticker.
+
+        feats = [{time, OHLCV}], buffers_list = [{col: Ringpuffer inkl. aktueller Bar}]; Block-Schritte
+        (Indikatoren) laufen einmal vektorisiert über alle Ticker.
+        """
+        for step in self.derive_steps:
+            if isinstance(step, Indicators):
+                if feats:
+                    step.online_many(feats, buffers_list)
+            else:
+                for feat, buffers in zip(feats, buffers_list):
+                    step.online(feat, buffers)
+        return feats
+
+    def fit(self, df):
+        state = {}
+        for step in self.encode_steps:
+            step.fit(df, state)
+        return state
+
+    def feature_columns(self, state):
+        cols = list(self.passthrough) + self.derived_columns
+        for step in self.encode_steps:
+            cols += [c for c in step.columns(state) if c not in cols]
+        return cols
+
+    def encode(self, df, state, schema=None, training=False):
+        """Finale Feature-Matrix, Index wie df.
+
+        Ohne schema: Spalten = feature_columns(state). Mit schema (aus dem Modell-Artefakt): exakt die Spalten
+        und dtypes mit denen das Modell trainiert wurde, in einem Schritt (kein Spaltenabgleich pro Aufruf).
+        training=True: Schritte mit encode_training (Target-Statistik) kodieren jede Zeile nur aus früheren Zeilen.
+        """
+        out = {}
+        for c in self.passthrough + self.derived_columns:
+            out[c] = pd.to_numeric(df[c], errors='coerce').values if c in df.columns else np.full(len(df), np.nan)
+        for step in self.encode_steps:
+            if training and hasattr(step, 'encode_training'):
+                step.encode_training(df, state, out)
+            else:
+                step.encode(df, state, out)
+        if schema is None:
+            return pd.DataFrame(out, index=df.index)[self.feature_columns(state)]
+        return pd.DataFrame({c: out[c] for c in schema['columns']}, index=df.index).astype(schema['dtypes'])
+
+    def transform(self, df, state, mode='batch'):
+        derived = self.derive(df, mode)
+        return derived, self.encode(derived, state)
+
+    def artifact(self, state, schema=None):
+        return {'fingerprint': self.fingerprint, 'spec': self.spec(), 'state': state,
+                'features': self.feature_columns(state), 'schema': schema}
+
+    def save(self, path, state, schema=None):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, ARTIFACT_FILE), 'w') as fh:
+            json.dump(self.artifact(state, schema), fh)
+
+
+def model_schema(columns, X):
+    """Schema eines trainierten Modells: geordnete Feature-Liste (wie vom Predictor genutzt) + dtypes aus X."""
+    columns = [c for c in columns if c in X.columns]
+    return {'columns': columns, 'dtypes': {c: str(X[c].dtype) for c in columns}}
+
+
+def usable_schema(artifact, pipeline):
+    """Schema aus dem Artefakt wenn es mit dieser Pipeline erzeugt wurde, sonst None (Fallback Spaltenabgleich)."""
+    if not artifact or artifact.get('fingerprint') != pipeline.fingerprint:
+        return None
+    return artifact.get('schema')
+
+
+def load_artifact(path):
+    """Gespeichertes Pipeline-Artefakt eines Modells oder None (ältere Modelle ohne Artefakt)."""
+    try:
+        with open(os.path.join(path, ARTIFACT_FILE)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+DEFAULT_PIPELINE = FeaturePipeline()
@@ -0,0 +1,214 @@
+"""Inkrementeller Feature Store: materialisierte Pipeline-Features je Candle in market_features (time, ticker).
+
+- Zustandslose Features (feature_pipeline.derive + Grok as-of zum Candle-Zeitpunkt) werden einmal berechnet und
+  per Upsert gespeichert; Imputation/One-Hot (modellabhängiger Zustand) passieren weiterhin beim Lesen.
+- Watermark je Ticker im Redis Hash feature_store_watermark (Epoch-Sekunden der letzten materialisierten Candle).
+  update() holt nur Candles nach der Watermark plus pipeline.lookback Kontext-Candles davor (Lags, Indikator-Fenster).
+- Backfills die ältere Candles einfügen setzen die Watermark per rewind() zurück -> betroffene Zeilen werden neu berechnet.
+- Ändert sich der Fingerprint der zustandslosen Pipeline-Schritte (feature_store_fingerprint), wird der Store verworfen und neu aufgebaut.
+- ensure_schema() legt market_features an bzw. ergänzt fehlende Spalten (init.sql läuft nur bei frischem Datenverzeichnis).
+
+Env: FEATURE_STORE_DAYS (Aufbau-/Aufbewahrungsfenster in Tagen, Default 30)
+"""
+import os
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from psycopg2.extras import execute_values
+from feature_pipeline import DEFAULT_PIPELINE, BASE_COLUMNS
+
+WATERMARK_KEY = 'feature_store_watermark'
+FINGERPRINT_KEY = 'feature_store_fingerprint'
+TABLE = 'market_features'
+INT_COLUMNS = {'hour', 'day_of_week'}
+
+# Watermark nur setzen wenn sie seit dem Lesen nicht verändert wurde (paralleles rewind gewinnt)
+_ADVANCE_LUA = """
+local cur = redis.call('HGET', KEYS[1], ARGV[1]) or ''
+if cur == ARGV[2] then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+_REWIND_LUA = """
+local cur = redis.call('HGET', KEYS[1], ARGV[1])
+if cur and tonumber(ARGV[2]) < tonumber(cur) then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+def _utc(ts):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+
+class FeatureStore:
+    def __init__(self, redis_client, pipeline=None, days=None):
+        self.r = redis_client
+        self.pipeline = pipeline or DEFAULT_PIPELINE
+        self.days = int(days if days is not None else os.getenv('FEATURE_STORE_DAYS', '30'))
+        self.columns = BASE_COLUMNS + self.pipeline.derived_columns + ['grok_sentiment', 'grok_expected_gain']
+        self._advance = self.r.register_script(_ADVANCE_LUA)
+        self._rewind = self.r.register_script(_REWIND_LUA)
+        self._schema_ok = False
+
+    def ensure_schema(self, conn):
+        """Tabelle + alle Pipeline-Spalten (z.B. neue ind_* Indikatoren) idempotent anlegen, einmal je Prozess."""
+        if self._schema_ok:
+            return
+        cur = conn.cursor()
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {TABLE} (
+                time TIMESTAMPTZ NOT NULL,
+                ticker TEXT NOT NULL,
+                PRIMARY KEY (time, ticker)
+            )
+        """)
+        for c in self.columns:
+            cur.execute(f"ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS {c} "
+                        f"{'INT' if c in INT_COLUMNS else 'DOUBLE PRECISION'}")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_ticker_time ON {TABLE}(ticker, time)")
+        conn.commit()
+        self._schema_ok = True
+
+    def ensure_fingerprint(self, cur):
+        """Store verwerfen wenn er mit einer anderen Pipeline-Version gebaut wurde -> True bei Reset."""
+        stored = self.r.get(FINGERPRINT_KEY)
+        stored = stored.decode() if isinstance(stored, bytes) else stored
+        if stored == self.pipeline.derive_fingerprint:
+            return False
+        cur.execute(f"DELETE FROM {TABLE}")
+        self.r.delete(WATERMARK_KEY)
+        self.r.set(FINGERPRINT_KEY, self.pipeline.derive_fingerprint)
+        logging.info(f"Feature store reset (fingerprint {stored} -> {self.pipeline.derive_fingerprint})")
+        return True
+
+    def stored_tickers(self):
+        """Ticker mit Watermark (= im Store materialisiert)."""
+        return sorted(t.decode() if isinstance(t, bytes) else t for t in self.r.hkeys(WATERMARK_KEY))
+
+    def watermarks(self, tickers):
+        """{ticker: raw Watermark-String oder None}"""
+        if not tickers:
+            return {}
+        vals = self.r.hmget(WATERMARK_KEY, tickers)
+        return {t: (v.decode() if isinstance(v, bytes) else v) for t, v in zip(tickers, vals)}
+
+    def rewind(self, ticker, since):
+        """Watermark vor `since` legen (nur zurück, nie vor), z.B. nach Backfill älterer Candles."""
+        return bool(self._rewind(keys=[WATERMARK_KEY], args=[ticker, repr(_utc(since).timestamp() - 1e-3)]))
+
+    def rewind_rows(self, rows):
+        """rewind() für (time, ticker, ...) Tupel wie insert_candles sie bekommt (früheste Zeit je Ticker)."""
+        earliest = {}
+        for row in rows:
+            t = _utc(row[0])
+            if row[1] not in earliest or t < earliest[row[1]]:
+                earliest[row[1]] = t
+        return sum(self.rewind(ticker, t) for ticker, t in earliest.items())
+
+    def recent_tickers(self, cur):
+        cur.execute("SELECT DISTINCT ticker FROM market_data WHERE time >= NOW() - %s * INTERVAL '1 day'", (self.days,))
+        return [row[0] for row in cur.fetchall()]
+
+    def _load_pending(self, cur, tickers, marks):
+        default = datetime.now(timezone.utc) - timedelta(days=self.days)
+        wm = [datetime.fromtimestamp(float(marks[t]), timezone.utc) if marks.get(t) else default for t in tickers]
+        cur.execute("""
+            SELECT t.ticker, m.time, m.open, m.high, m.low, m.close, m.volume, m.pending,
+                   CASE WHEN m.pending THEN (
+                       SELECT sentiment FROM grok_deepersearch d
+                       WHERE d.ticker = t.ticker AND d.time <= m.time
+                       ORDER BY d.time DESC LIMIT 1) END AS grok_sentiment,
+                   CASE WHEN m.pending THEN (
+                       SELECT expected_gain FROM grok_topstocks g
+                       WHERE g.ticker = t.ticker AND g.time <= m.time
+                       ORDER BY g.time DESC LIMIT 1) END AS grok_expected_gain
+            FROM unnest(%s::text[], %s::timestamptz[]) AS t(ticker, wm)
+            CROSS JOIN LATERAL (
+                (SELECT time, open, high, low, close, volume, FALSE AS pending FROM market_data
+                 WHERE ticker = t.ticker AND time <= t.wm ORDER BY time DESC LIMIT %s)
+                UNION ALL
+                (SELECT time, open, high, low, close, volume, TRUE FROM market_data
+                 WHERE ticker = t.ticker AND time > t.wm)
+            ) m
+        """, (list(tickers), wm, self.pipeline.lookback))
+        return pd.DataFrame(cur.fetchall(), columns=['ticker', 'time'] + BASE_COLUMNS +
+                            ['pending', 'grok_sentiment', 'grok_expected_gain'])
+
+    def update(self, conn, tickers=None, page_size=1000):
+        """Neue Candles seit der Watermark materialisieren und committen -> {'tickers', 'rows', 'reset', 'seconds'}.
+
+        Watermarks werden erst nach dem Commit vorgerückt (Compare-and-Set gegen den gelesenen Wert).
+        """
+        started = time.time()
+        self.ensure_schema(conn)
+        cur = conn.cursor()
+        reset = self.ensure_fingerprint(cur)
+        tickers = list(tickers) if tickers is not None else self.recent_tickers(cur)
+        marks = self.watermarks(tickers)
+        df = self._load_pending(cur, tickers, marks) if tickers else pd.DataFrame()
+        rows = 0
+        advanced = {}
+        if not df.empty and df['pending'].any():
+            derived = self.pipeline.derive(df, mode='batch')
+            new = derived[derived['pending'].astype(bool)]
+            out = new[['time', 'ticker'] + self.columns].astype(object)
+            out = out.where(pd.notna(out), None)
+            cols = ', '.join(self.columns)
+            updates = ', '.join(f'{c} = EXCLUDED.{c}' for c in self.columns)
+            execute_values(cur, f"""
+                INSERT INTO {TABLE} (time, ticker, {cols}) VALUES %s
+                ON CONFLICT (time, ticker) DO UPDATE SET {updates}
+            """, list(out.itertuples(index=False, name=None)), page_size=page_size)
+            rows = len(out)
+            advanced = new.groupby('ticker')['time'].max().to_dict()
+        conn.commit()
+        for t, ts in advanced.items():
+            self._advance(keys=[WATERMARK_KEY], args=[t, marks.get(t) or '', repr(_utc(ts).timestamp())])
+        return {'tickers': len(tickers), 'rows': rows, 'reset': reset, 'seconds': round(time.time() - started, 3)}
+
+    def load(self, cur, since_days, tickers=None, after=None):
+        """Materialisierte Feature-Zeilen der letzten since_days Tage (optional nur time >= after), sortiert nach (ticker, time)."""
+        sql = f"SELECT ticker, time, {', '.join(self.columns)} FROM {TABLE} WHERE time >= NOW() - %s * INTERVAL '1 day'"
+        params = [since_days]
+        if after is not None:
+            sql += " AND time >= %s"
+            params.append(after)
+        if tickers is not None:
+            sql += " AND ticker = ANY(%s)"
+            params.append(list(tickers))
+        cur.execute(sql + " ORDER BY ticker, time", params)
+        df = pd.DataFrame(cur.fetchall(), columns=['ticker', 'time'] + self.columns)
+        for c in self.columns:
+            df[c] = pd.to_numeric(df[c], errors='coerce')
+        return df
+
+    def last_rows(self, cur, tickers, min_rows=20):
+        """Letzte Feature-Zeile je Ticker -> (DataFrame, {ticker: verfügbare Zeilen (max min_rows)})."""
+        cur.execute(f"""
+            SELECT t.ticker, m.* FROM unnest(%s::text[]) AS t(ticker)
+            CROSS JOIN LATERAL (
+                SELECT time, {', '.join(self.columns)} FROM {TABLE}
+                WHERE ticker = t.ticker ORDER BY time DESC LIMIT %s
+            ) m
+        """, (list(tickers), min_rows))
+        df = pd.DataFrame(cur.fetchall(), columns=['ticker', 'time'] + self.columns)
+        if df.empty:
+            return df, {}
+        counts = df.groupby('ticker').size().to_dict()
+        df = df.sort_values(['ticker', 'time']).groupby('ticker', sort=False).tail(1)
+        df = df[df['ticker'].map(counts) >= min_rows].reset_index(drop=True)
+        for c in self.columns:
+            df[c] = pd.to_numeric(df[c], errors='coerce')
+        return df, counts
+
+    def prune(self, cur):
+        cur.execute(f"DELETE FROM {TABLE} WHERE time < NOW() - %s * INTERVAL '1 day'", (self.days,))
+        return cur.rowcount
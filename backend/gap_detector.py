@@ -0,0 +1,80 @@
+"""Gap-Erkennung für market_data (15m) gegen das erwartete NYSE Slot-Raster.
+
+Ablauf:
+1. Erwartetes Raster (market_calendar.expected_slots) für das Fenster erzeugen
+2. Gespeicherte Zeitstempel aller Ticker mit einer Query laden
+3. Präsenz-Matrix (Ticker x Slot) per searchsorted füllen, fehlende Läufe per np.diff in einem Durchlauf finden
+4. Ergebnis: zusammenhängende fehlende Bereiche pro Ticker (Start/Ende UTC), Grundlage für gezielte Backfills
+
+Bereiche sind über das Raster zusammenhängend, d.h. eine Lücke von Freitag 15:45 bis Montag 9:30 ist
+ein Bereich (Nacht/Wochenende gehören nicht zum Raster).
+"""
+from datetime import datetime, timezone
+import numpy as np
+from market_calendar import expected_slots, SLOT_MINUTES
+
+
+def load_slot_times(cur, tickers, start, end):
+    """Alle gespeicherten Candle-Zeitstempel (Epoch Sekunden) im Fenster -> (ticker_idx, epochs) Arrays."""
+    cur.execute("""
+        SELECT ticker, EXTRACT(EPOCH FROM time)::bigint
+        FROM market_data
+        WHERE ticker = ANY(%s) AND time >= %s AND time < %s
+    """, (list(tickers), start, end))
+    rows = cur.fetchall()
+    col = {t: i for i, t in enumerate(tickers)}
+    idx = np.fromiter((col[t] for t, _ in rows), dtype=np.int64, count=len(rows))
+    epochs = np.fromiter((e for _, e in rows), dtype=np.int64, count=len(rows))
+    return idx, epochs
+
+
+def presence_matrix(grid, n_tickers, ticker_idx, epochs):
+    """bool (Ticker x Slot): Slot hat eine gespeicherte Candle. Zeitstempel außerhalb des Rasters werden ignoriert."""
+    present = np.zeros((n_tickers, len(grid)), dtype=bool)
+    if not len(grid) or not len(epochs):
+        return present
+    pos = np.searchsorted(grid, epochs)
+    pos_clipped = np.minimum(pos, len(grid) - 1)
+    on_grid = grid[pos_clipped] == epochs
+    present[ticker_idx[on_grid], pos_clipped[on_grid]] = True
+    return present
+
+
+def missing_runs(present):
+    """Zusammenhängende fehlende Slot-Läufe -> (row, first_col, last_col) Arrays, ein np.diff für alle Ticker."""
+    missing = (~present).astype(np.int8)
+    padded = np.pad(missing, ((0, 0), (1, 1)))
+    edges = np.diff(padded, axis=1)
+    starts_r, starts_c = np.nonzero(edges == 1)
+    _, ends_c = np.nonzero(edges == -1)
+    # nonzero liefert row-major Reihenfolge -> Starts und Enden je Zeile paarweise ausgerichtet
+    return starts_r, starts_c, ends_c - 1
+
+
+def detect_gaps(cur, tickers, start, end, slot_minutes=SLOT_MINUTES, min_slots=1):
+    """Fehlende Bereiche pro Ticker.
+
+    Rückgabe: (gaps, stats) mit gaps = {ticker: [{'start': dt, 'end': dt, 'slots': n}, ...]},
+    end = Ende des letzten fehlenden Slots. Ticker ohne Lücken fehlen in gaps.
+    """
+    tickers = list(tickers)
+    grid = expected_slots(start, end, slot_minutes)
+    stats = {'grid_slots': int(len(grid)), 'tickers': len(tickers), 'missing_slots': 0, 'ranges': 0}
+    if not tickers or not len(grid):
+        return {}, stats
+    ticker_idx, epochs = load_slot_times(cur, tickers, start, end)
+    present = presence_matrix(grid, len(tickers), ticker_idx, epochs)
+    rows, first, last = missing_runs(present)
+    sizes = last - first + 1
+    keep = sizes >= min_slots
+    step = slot_minutes * 60
+    gaps = {}
+    for r, f, l, n in zip(rows[keep], first[keep], last[keep], sizes[keep]):
+        gaps.setdefault(tickers[r], []).append({
+            'start': datetime.fromtimestamp(int(grid[f]), tz=timezone.utc),
+            'end': datetime.fromtimestamp(int(grid[l]) + step, tz=timezone.utc),
+            'slots': int(n),
+        })
+    stats['missing_slots'] = int(sizes[keep].sum())
+    stats['ranges'] = int(keep.sum())
+    return gaps, stats
@@ -0,0 +1,320 @@
+"""Historische 15m Candles: Provider-Abruf (Finnhub -> TwelveData -> FMP) und Bulk-Insert in market_data.
+
+Zeiträume werden explizit übergeben (start_dt/end_dt, naive UTC), damit Aufrufer nur den fehlenden
+Teil anfragen können (inkrementeller Fetch ab der letzten Provider-Candle pro Ticker, gezielte Backfills).
+TwelveData und FMP liefern Zeitstempel in Börsenzeit (America/New_York, naive) -> Umrechnung nach UTC;
+auch deren Request-Parameter werden in Börsenzeit angegeben.
+
+market_data.source kennzeichnet die Herkunft: 'provider' (dieses Modul, auch Backfills), 'stream'
+(stream_ingestor.py), 'snapshot' (bar_builder.py), NULL (Altbestand / import_bars.py). Provider-Candles ersetzen
+Stream- und Snapshot-Bars desselben Slots, alles andere bleibt unangetastet.
+
+Redis Keys:
+    historical_provider_last   Hash ticker -> ISO UTC der jüngsten Provider-Candle (Snapshot-/Stream-Bars in
+                               market_data zählen nicht, sonst würde der inkrementelle Fetch nie Provider-Daten holen).
+                               Fehlt der Eintrag, wird er aus market_data (source provider/NULL) übernommen; liefert
+                               kein Provider Daten, wird end - PROVIDER_EMPTY_LOOKBACK vermerkt statt bei jedem Lauf
+                               erneut das komplette Fenster anzufragen.
+"""
+import os
+import time
+import logging
+import json
+from datetime import datetime, timedelta, timezone
+from psycopg2.extras import execute_values
+from response_cache import ResponseCache
+from market_calendar import EASTERN
+
+# Abgeschlossene Fenster kommen von Disk, Fenster mit heute nur kurz gecached (siehe response_cache.py)
+response_cache = ResponseCache()
+
+TD_WINDOW_DAYS = 5  # TwelveData pseudo-Pagination (liefert meist weniger Tage je Call)
+PROVIDER_LAST_KEY = 'historical_provider_last'
+PROVIDER_EMPTY_LOOKBACK = timedelta(days=1)
+
+
+def _naive_utc(dt):
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _exchange_to_utc(text):
+    """Naiver Börsenzeit-Zeitstempel (ET) -> naive UTC."""
+    return _naive_utc(EASTERN.localize(datetime.fromisoformat(text)))
+
+
+def _utc_to_exchange(dt):
+    """Naive UTC -> naive Börsenzeit (ET) für Request-Parameter."""
+    return dt.replace(tzinfo=timezone.utc).astimezone(EASTERN).replace(tzinfo=None)
+
+
+def _json_ok(text, error_check):
+    try:
+        return not error_check(json.loads(text))
+    except Exception:
+        return False
+
+
+# Leere Antworten ({"s":"no_data"}, [], values fehlen) nie cachen: Provider liefern Candles teils verspätet
+# nach, ein permanent gecachtes "leer" für ein vergangenes Fenster würde den Bereich nie wieder anfragen.
+def _finnhub_cacheable(text):
+    return _json_ok(text, lambda js: not isinstance(js, dict) or 'error' in js or js.get('s') != 'ok' or not js.get('t'))
+
+
+def _twelvedata_cacheable(text):
+    return _json_ok(text, lambda js: not isinstance(js, dict) or js.get('status') == 'error' or not js.get('values'))
+
+
+def _fmp_cacheable(text):
+    return _json_ok(text, lambda js: not isinstance(js, list) or not js)
+
+
+def _noop_log(ticker, source, status, candles, http_status=None, note=None):
+    pass
+
+
+def fetch_finnhub(ticker, start_dt, end_dt, log=_noop_log, timeout=30):
+    api_key = os.getenv('FINNHUB_API_KEY')
+    try:
+        start_time = int(start_dt.replace(tzinfo=timezone.utc).timestamp())
+        end_time = int(end_dt.replace(tzinfo=timezone.utc).timestamp())
+        url = f'https://finnhub.io/api/v1/stock/candle?symbol={ticker}&resolution=15&from={start_time}&to={end_time}&token={api_key}'
+        resp = response_cache.get(url, timeout=timeout, window_end=end_dt, cacheable=_finnhub_cacheable)
+        if resp.status_code == 200:
+            js = resp.json()
+            if js.get('s') == 'ok' and js.get('t'):
+                candles = [
+                    {
+                        'time': datetime.fromtimestamp(js['t'][i], tz=timezone.utc).replace(tzinfo=None),
+                        'open': js['o'][i],
+                        'high': js['h'][i],
+                        'low': js['l'][i],
+                        'close': js['c'][i],
+                        'volume': js['v'][i]
+                    } for i in range(len(js['t']))
+                ]
+                log(ticker, 'finnhub', 'ok', len(candles), 200)
+                return candles
+            log(ticker, 'finnhub', 'empty', 0, 200, js.get('s'))
+        else:
+            log(ticker, 'finnhub', 'http_error', 0, resp.status_code, resp.text[:120])
+    except Exception as e:
+        logging.warning(f"Finnhub fail {ticker}: {e}")
+        log(ticker, 'finnhub', 'exception', 0, None, str(e)[:120])
+    return []
+
+
+def fetch_twelvedata(ticker, start_dt, end_dt, log=_noop_log, timeout=30):
+    td_key = os.getenv('TWELVE_DATA_API_KEY')
+    if not td_key:
+        return []
+    try:
+        parsed_total = []
+        current_start = start_dt
+        while current_start < end_dt:
+            current_end = min(current_start + timedelta(days=TD_WINDOW_DAYS), end_dt)
+            url = (
+                f'https://api.twelvedata.com/time_series?symbol={ticker}'
+                f'&interval=15min&apikey={td_key}'
+                f'&start_date={_utc_to_exchange(current_start).strftime("%Y-%m-%d %H:%M:%S")}'
+                f'&end_date={_utc_to_exchange(current_end).strftime("%Y-%m-%d %H:%M:%S")}&format=JSON'
+            )
+            resp = response_cache.get(url, timeout=timeout, window_end=current_end, cacheable=_twelvedata_cacheable)
+            if resp.status_code == 200:
+                js = resp.json()
+                # Falls Error-Struktur
+                if isinstance(js, dict) and js.get('status') == 'error':
+                    log(ticker, 'twelvedata', 'api_error', 0, 200, js.get('message'))
+                    break
+                values = js.get('values') or []
+                for row in reversed(values):
+                    try:
+                        ts = _exchange_to_utc(row['datetime'])
+                        if ts < start_dt or ts > end_dt:
+                            continue
+                        parsed_total.append({
+                            'time': ts,
+                            'open': float(row['open']),
+                            'high': float(row['high']),
+                            'low': float(row['low']),
+                            'close': float(row['close']),
+                            'volume': float(row.get('volume', 0) or 0)
+                        })
+                    except Exception:
+                        continue
+            else:
+                log(ticker, 'twelvedata', 'http_error', 0, resp.status_code, resp.text[:120])
+                break
+            # leichte Pause zur Ratelimit Schonung (nur bei echtem Netzwerk-Request)
+            if current_end < end_dt and not getattr(resp, 'from_cache', False):
+                time.sleep(0.25)
+            current_start = current_end
+        if parsed_total:
+            log(ticker, 'twelvedata', 'ok', len(parsed_total), 200)
+            return parsed_total
+        log(ticker, 'twelvedata', 'empty', 0, 200)
+    except Exception as e:
+        logging.warning(f"TwelveData fail {ticker}: {e}")
+        log(ticker, 'twelvedata', 'exception', 0, None, str(e)[:120])
+    return []
+
+
+def fetch_fmp(ticker, start_dt, end_dt, log=_noop_log, timeout=30):
+    fmp_key = os.getenv('FMP_API_KEY')
+    if not fmp_key:
+        return []
+    try:
+        # from/to begrenzen die Antwort auf den angefragten Zeitraum (sonst komplette Historie)
+        url = (
+            f'https://financialmodelingprep.com/api/v3/historical-chart/15min/{ticker}'
+            f'?from={_utc_to_exchange(start_dt).strftime("%Y-%m-%d")}'
+            f'&to={_utc_to_exchange(end_dt).strftime("%Y-%m-%d")}&apikey={fmp_key}'
+        )
+        resp = response_cache.get(url, timeout=timeout, window_end=end_dt, cacheable=_fmp_cacheable)
+        if resp.status_code == 200:
+            parsed = []
+            for row in resp.json():
+                try:
+                    ts = _exchange_to_utc(row['date'])
+                    if ts < start_dt or ts > end_dt:
+                        continue
+                    parsed.append({
+                        'time': ts,
+                        'open': float(row['open']),
+                        'high': float(row['high']),
+                        'low': float(row['low']),
+                        'close': float(row['close']),
+                        'volume': float(row.get('volume', 0) or 0)
+                    })
+                except Exception:
+                    continue
+            if parsed:
+                candles = list(reversed(parsed))  # Älteste zuerst
+                log(ticker, 'fmp', 'ok', len(candles), 200)
+                return candles
+            log(ticker, 'fmp', 'empty', 0, 200)
+        else:
+            log(ticker, 'fmp', 'http_error', 0, resp.status_code, resp.text[:120])
+    except Exception as e:
+        logging.warning(f"FMP fail {ticker}: {e}")
+        log(ticker, 'fmp', 'exception', 0, None, str(e)[:120])
+    return []
+
+
+PROVIDERS = {
+    'finnhub': fetch_finnhub,
+    'twelvedata': fetch_twelvedata,
+    'fmp': fetch_fmp,
+}
+PROVIDER_ORDER = ['finnhub', 'twelvedata', 'fmp']
+
+
+def fetch_candles(ticker, start_dt, end_dt, log=_noop_log, timeout=30, providers=PROVIDER_ORDER):
+    """Fallback-Kette über providers; liefert (source, candles) der ersten Quelle mit Daten, sonst (None, [])."""
+    start_dt, end_dt = _naive_utc(start_dt), _naive_utc(end_dt)
+    for name in providers:
+        candles = PROVIDERS[name](ticker, start_dt, end_dt, log=log, timeout=timeout)
+        if candles:
+            return name, candles
+    log(ticker, 'none', 'failed_all', 0, None)
+    return None, []
+
+
+def ensure_market_data_schema(conn):
+    """source Spalte + Unique Index (time, ticker) auch auf Datenbanken die vor init.sql Änderungen angelegt wurden."""
+    cur = conn.cursor()
+    cur.execute("ALTER TABLE market_data ADD COLUMN IF NOT EXISTS source TEXT")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_market_data_time_ticker ON market_data(time, ticker)")
+    conn.commit()
+
+
+def last_candle_times(cur, tickers):
+    """MAX(time) der Provider-Candles pro Ticker in einer einzigen Query -> {ticker: datetime (tz-aware)}.
+
+    Stream- und Snapshot-Bars zählen nicht (sie füllen jeden Slot, bevor ein Provider ihn liefert).
+    """
+    if not tickers:
+        return {}
+    cur.execute("""
+        SELECT ticker, MAX(time) FROM market_data
+        WHERE ticker = ANY(%s) AND COALESCE(source, 'provider') NOT IN ('stream', 'snapshot')
+        GROUP BY ticker
+    """, (list(tickers),))
+    return {t: ts for t, ts in cur.fetchall() if ts is not None}
+
+
+def provider_last_times(redis_client, tickers):
+    """Jüngste Provider-Candle pro Ticker aus Redis -> {ticker: datetime (tz-aware UTC)}."""
+    if not tickers:
+        return {}
+    out = {}
+    for ticker, value in zip(tickers, redis_client.hmget(PROVIDER_LAST_KEY, list(tickers))):
+        if value:
+            value = value.decode() if isinstance(value, bytes) else value
+            out[ticker] = datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    return out
+
+
+def record_provider_last(redis_client, rows):
+    """Provider-Watermark je Ticker auf die jüngste Candle in rows (time naive UTC) vorziehen."""
+    newest = {}
+    for row in rows:
+        if row[1] not in newest or row[0] > newest[row[1]]:
+            newest[row[1]] = row[0]
+    known = provider_last_times(redis_client, list(newest))
+    for ticker, ts in newest.items():
+        prev = known.get(ticker)
+        if prev is None or ts > prev.replace(tzinfo=None):
+            redis_client.hset(PROVIDER_LAST_KEY, ticker, ts.isoformat())
+    return len(newest)
+
+
+def record_provider_empty(redis_client, tickers, ts):
+    """Ticker ohne Watermark, für die kein Provider Candles hatte: ts vermerken (HSETNX, bestehende bleiben)."""
+    for ticker in tickers:
+        redis_client.hsetnx(PROVIDER_LAST_KEY, ticker, ts.isoformat())
+    return len(tickers)
+
+
+def candle_rows(ticker, candles):
+    return [(c['time'], ticker, c['open'], c['high'], c['low'], c['close'], c['volume']) for c in candles]
+
+
+def insert_candles(cur, rows, page_size=1000):
+    """Bulk-Upsert (time, ticker, o, h, l, c, v) Tupel als source 'provider'.
+
+    Vorhandene Stream-/Snapshot-Bars des Slots werden ersetzt, Provider-/Import-Candles bleiben. Liefert Anzahl
+    eingefügter oder ersetzter Zeilen.
+    """
+    if not rows:
+        return 0
+    inserted = execute_values(cur, """
+        INSERT INTO market_data AS t (time, ticker, open, high, low, close, volume, source) VALUES %s
+        ON CONFLICT (time, ticker) DO UPDATE SET
+            open=EXCLUDED.open, high=EXCLUDED.high, low=EXCLUDED.low, close=EXCLUDED.close,
+            volume=EXCLUDED.volume, source=EXCLUDED.source
+        WHERE t.source IN ('stream', 'snapshot')
+        RETURNING 1
+    """, rows, template="(%s, %s, %s, %s, %s, %s, %s, 'provider')", page_size=page_size, fetch=True)
+    return len(inserted)
+
+
+def split_windows(start_dt, end_dt, window_days=TD_WINDOW_DAYS, aligned=False):
+    """[start, end) in aufeinanderfolgende Fenster von window_days Tagen -> [(ws, we), ...].
+
+    aligned=True: Fenstergrenzen liegen auf UTC-Mitternacht (Vielfache von window_days seit Epoch), damit
+    wiederholte Läufe identische Fenster (und damit identische Checkpoint-Keys) erzeugen. Das erste Fenster
+    beginnt dann ggf. vor start_dt.
+    """
+    step = timedelta(days=window_days)
+    ws = start_dt
+    if aligned:
+        epoch = datetime(1970, 1, 1, tzinfo=start_dt.tzinfo)
+        ws = epoch + ((start_dt - epoch) // step) * step
+    windows = []
+    while ws < end_dt:
+        we = min(ws + step, end_dt)
+        windows.append((ws, we))
+        ws = ws + step
+    return windows
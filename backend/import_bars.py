@@ -0,0 +1,297 @@
+"""Bulk-Import historischer OHLCV Bars aus CSV/Parquet Dateien in market_data (ohne Netzwerk).
+
+- Spalten werden flexibel erkannt (time/timestamp/datetime/date, open/o, high/h, low/l, close/c, volume/v, ticker/symbol)
+- Ticker aus Spalte, --ticker oder Dateiname (AAPL.csv, AAPL_1min.parquet)
+- Zeitstempel -> UTC: Epoch (s/ms/us/ns automatisch), ISO mit Offset, naive Werte in --source-tz (Default US/Eastern)
+- Validierung: Preise > 0, high/low konsistent mit open/close, volume >= 0, Duplikate je (time, ticker)
+- Default Resampling auf 15m UTC-Slots (market_data Raster), --resample none + --table market_data_1m für Minutenbars
+- Laden per COPY in eine temporäre Staging-Tabelle, dann INSERT ... ON CONFLICT (time, ticker) DO NOTHING (--replace: DO UPDATE)
+- Nach jedem Commit in market_data: Feature Store / Trainings-Snapshot zurücksetzen, Online-State invalidieren
+  (candle_hooks.py, Redis aus --redis-url bzw. REDIS_URL; ohne Redis nur Warnung)
+- Ein Worker-Prozess pro Datei (--workers), Streaming in Chunks; Dateien müssen je Ticker zeitlich sortiert sein
+
+Beispiel:
+    python import_bars.py data/*.csv --workers 4 --source-tz US/Eastern
+    python import_bars.py minute/AAPL.parquet --resample none --table market_data_1m
+"""
+import os
+import io
+import sys
+import time
+import glob
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+from candle_hooks import CandleHooks
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO, format='[import-bars] %(asctime)s %(levelname)s %(message)s')
+
+COLUMN_ALIASES = {
+    'time': ['time', 'timestamp', 'datetime', 'date', 'ts', 't'],
+    'ticker': ['ticker', 'symbol', 's'],
+    'open': ['open', 'o'],
+    'high': ['high', 'h'],
+    'low': ['low', 'l'],
+    'close': ['close', 'c', 'adj_close'],
+    'volume': ['volume', 'vol', 'v'],
+}
+TABLES = {'market_data', 'market_data_1m'}
+# Zeitstempel-Strings mit eigenem Offset (Z, +02:00, -0500)
+OFFSET_PATTERN = r'(?:Z|[+-]\d{2}:?\d{2})$'
+OUT_COLUMNS = ['time', 'ticker', 'open', 'high', 'low', 'close', 'volume']
+
+
+def resolve_columns(columns):
+    lower = {c.lower().strip(): c for c in columns}
+    mapping = {}
+    for target, aliases in COLUMN_ALIASES.items():
+        for a in aliases:
+            if a in lower:
+                mapping[lower[a]] = target
+                break
+    missing = {'time', 'open', 'high', 'low', 'close'} - set(mapping.values())
+    if missing:
+        raise ValueError(f"Pflichtspalten fehlen: {sorted(missing)} (vorhanden: {list(columns)})")
+    return mapping
+
+
+def ticker_from_filename(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem.replace('-', '_').split('_')[0].upper()
+
+
+def to_utc(series, source_tz):
+    """Beliebige Zeitstempel-Spalte -> tz-aware UTC (NaT bei ungültigen Werten)."""
+    if pd.api.types.is_numeric_dtype(series):
+        vals = series.astype('float64')
+        mag = np.nanmax(np.abs(vals.values)) if len(vals) else 0
+        unit = 's' if mag < 1e11 else 'ms' if mag < 1e14 else 'us' if mag < 1e17 else 'ns'
+        return pd.to_datetime(vals, unit=unit, utc=True, errors='coerce')
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        return series.dt.tz_convert('UTC')
+    if pd.api.types.is_datetime64_dtype(series):
+        return series.dt.tz_localize(source_tz, ambiguous='NaT', nonexistent='NaT').dt.tz_convert('UTC')
+    text = series.astype('string').str.strip()
+    # Werte mit Offset direkt nach UTC (Offsets können wechseln, z.B. -05:00/-04:00 über die Sommerzeit),
+    # nur Werte ohne Offset in source_tz lokalisieren
+    has_offset = text.str.contains(OFFSET_PATTERN, regex=True).fillna(False).astype(bool)
+    out = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns, UTC]')
+    if has_offset.any():
+        out[has_offset] = _parse(text[has_offset], utc=True)
+    if (~has_offset).any():
+        naive = _parse(text[~has_offset], utc=False)
+        out[~has_offset] = naive.dt.tz_localize(source_tz, ambiguous='NaT', nonexistent='NaT').dt.tz_convert('UTC')
+    return out
+
+
+def _parse(text, utc):
+    """ISO8601 vektorisiert, nicht passende Werte (andere Formate) einzeln per format='mixed'."""
+    parsed = pd.to_datetime(text, errors='coerce', utc=utc, format='ISO8601')
+    retry = parsed.isna() & text.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(text[retry], errors='coerce', utc=utc, format='mixed')
+    return parsed
+
+
+def normalize_frame(raw, mapping, ticker, source_tz):
+    """Vendor-Frame -> validierter Frame mit OUT_COLUMNS; liefert (df, verworfene Zeilen)."""
+    df = raw.rename(columns=mapping)[[c for c in mapping.values()]]
+    if 'ticker' not in df.columns:
+        df['ticker'] = ticker
+    if 'volume' not in df.columns:
+        df['volume'] = 0
+    df['ticker'] = df['ticker'].astype(str).str.upper().str.strip()
+    df['time'] = to_utc(df['time'], source_tz)
+    for c in ('open', 'high', 'low', 'close', 'volume'):
+        df[c] = pd.to_numeric(df[c], errors='coerce')
+    df['volume'] = df['volume'].fillna(0)
+    valid = (
+        df['time'].notna() & df[['open', 'high', 'low', 'close']].notna().all(axis=1)
+        & (df[['open', 'high', 'low', 'close']] > 0).all(axis=1)
+        & (df['high'] >= df[['open', 'close']].max(axis=1))
+        & (df['low'] <= df[['open', 'close']].min(axis=1))
+        & (df['volume'] >= 0)
+    )
+    rejected = int((~valid).sum())
+    return df.loc[valid, OUT_COLUMNS], rejected
+
+
+def resample_bars(df, rule):
+    """OHLCV Aggregation je (ticker, UTC-Slot), Slot gelabelt mit Startzeit."""
+    slot = df['time'].dt.floor(rule)
+    g = df.assign(time=slot).sort_values(['ticker', 'time'], kind='stable').groupby(['ticker', 'time'], sort=False)
+    out = g.agg(open=('open', 'first'), high=('high', 'max'), low=('low', 'min'),
+                close=('close', 'last'), volume=('volume', 'sum')).reset_index()
+    return out[OUT_COLUMNS]
+
+
+def iter_chunks(path, chunk_rows):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.parquet', '.pq'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            yield pd.read_parquet(path)
+            return
+        pf = pq.ParquetFile(path)
+        for batch in pf.iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunk_rows, compression='infer'):
+            yield chunk
+
+
+def copy_rows(cur, df, table, replace):
+    """COPY in Staging-Tabelle + ein INSERT ... ON CONFLICT; liefert neu eingefügte/aktualisierte Zeilen."""
+    if df.empty:
+        return 0
+    df = df.drop_duplicates(['time', 'ticker'], keep='last')
+    buf = io.StringIO()
+    out = df.assign(time=df['time'].dt.strftime('%Y-%m-%d %H:%M:%S+00'), volume=df['volume'].round().astype('int64'))
+    out.to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    cur.execute("TRUNCATE import_stage")
+    cur.copy_expert("COPY import_stage (time, ticker, open, high, low, close, volume) FROM STDIN WITH (FORMAT csv)", buf)
+    conflict = ("DO UPDATE SET open=EXCLUDED.open, high=EXCLUDED.high, low=EXCLUDED.low, "
+                "close=EXCLUDED.close, volume=EXCLUDED.volume") if replace else "DO NOTHING"
+    cur.execute(f"""
+        INSERT INTO {table} (time, ticker, open, high, low, close, volume)
+        SELECT time, ticker, open, high, low, close, volume FROM import_stage
+        ON CONFLICT (time, ticker) {conflict}
+    """)
+    return cur.rowcount
+
+
+def candle_hooks(redis_url, table):
+    """CandleHooks für market_data (Features entstehen nur daraus) oder None."""
+    if table != 'market_data':
+        return None
+    if not redis_url:
+        logging.warning("Kein REDIS_URL: Feature Store / Trainings-Snapshot werden nicht zurückgesetzt")
+        return None
+    import redis
+    return CandleHooks(redis.from_url(redis_url))
+
+
+def written(hooks, df):
+    """Nach dem Commit eines Batches: Rewind ab der frühesten importierten Candle je Ticker."""
+    if hooks is None or df.empty:
+        return
+    first = df.groupby('ticker')['time'].min()
+    hooks.inserted([(ts.to_pydatetime(), ticker) for ticker, ts in first.items()])
+
+
+def import_file(path, dsn, table, resample, source_tz, ticker, chunk_rows, replace, redis_url=None):
+    """Worker: eine Datei streamen, normalisieren, per COPY laden. Commit pro Chunk."""
+    t0 = time.time()
+    hooks = candle_hooks(redis_url, table)
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TEMP TABLE import_stage (
+            time TIMESTAMPTZ, ticker TEXT, open DOUBLE PRECISION, high DOUBLE PRECISION,
+            low DOUBLE PRECISION, close DOUBLE PRECISION, volume BIGINT
+        ) ON COMMIT PRESERVE ROWS
+    """)
+    default_ticker = ticker or ticker_from_filename(path)
+    stats = {'file': path, 'rows_read': 0, 'rows_rejected': 0, 'bars': 0, 'written': 0}
+    mapping = None
+    carry = None
+    try:
+        for chunk in iter_chunks(path, chunk_rows):
+            mapping = mapping or resolve_columns(chunk.columns)
+            stats['rows_read'] += len(chunk)
+            df, rejected = normalize_frame(chunk, mapping, default_ticker, source_tz)
+            stats['rows_rejected'] += rejected
+            if resample:
+                if carry is not None:
+                    df = pd.concat([carry, df], ignore_index=True)
+                # Letzten (evtl. unvollständigen) Slot je Ticker in den nächsten Chunk übernehmen
+                slot = df['time'].dt.floor(resample)
+                last_slot = slot.groupby(df['ticker']).transform('max')
+                carry = df[slot == last_slot]
+                df = resample_bars(df[slot != last_slot], resample)
+            stats['bars'] += len(df)
+            stats['written'] += copy_rows(cur, df, table, replace)
+            conn.commit()
+            written(hooks, df)
+        if resample and carry is not None and not carry.empty:
+            df = resample_bars(carry, resample)
+            stats['bars'] += len(df)
+            stats['written'] += copy_rows(cur, df, table, replace)
+            conn.commit()
+            written(hooks, df)
+    finally:
+        cur.close()
+        conn.close()
+    stats['seconds'] = round(time.time() - t0, 2)
+    stats['rows_per_s'] = round(stats['rows_read'] / max(stats['seconds'], 1e-6), 1)
+    return stats
+
+
+def expand_paths(patterns):
+    paths = []
+    for p in patterns:
+        if os.path.isdir(p):
+            for ext in ('*.csv', '*.csv.gz', '*.parquet', '*.pq'):
+                paths.extend(glob.glob(os.path.join(p, ext)))
+        else:
+            paths.extend(glob.glob(p) or [p])
+    return sorted(set(paths))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-Import von OHLCV CSV/Parquet Dateien in market_data')
+    parser.add_argument('paths', nargs='+', help='Dateien, Verzeichnisse oder Glob-Patterns')
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_URL'), help='Postgres DSN (Default DATABASE_URL)')
+    parser.add_argument('--redis-url', default=os.getenv('REDIS_URL'), help='Redis für Feature-Store Rewind (Default REDIS_URL)')
+    parser.add_argument('--table', default='market_data', choices=sorted(TABLES))
+    parser.add_argument('--resample', default='15min', help="Pandas Frequenz für Slots (Default 15min, 'none' = unverändert)")
+    parser.add_argument('--source-tz', default='US/Eastern', help='Zeitzone für Zeitstempel ohne Offset')
+    parser.add_argument('--ticker', default=None, help='Ticker falls weder Spalte noch Dateiname passen')
+    parser.add_argument('--workers', type=int, default=max(1, min(4, os.cpu_count() or 1)))
+    parser.add_argument('--chunk-rows', type=int, default=500_000)
+    parser.add_argument('--replace', action='store_true', help='Vorhandene Bars überschreiben (ON CONFLICT DO UPDATE)')
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error('Kein DSN (--dsn oder DATABASE_URL)')
+    paths = expand_paths(args.paths)
+    if not paths:
+        parser.error('Keine Dateien gefunden')
+    resample = None if args.resample.lower() == 'none' else args.resample
+
+    t0 = time.time()
+    totals = {'rows_read': 0, 'rows_rejected': 0, 'bars': 0, 'written': 0, 'failed_files': 0}
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(paths))) as pool:
+        futures = {
+            pool.submit(import_file, p, args.dsn, args.table, resample, args.source_tz, args.ticker,
+                        args.chunk_rows, args.replace, args.redis_url): p for p in paths
+        }
+        for fut in as_completed(futures):
+            path = futures[fut]
+            try:
+                st = fut.result()
+            except Exception as e:
+                totals['failed_files'] += 1
+                logging.error(f"{path}: {e}")
+                continue
+            for k in ('rows_read', 'rows_rejected', 'bars', 'written'):
+                totals[k] += st[k]
+            logging.info(f"{path}: rows={st['rows_read']} rejected={st['rows_rejected']} bars={st['bars']} "
+                         f"written={st['written']} {st['seconds']}s ({st['rows_per_s']:.0f} rows/s)")
+    elapsed = max(time.time() - t0, 1e-6)
+    logging.info(f"Fertig: {len(paths)} Dateien, rows={totals['rows_read']} rejected={totals['rows_rejected']} "
+                 f"bars={totals['bars']} written={totals['written']} failed={totals['failed_files']} "
+                 f"in {elapsed:.1f}s -> {totals['rows_read'] / elapsed:.0f} rows/s")
+    return 1 if totals['failed_files'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
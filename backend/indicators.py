@@ -0,0 +1,174 @@
+"""Vektorisierte Intraday-Indikatoren auf 2-D Arrays (Ticker x Zeit) für 15-Minuten Bars.
+
+Alle Kernels arbeiten zeilenweise (eine Zeile je Ticker) mit NumPy über die komplette Matrix, ohne Schleife über
+Ticker. NaN-Padding (unterschiedlich lange Historien) ergibt NaN in allen Fenstern die es berühren.
+
+Jeder Wert hängt nur von den letzten LOOKBACK + 1 Bars ab (EMAs als gewichtetes Fenster über 3 x span Bars statt
+unendlicher Rekursion, VWAP je US/Eastern Handelstag). Damit liefern Batch (ganze Historie), inkrementell
+(update(): Kontext-Tail + neue Bars) und Online (Ringpuffer) exakt dieselben Werte.
+
+Definitionen wie yfinance_enhanced_service.py (dort auf Tagesbars): SMA/Bollinger/RSI über einfache gleitende
+Mittel, Bollinger mit 2 Standardabweichungen (ddof=1). ATR = gleitendes Mittel der True Range.
+"""
+from datetime import datetime
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from market_calendar import EASTERN
+
+EMA_WINDOW_FACTOR = 3
+SMA_WINDOWS = (20, 50)
+RSI_WINDOW = 14
+ATR_WINDOW = 14
+BB_WINDOW = 20
+BB_STD = 2.0
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+VWAP_MAX_SESSION_BARS = 96  # 24h / 15m
+
+INDICATOR_COLUMNS = ['ind_sma_20', 'ind_sma_50', 'ind_rsi_14', 'ind_macd', 'ind_macd_signal',
+                     'ind_bb_upper', 'ind_bb_lower', 'ind_atr_14', 'ind_vwap']
+INPUT_COLUMNS = ['time', 'high', 'low', 'close', 'volume']
+
+
+def ema_window(span):
+    return EMA_WINDOW_FACTOR * span
+
+
+LOOKBACK = max(max(SMA_WINDOWS), RSI_WINDOW, ATR_WINDOW, BB_WINDOW,
+               ema_window(MACD_SLOW) + ema_window(MACD_SIGNAL) - 1, VWAP_MAX_SESSION_BARS)
+
+
+def _window_sums(x, w):
+    """Summe und Anzahl gültiger Werte je Fenster der Länge w (Ende bei t) -> (sum, count), Form wie x."""
+    valid = ~np.isnan(x)
+    c = np.zeros((x.shape[0], x.shape[1] + 1))
+    n = np.zeros_like(c)
+    np.cumsum(np.where(valid, x, 0.0), axis=1, out=c[:, 1:])
+    np.cumsum(valid, axis=1, out=n[:, 1:])
+    s = np.full(x.shape, np.nan)
+    cnt = np.zeros(x.shape)
+    if x.shape[1] >= w:
+        s[:, w - 1:] = c[:, w:] - c[:, :-w]
+        cnt[:, w - 1:] = n[:, w:] - n[:, :-w]
+    return s, cnt
+
+
+def rolling_mean(x, w):
+    s, cnt = _window_sums(x, w)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(cnt == w, s / w, np.nan)
+
+
+def rolling_std(x, w):
+    """Stichproben-Standardabweichung (ddof=1) wie pandas rolling().std(); Offset je Zeile gegen Auslöschung."""
+    offset = np.nanmean(x, axis=1, keepdims=True) if x.size else 0.0
+    offset = np.where(np.isnan(offset), 0.0, offset)
+    y = x - offset
+    s, cnt = _window_sums(y, w)
+    s2, _ = _window_sums(y * y, w)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = (s2 - s * s / w) / (w - 1)
+    return np.where(cnt == w, np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+
+def ema(x, span):
+    """EMA (alpha = 2/(span+1)) als normiertes Gewichtsfenster über ema_window(span) Bars."""
+    w = ema_window(span)
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] < w:
+        return out
+    beta = 1.0 - 2.0 / (span + 1.0)
+    weights = beta ** np.arange(w - 1, -1, -1)  # älteste .. neueste
+    weights /= weights.sum()
+    out[:, w - 1:] = sliding_window_view(x, w, axis=1) @ weights
+    return out
+
+
+def rsi(close, w=RSI_WINDOW):
+    delta = np.full(close.shape, np.nan)
+    delta[:, 1:] = np.diff(close, axis=1)
+    gain = rolling_mean(np.where(np.isnan(delta), np.nan, np.maximum(delta, 0.0)), w)
+    loss = rolling_mean(np.where(np.isnan(delta), np.nan, np.maximum(-delta, 0.0)), w)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 100.0 - 100.0 / (1.0 + gain / loss)
+
+
+def macd(close, fast=MACD_FAST, slow=MACD_SLOW, signal=MACD_SIGNAL):
+    line = ema(close, fast) - ema(close, slow)
+    return line, ema(line, signal)
+
+
+def bollinger(close, w=BB_WINDOW, k=BB_STD):
+    mid = rolling_mean(close, w)
+    sd = rolling_std(close, w)
+    return mid + k * sd, mid - k * sd
+
+
+def atr(high, low, close, w=ATR_WINDOW):
+    prev = np.full(close.shape, np.nan)
+    prev[:, 1:] = close[:, :-1]
+    hl = high - low
+    with np.errstate(invalid='ignore'):
+        tr = np.fmax(hl, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+    return rolling_mean(np.where(np.isnan(hl), np.nan, tr), w)
+
+
+def session_days(epoch_seconds):
+    """US/Eastern Kalendertag je Bar (Tage seit Epoch, ganzzahlig als float; NaN bleibt NaN)."""
+    flat = epoch_seconds.ravel()
+    out = np.full(flat.shape, np.nan)
+    ok = ~np.isnan(flat)
+    if ok.any():
+        # Offset ET->UTC (DST) als Tabelle je Stunde über den Datenbereich statt pro Bar
+        hours = np.floor(flat[ok] / 3600.0).astype(np.int64)
+        h0 = int(hours.min())
+        offs = np.array([datetime.fromtimestamp(h * 3600.0, EASTERN).utcoffset().total_seconds()
+                         for h in range(h0, int(hours.max()) + 1)])
+        out[ok] = np.floor((flat[ok] + offs[hours - h0]) / 86400.0)
+    return out.reshape(epoch_seconds.shape)
+
+
+def vwap(high, low, close, volume, days):
+    """Session-VWAP: kumulativ (typischer Preis x Volumen) / Volumen, Neustart je US/Eastern Handelstag."""
+    tp = (high + low + close) / 3.0
+    valid = ~(np.isnan(tp) | np.isnan(volume))
+    pv = np.where(valid, tp * volume, 0.0)
+    v = np.where(valid, volume, 0.0)
+    cpv = np.cumsum(pv, axis=1)
+    cv = np.cumsum(v, axis=1)
+    n, t = days.shape
+    new_day = np.ones((n, t), dtype=bool)
+    if t > 1:
+        new_day[:, 1:] = days[:, 1:] != days[:, :-1]
+    # Index des Session-Starts je Position, Basis = kumulativer Wert vor dem Start
+    start = np.maximum.accumulate(np.where(new_day, np.arange(t), 0), axis=1)
+    rows = np.arange(n)[:, None]
+    base_pv = np.where(start > 0, cpv[rows, start - 1], 0.0)
+    base_v = np.where(start > 0, cv[rows, start - 1], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = (cpv - base_pv) / (cv - base_v)
+    return np.where(valid & (cv - base_v > 0), out, np.nan)
+
+
+def compute(arrays):
+    """Batch: arrays = {time (Epoch-Sekunden), high, low, close, volume} je (N, T) -> {INDICATOR_COLUMNS: (N, T)}."""
+    close, high, low = arrays['close'], arrays['high'], arrays['low']
+    out = {}
+    for w in SMA_WINDOWS:
+        out[f'ind_sma_{w}'] = rolling_mean(close, w)
+    out['ind_rsi_14'] = rsi(close)
+    out['ind_macd'], out['ind_macd_signal'] = macd(close)
+    out['ind_bb_upper'], out['ind_bb_lower'] = bollinger(close)
+    out['ind_atr_14'] = atr(high, low, close)
+    out['ind_vwap'] = vwap(high, low, close, arrays['volume'], session_days(arrays['time']))
+    return out
+
+
+def update(tail, new):
+    """Inkrementell: tail = letzte (bis zu) LOOKBACK Spalten je Input, new = neue Bars (N, k).
+
+    -> (Indikatoren nur für die k neuen Spalten, neuer Tail). Werte identisch zu compute() über die ganze Historie.
+    """
+    full = {c: np.concatenate([tail[c], new[c]], axis=1) if tail is not None else new[c] for c in INPUT_COLUMNS}
+    k = new['close'].shape[1]
+    out = {name: vals[:, -k:] for name, vals in compute(full).items()} if k else {name: np.empty((full['close'].shape[0], 0)) for name in INDICATOR_COLUMNS}
+    return out, {c: v[:, -LOOKBACK:] for c, v in full.items()}
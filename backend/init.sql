@@ -7,8 +7,11 @@ CREATE TABLE IF NOT EXISTS market_data (
     high DOUBLE PRECISION,
     low DOUBLE PRECISION,
     close DOUBLE PRECISION,
-    volume BIGINT
+    volume BIGINT,
+    -- Herkunft: provider | stream | snapshot | NULL (Altbestand/Import); Provider ersetzen stream/snapshot
+    source TEXT
 );
+ALTER TABLE market_data ADD COLUMN IF NOT EXISTS source TEXT;
 
 -- Create predictions table
 CREATE TABLE IF NOT EXISTS predictions (
@@ -20,6 +23,71 @@ CREATE TABLE IF NOT EXISTS predictions (
 
 -- Create index for faster queries
 CREATE INDEX IF NOT EXISTS idx_market_data_ticker_time ON market_data(ticker, time);
+-- Eindeutiger Slot pro Ticker (Voraussetzung für ON CONFLICT (time, ticker) im Worker / Stream Ingestor)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_market_data_time_ticker ON market_data(time, ticker);
+
+-- 1-Minuten Bars aus dem Stream Ingestor (market_data bleibt bei 15m Candles)
+CREATE TABLE IF NOT EXISTS market_data_1m (
+    time TIMESTAMPTZ NOT NULL,
+    ticker TEXT NOT NULL,
+    open DOUBLE PRECISION,
+    high DOUBLE PRECISION,
+    low DOUBLE PRECISION,
+    close DOUBLE PRECISION,
+    volume BIGINT,
+    PRIMARY KEY (time, ticker)
+);
+CREATE INDEX IF NOT EXISTS idx_market_data_1m_ticker_time ON market_data_1m(ticker, time);
+
+-- Feature Store: materialisierte Pipeline-Features je Candle (backend/feature_store.py, Watermark in Redis)
+CREATE TABLE IF NOT EXISTS market_features (
+    time TIMESTAMPTZ NOT NULL,
+    ticker TEXT NOT NULL,
+    open DOUBLE PRECISION,
+    high DOUBLE PRECISION,
+    low DOUBLE PRECISION,
+    close DOUBLE PRECISION,
+    volume DOUBLE PRECISION,
+    prev_close DOUBLE PRECISION,
+    prev_close_5 DOUBLE PRECISION,
+    prev_close_15 DOUBLE PRECISION,
+    price_change DOUBLE PRECISION,
+    price_change_5 DOUBLE PRECISION,
+    price_change_15 DOUBLE PRECISION,
+    volatility DOUBLE PRECISION,
+    hour INT,
+    day_of_week INT,
+    ind_sma_20 DOUBLE PRECISION,
+    ind_sma_50 DOUBLE PRECISION,
+    ind_rsi_14 DOUBLE PRECISION,
+    ind_macd DOUBLE PRECISION,
+    ind_macd_signal DOUBLE PRECISION,
+    ind_bb_upper DOUBLE PRECISION,
+    ind_bb_lower DOUBLE PRECISION,
+    ind_atr_14 DOUBLE PRECISION,
+    ind_vwap DOUBLE PRECISION,
+    grok_sentiment DOUBLE PRECISION,
+    grok_expected_gain DOUBLE PRECISION,
+    PRIMARY KEY (time, ticker)
+);
+CREATE INDEX IF NOT EXISTS idx_market_features_ticker_time ON market_features(ticker, time);
+
+-- Modell-Registry: eine Zeile je trainierter Version (backend/model_registry.py, aktiver Pointer in Redis)
+CREATE TABLE IF NOT EXISTS model_versions (
+    version TEXT PRIMARY KEY,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    trigger TEXT,
+    status TEXT NOT NULL,
+    path TEXT,
+    horizons JSONB,
+    metrics JSONB,
+    feature_fingerprint TEXT,
+    snapshot TEXT,
+    training JSONB,
+    promoted_at TIMESTAMPTZ,
+    deleted_at TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS idx_model_versions_created ON model_versions(created_at);
 CREATE INDEX IF NOT EXISTS idx_predictions_ticker_time ON predictions(ticker, time);
 
 -- Portfolio-Daten
@@ -0,0 +1,100 @@
+"""US-Markt Kalender Hilfen (NYSE reguläre Session 9:30-16:00 ET, 15m Slots).
+
+Wochenenden, Börsenfeiertage (holidays NYSE Kalender, Fallback holidays.UnitedStates) und
+verkürzte Handelstage (13:00 ET). Reine Funktionen ohne Redis/DB Abhängigkeit, damit Fetch-,
+Gap- und Backfill-Logik sie teilen können.
+"""
+from datetime import datetime, timedelta, time as dtime, timezone
+import numpy as np
+import pytz
+import holidays
+
+EASTERN = pytz.timezone('US/Eastern')
+SESSION_OPEN = dtime(9, 30)
+SESSION_CLOSE = dtime(16, 0)
+EARLY_CLOSE = dtime(13, 0)
+SLOT_MINUTES = 15
+
+_holiday_cache = {}
+
+
+def _us_holidays(year):
+    h = _holiday_cache.get(year)
+    if h is None:
+        try:
+            # NYSE Kalender (Good Friday ja, Columbus/Veterans Day nein)
+            h = holidays.financial_holidays('NYSE', years=year)
+        except Exception:
+            h = holidays.UnitedStates(years=year)
+        _holiday_cache[year] = h
+    return h
+
+
+def _as_utc(dt):
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def is_trading_day(d):
+    return d.weekday() < 5 and d not in _us_holidays(d.year)
+
+
+def is_early_close(d):
+    """Verkürzte Sessions (Schluss 13:00 ET): Tag vor Independence Day, Tag nach Thanksgiving, Heiligabend."""
+    if not is_trading_day(d):
+        return False
+    if d.month == 7 and d.day == 3:
+        return True
+    if d.month == 12 and d.day == 24:
+        return True
+    if d.month == 11 and d.weekday() == 4:
+        thanksgiving = d - timedelta(days=1)
+        return 22 <= thanksgiving.day <= 28  # 4. Donnerstag im November
+    return False
+
+
+def session_bounds(d):
+    """(open, close) als tz-aware UTC datetimes für Handelstag d, None wenn kein Handelstag."""
+    if not is_trading_day(d):
+        return None
+    open_et = EASTERN.localize(datetime.combine(d, SESSION_OPEN))
+    close_et = EASTERN.localize(datetime.combine(d, EARLY_CLOSE if is_early_close(d) else SESSION_CLOSE))
+    return open_et.astimezone(timezone.utc), close_et.astimezone(timezone.utc)
+
+
+def last_closed_slot(now=None, slot_minutes=SLOT_MINUTES):
+    """Start (UTC) des letzten vollständig abgeschlossenen Session-Slots vor now.
+
+    Ein Ticker dessen letzte Candle >= diesem Zeitpunkt ist, ist aktuell (nichts Neues beim Provider).
+    """
+    now = _as_utc(now or datetime.now(timezone.utc))
+    slot = timedelta(minutes=slot_minutes)
+    day = now.astimezone(EASTERN).date()
+    for _ in range(15):
+        bounds = session_bounds(day)
+        if bounds:
+            s_open, s_close = bounds
+            if now >= s_open + slot:
+                closed = int((min(now, s_close) - s_open) / slot)
+                return s_open + (closed - 1) * slot
+        day -= timedelta(days=1)
+    return None
+
+
+def expected_slots(start, end, slot_minutes=SLOT_MINUTES):
+    """Sortiertes int64 Array (Epoch Sekunden) aller Slot-Starts der Sessions mit start <= slot und Slot-Ende <= end."""
+    start, end = _as_utc(start), _as_utc(end)
+    step = slot_minutes * 60
+    lo, hi = int(start.timestamp()), int(end.timestamp())
+    parts = []
+    day = start.astimezone(EASTERN).date()
+    last_day = end.astimezone(EASTERN).date()
+    while day <= last_day:
+        bounds = session_bounds(day)
+        if bounds:
+            o, c = int(bounds[0].timestamp()), int(bounds[1].timestamp())
+            parts.append(np.arange(o, c, step, dtype=np.int64))
+        day += timedelta(days=1)
+    if not parts:
+        return np.empty(0, dtype=np.int64)
+    grid = np.concatenate(parts)
+    return grid[(grid >= lo) & (grid + step <= hi)]
@@ -0,0 +1,177 @@
+"""Versionierte Modell-Registry: unveränderliche Versionsverzeichnisse, Metadaten in Postgres, atomarer Redis-Pointer.
+
+- Training schreibt nach MODEL_REGISTRY_DIR/.staging/{version}/{hz}. Erst wenn alle Horizonte und Artefakte fertig
+  sind, verschiebt commit() das Verzeichnis per os.rename nach MODEL_REGISTRY_DIR/{version} (atomar auf demselben
+  Dateisystem); danach wird es nicht mehr verändert.
+- Tabelle model_versions (init.sql): Trigger, Status (training/ready/active/retired/failed/deleted), Pfade, Metriken,
+  Feature-Fingerprint, Trainings-Snapshot (training_snapshots.py), Trainingsstatistik. version.json im
+  Versionsverzeichnis hält Snapshot und Fingerprint auch ohne Datenbank.
+- promote() setzt den Redis Pointer model_registry_active ({version, paths}) mit einem einzigen SET; Inferenz liest
+  nur diesen Pointer und sieht damit nie ein halb geschriebenes Modell.
+- gc() löscht nach einer Promotion alle Versionen außer den letzten MODEL_REGISTRY_KEEP (Default 5) und der aktiven,
+  dazu liegengebliebene Staging-Verzeichnisse (abgebrochene Trainings).
+
+DB-Schreibzugriffe sind best effort (Rollback + Log): Dateien und Pointer bleiben die Quelle der Wahrheit.
+ensure_schema() legt model_versions an bzw. ergänzt neue Spalten (init.sql läuft nur bei frischem Datenverzeichnis).
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+from datetime import datetime, timezone
+
+ACTIVE_KEY = 'model_registry_active'
+TABLE = 'model_versions'
+STAGING = '.staging'
+VERSION_FILE = 'version.json'
+COLUMNS = [
+    ('created_at', 'TIMESTAMPTZ NOT NULL DEFAULT NOW()'),
+    ('trigger', 'TEXT'),
+    ('status', "TEXT NOT NULL DEFAULT 'training'"),
+    ('path', 'TEXT'),
+    ('horizons', 'JSONB'),
+    ('metrics', 'JSONB'),
+    ('feature_fingerprint', 'TEXT'),
+    ('snapshot', 'TEXT'),
+    ('training', 'JSONB'),
+    ('promoted_at', 'TIMESTAMPTZ'),
+    ('deleted_at', 'TIMESTAMPTZ'),
+]
+
+
+class ModelRegistry:
+    def __init__(self, redis_client, root=None, keep=None):
+        self.r = redis_client
+        self.root = root or os.getenv('MODEL_REGISTRY_DIR', './models')
+        self.keep = int(keep if keep is not None else os.getenv('MODEL_REGISTRY_KEEP', '5'))
+        self._schema_ok = False
+
+    def ensure_schema(self, conn):
+        """model_versions + Spalten idempotent anlegen, einmal je Prozess (best effort wie alle DB-Zugriffe)."""
+        if self._schema_ok:
+            return
+        try:
+            cur = conn.cursor()
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} (version TEXT PRIMARY KEY)")
+            for name, ddl in COLUMNS:
+                cur.execute(f"ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS {name} {ddl}")
+            cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_created ON {TABLE}(created_at)")
+            conn.commit()
+            self._schema_ok = True
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"model registry schema failed: {e}")
+
+    def _db(self, conn, sql, params):
+        try:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            conn.commit()
+            return cur
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"model registry db write failed: {e}")
+            return None
+
+    def active(self):
+        """Aktive Version -> {'version', 'paths', 'promoted_at'} oder None."""
+        raw = self.r.get(ACTIVE_KEY)
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def staging_path(self, version):
+        return os.path.join(self.root, STAGING, version)
+
+    def version_path(self, version):
+        return os.path.join(self.root, version)
+
+    def create(self, conn, trigger, horizons):
+        """Neue Version anlegen -> (version, {hz: Staging-Pfad})."""
+        self.ensure_schema(conn)
+        version = datetime.now(timezone.utc).strftime('v%Y%m%d%H%M%S%f')[:-3] + '-' + uuid.uuid4().hex[:6]
+        staging = self.staging_path(version)
+        os.makedirs(staging)
+        self._db(conn, f"INSERT INTO {TABLE} (version, trigger, status, horizons) VALUES (%s, %s, 'training', %s)",
+                 (version, trigger, json.dumps(list(horizons))))
+        return version, {hz: os.path.join(staging, hz) for hz in horizons}
+
+    def commit(self, conn, version, metrics=None, fingerprint=None, training=None, snapshot=None):
+        """Staging -> unveränderliches Versionsverzeichnis (os.rename) -> {hz: finaler Pfad}."""
+        staging = self.staging_path(version)
+        final = self.version_path(version)
+        horizons = sorted(d for d in os.listdir(staging) if os.path.isdir(os.path.join(staging, d)))
+        with open(os.path.join(staging, VERSION_FILE), 'w') as fh:
+            json.dump({'version': version, 'snapshot': snapshot, 'feature_fingerprint': fingerprint,
+                       'metrics': metrics or {}}, fh)
+        os.rename(staging, final)
+        paths = {hz: os.path.join(final, hz) for hz in horizons}
+        self._db(conn, f"""
+            UPDATE {TABLE} SET status = 'ready', path = %s, metrics = %s, feature_fingerprint = %s, snapshot = %s,
+                   training = %s
+            WHERE version = %s
+        """, (final, json.dumps(metrics or {}), fingerprint, snapshot, json.dumps(training or {}, default=str),
+              version))
+        return paths
+
+    def fail(self, conn, version, error):
+        shutil.rmtree(self.staging_path(version), ignore_errors=True)
+        self._db(conn, f"UPDATE {TABLE} SET status = 'failed', training = %s WHERE version = %s",
+                 (json.dumps({'error': str(error)[:500]}), version))
+
+    def promote(self, conn, version, paths):
+        """Pointer atomar auf version setzen (ein SET), DB: neue Version active, vorherige retired."""
+        previous = self.active()
+        pointer = {'version': version, 'paths': paths, 'promoted_at': datetime.now(timezone.utc).isoformat()}
+        self.r.set(ACTIVE_KEY, json.dumps(pointer))
+        self._db(conn, f"""
+            UPDATE {TABLE} SET status = CASE WHEN version = %s THEN 'active' ELSE 'retired' END,
+                   promoted_at = CASE WHEN version = %s THEN NOW() ELSE promoted_at END
+            WHERE version = %s OR status = 'active'
+        """, (version, version, version))
+        return previous
+
+    def versions(self):
+        """Fertige Versionsverzeichnisse, älteste zuerst (Versionsname beginnt mit UTC-Zeitstempel)."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root)
+                      if d != STAGING and os.path.isdir(os.path.join(self.root, d)))
+
+    def snapshots(self):
+        """{version: Snapshot-ID} der vorhandenen Versionen (aus version.json; ältere Versionen ohne Datei fehlen)."""
+        out = {}
+        for v in self.versions():
+            try:
+                with open(os.path.join(self.version_path(v), VERSION_FILE)) as fh:
+                    snapshot = json.load(fh).get('snapshot')
+            except (OSError, ValueError):
+                continue
+            if snapshot:
+                out[v] = snapshot
+        return out
+
+    def gc(self, conn, staging_max_age=86400):
+        """Alte Versionen (außer den letzten keep und der aktiven) + verwaiste Staging-Verzeichnisse löschen."""
+        active = (self.active() or {}).get('version')
+        versions = self.versions()
+        doomed = [v for v in versions[:-self.keep] if v != active] if self.keep > 0 else []
+        for v in doomed:
+            shutil.rmtree(self.version_path(v), ignore_errors=True)
+        if doomed:
+            self._db(conn, f"UPDATE {TABLE} SET status = 'deleted', deleted_at = NOW() WHERE version = ANY(%s)",
+                     (doomed,))
+        staging_root = os.path.join(self.root, STAGING)
+        stale = []
+        if os.path.isdir(staging_root):
+            for v in os.listdir(staging_root):
+                path = os.path.join(staging_root, v)
+                if time.time() - os.path.getmtime(path) > staging_max_age:
+                    shutil.rmtree(path, ignore_errors=True)
+                    stale.append(v)
+        return {'deleted': doomed, 'stale_staging': stale, 'kept': [v for v in versions if v not in doomed]}
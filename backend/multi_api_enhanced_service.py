@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import concurrent.futures
 from threading import Lock
+from consensus import readings_matrix, aggregate_consensus
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format='[multi-api-enhanced] %(asctime)s %(levelname)s %(message)s')
@@ -19,6 +20,9 @@ TWELVE_DATA_API_KEY = os.getenv('TWELVE_DATA_API_KEY')
 r = redis.from_url(REDIS_URL)
 rate_limit_lock = Lock()
 
+# Priority: FMP > Finnhub > Marketstack (Spaltenreihenfolge der Konsens-Matrix)
+SOURCES = ['fmp', 'finnhub', 'marketstack']
+
 def get_tickers():
     """Hole aktuelle Ticker Liste aus Redis dynamic_tickers"""
     try:
@@ -179,39 +183,33 @@ def fetch_multi_api_data():
                 api_stats[api_name]['errors'] = 1
                 logging.error(f"❌ {api_name}: {e}")
     
-    # Process and aggregate results
+    # Process and aggregate results: gemeinsamer Konsens (Median + MAD) wie in worker.fetch_data
+    agg_tickers, price_matrix = readings_matrix(all_results, SOURCES)
+    agg = aggregate_consensus(price_matrix, SOURCES, SOURCES)
     aggregated_data = {}
-    for ticker, sources in all_results.items():
-        if not sources:
+    now_iso = datetime.utcnow().isoformat()
+    for i, ticker in enumerate(agg_tickers):
+        if agg['primary'][i] < 0:
             continue
-            
-        # Priority: FMP > Finnhub > Marketstack
-        primary = None
-        for source_priority in ['fmp', 'finnhub', 'marketstack']:
-            primary = next((s for s in sources if s['source'] == source_priority), None)
-            if primary:
-                break
-        
-        if primary:
-            # Calculate price consensus if multiple sources
-            prices = [s['price'] for s in sources if s.get('price')]
-            consensus_price = sum(prices) / len(prices) if prices else primary['price']
-            
-            aggregated_data[ticker] = {
-                'price': consensus_price,
-                'open': primary.get('open'),
-                'high': primary.get('high'),
-                'low': primary.get('low'),
-                'change': primary.get('change'),
-                'change_pct': primary.get('change_pct'),
-                'volume': primary.get('volume', 0),
-                'primary_source': primary['source'],
-                'sources_count': len(sources),
-                'sources_used': [s['source'] for s in sources],
-                'market_cap': primary.get('market_cap'),
-                'pe_ratio': primary.get('pe_ratio'),
-                'timestamp': datetime.utcnow().isoformat()
-            }
+        sources = all_results[ticker]
+        primary_src = SOURCES[agg['primary'][i]]
+        primary = next(s for s in sources if s['source'] == primary_src)
+        aggregated_data[ticker] = {
+            'price': float(agg['consensus'][i]),
+            'open': primary.get('open'),
+            'high': primary.get('high'),
+            'low': primary.get('low'),
+            'change': primary.get('change'),
+            'change_pct': primary.get('change_pct'),
+            'volume': primary.get('volume', 0),
+            'primary_source': primary_src,
+            'sources_count': len(sources),
+            'sources_used': [s['source'] for s in sources],
+            'outlier_sources': [SOURCES[j] for j in range(len(SOURCES)) if agg['outlier'][i, j]],
+            'market_cap': primary.get('market_cap'),
+            'pe_ratio': primary.get('pe_ratio'),
+            'timestamp': now_iso
+        }
     
     # Store results in Redis
     r.set('multi_api_enhanced_data', json.dumps(aggregated_data))
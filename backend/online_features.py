@@ -0,0 +1,187 @@
+"""Online Feature-State je Ticker für die Inferenz (O(1) pro neuer Bar statt Query + DataFrame je Ticker).
+
+Pro Ticker: Ringpuffer (deque, Länge pipeline.lookback + 1) der benötigten Spalten (close, Indikator-Inputs, time
+als Epoch-Sekunden), letzte Bar, Anzahl gesehener Bars. push() ist O(1); rows() wertet die Schritte aus
+feature_pipeline.py auf den Puffern aus (derive_online, Indikatoren einmal vektorisiert über alle Ticker), die
+Werte entsprechen derive(mode='last') auf denselben Bars.
+
+State liegt im Worker-Speicher und als Snapshot im Redis Hash online_feature_state (ticker -> JSON, enthält den
+Fingerprint der zustandslosen Pipeline-Schritte). sync() prüft mit einem HMGET ob der Speicher-State noch dem Snapshot entspricht
+(anderer Prozess hat fortgeschrieben / Backfill hat invalidiert), holt nur Bars nach der letzten bekannten Zeit
+und initialisiert fehlende Ticker mit einer gemeinsamen Abfrage aus market_data.
+"""
+import json
+from collections import deque
+from datetime import datetime, timezone
+import pandas as pd
+from feature_pipeline import DEFAULT_PIPELINE, BASE_COLUMNS
+
+STATE_KEY = 'online_feature_state'
+
+
+class TickerFeatureState:
+    __slots__ = ('buffers', 'bar', 'count')
+
+    def __init__(self, lagged_columns, size):
+        self.buffers = {c: deque(maxlen=size) for c in lagged_columns}
+        self.bar = None  # {'time': datetime, 'open': .., ...}
+        self.count = 0
+
+    @property
+    def time(self):
+        return self.bar['time'] if self.bar else None
+
+    def push(self, time, open_, high, low, close, volume):
+        """Neue Bar anhängen; gleiche Zeit wie die letzte Bar ersetzt diese (revidierte Bar), ältere werden ignoriert."""
+        if self.bar is not None and time < self.bar['time']:
+            return False
+        replace = self.bar is not None and time == self.bar['time']
+        self.bar = {'time': time, 'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}
+        for col, buf in self.buffers.items():
+            if replace:
+                buf.pop()
+            buf.append(time.timestamp() if col == 'time' else self.bar[col])
+        if not replace:
+            self.count += 1
+        return True
+
+    def to_json(self, fingerprint):
+        bar = dict(self.bar, time=self.bar['time'].isoformat())
+        return json.dumps({'fp': fingerprint, 'bar': bar, 'count': self.count,
+                           'buffers': {c: list(b) for c, b in self.buffers.items()}})
+
+    @classmethod
+    def from_json(cls, raw, lagged_columns, size):
+        data = json.loads(raw)
+        state = cls(lagged_columns, size)
+        state.bar = dict(data['bar'], time=datetime.fromisoformat(data['bar']['time']))
+        state.count = data['count']
+        for c in lagged_columns:
+            state.buffers[c].extend(data['buffers'].get(c, []))
+        return state
+
+
+class OnlineFeatures:
+    def __init__(self, redis_client, pipeline=None, min_rows=20):
+        self.r = redis_client
+        self.pipeline = pipeline or DEFAULT_PIPELINE
+        self.min_rows = min_rows
+        self.size = self.pipeline.lookback + 1
+        self.lagged = self.pipeline.lagged_columns
+        self.states = {}
+        self._raw = {}  # zuletzt gesehener/geschriebener Snapshot je Ticker
+
+    def _new_state(self):
+        return TickerFeatureState(self.lagged, self.size)
+
+    def invalidate(self, ticker, since=None):
+        """State verwerfen (z.B. Backfill fügt Bars vor der letzten bekannten Bar ein); since=None -> immer."""
+        if since is not None:
+            raw = self.r.hget(STATE_KEY, ticker)
+            if raw is None:
+                return False
+            last = datetime.fromisoformat(json.loads(raw)['bar']['time'])
+            since = since if since.tzinfo else since.replace(tzinfo=timezone.utc)
+            if since > last:
+                return False
+        self.r.hdel(STATE_KEY, ticker)
+        self.states.pop(ticker, None)
+        self._raw.pop(ticker, None)
+        return True
+
+    def _restore(self, tickers):
+        """Speicher-State gegen Redis-Snapshots abgleichen -> Ticker ohne gültigen State."""
+        raws = self.r.hmget(STATE_KEY, tickers) if tickers else []
+        cold = []
+        fp = self.pipeline.derive_fingerprint
+        for t, raw in zip(tickers, raws):
+            raw = raw.decode() if isinstance(raw, bytes) else raw
+            if raw is None:
+                self.states.pop(t, None)
+                self._raw.pop(t, None)
+                cold.append(t)
+            elif raw != self._raw.get(t):
+                try:
+                    if json.loads(raw).get('fp') != fp:
+                        raise ValueError('fingerprint')
+                    self.states[t] = TickerFeatureState.from_json(raw, self.lagged, self.size)
+                    self._raw[t] = raw
+                except (ValueError, KeyError, TypeError):
+                    self.states.pop(t, None)
+                    self._raw.pop(t, None)
+                    cold.append(t)
+        return cold
+
+    def _warm(self, cur, tickers):
+        """Fehlende Ticker mit den letzten max(min_rows, lookback + 1) Bars initialisieren (eine Abfrage)."""
+        cur.execute("""
+            SELECT t.ticker, m.time, m.open, m.high, m.low, m.close, m.volume
+            FROM unnest(%s::text[]) AS t(ticker)
+            CROSS JOIN LATERAL (
+                SELECT time, open, high, low, close, volume FROM market_data
+                WHERE ticker = t.ticker ORDER BY time DESC LIMIT %s
+            ) m
+        """, (list(tickers), max(self.min_rows, self.size)))
+        rows = sorted(cur.fetchall(), key=lambda row: (row[0], row[1]))
+        for t in tickers:
+            self.states[t] = self._new_state()
+        for t, *bar in rows:
+            self.states[t].push(*bar)
+        return len(rows)
+
+    def _advance(self, cur, tickers):
+        """Bars nach der letzten bekannten Zeit je Ticker anhängen (eine Abfrage, Index-Scan je Ticker)."""
+        known = [t for t in tickers if self.states[t].time is not None]
+        if not known:
+            return 0
+        cur.execute("""
+            SELECT t.ticker, m.time, m.open, m.high, m.low, m.close, m.volume
+            FROM unnest(%s::text[], %s::timestamptz[]) AS t(ticker, last)
+            CROSS JOIN LATERAL (
+                SELECT time, open, high, low, close, volume FROM market_data
+                WHERE ticker = t.ticker AND time > t.last ORDER BY time
+            ) m
+        """, (known, [self.states[t].time for t in known]))
+        n = 0
+        for t, *bar in cur.fetchall():
+            n += int(self.states[t].push(*bar))
+        return n
+
+    def sync(self, cur, tickers):
+        """States für tickers aktuell machen und geänderte Snapshots nach Redis schreiben -> Statistik."""
+        tickers = list(tickers)
+        cold = self._restore(tickers)
+        warmed = self._warm(cur, cold) if cold else 0
+        before = {t: (self.states[t].time, self.states[t].count) for t in tickers}
+        pushed = self._advance(cur, tickers)
+        fp = self.pipeline.derive_fingerprint
+        pipe = self.r.pipeline(transaction=False)
+        dirty = 0
+        for t in tickers:
+            st = self.states[t]
+            if st.bar is None or (t not in cold and before[t] == (st.time, st.count)):
+                continue
+            raw = st.to_json(fp)
+            pipe.hset(STATE_KEY, t, raw)  # einzelne Felder (HSET mit mehreren Feldern erst ab Redis 4)
+            self._raw[t] = raw
+            dirty += 1
+        if dirty:
+            pipe.execute()
+        return {'tickers': len(tickers), 'cold': len(cold), 'warm_rows': warmed, 'pushed': pushed, 'snapshots': dirty}
+
+    def rows(self, tickers):
+        """Feature-Zeilen (eine je Ticker mit >= min_rows Bars) + {ticker: gesehene Bars}."""
+        feats = []
+        buffers_list = []
+        counts = {}
+        for t in tickers:
+            st = self.states.get(t)
+            if st is None or st.bar is None:
+                continue
+            counts[t] = st.count
+            if st.count >= self.min_rows:
+                feats.append(dict(st.bar, ticker=t))
+                buffers_list.append(st.buffers)
+        self.pipeline.derive_online(feats, buffers_list)
+        cols = ['ticker', 'time'] + BASE_COLUMNS + self.pipeline.derived_columns
+        return pd.DataFrame(feats, columns=cols), counts
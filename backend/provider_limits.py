@@ -0,0 +1,63 @@
+"""Verteilte Concurrency-Limits pro Provider (Redis ZSET Semaphore).
+
+Mehrere Celery Worker-Prozesse teilen sich Provider-Ratelimits. Jeder laufende Request hält einen
+Token im ZSET provider_slots:{provider} (Score = Ablaufzeit). Abgelaufene Tokens (abgestürzter Worker)
+werden beim nächsten acquire entfernt, dadurch kann kein Slot dauerhaft verloren gehen.
+
+Limits per Env: BACKFILL_MAX_CONCURRENCY_FINNHUB / _TWELVEDATA / _FMP (Default siehe DEFAULT_LIMITS).
+"""
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+KEY_PREFIX = 'provider_slots'
+DEFAULT_LIMITS = {'finnhub': 2, 'twelvedata': 1, 'fmp': 2}
+
+_ACQUIRE_LUA = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[4])
+    return 1
+end
+return 0
+"""
+
+
+def provider_limit(provider):
+    return int(os.getenv(f'BACKFILL_MAX_CONCURRENCY_{provider.upper()}', DEFAULT_LIMITS.get(provider, 1)))
+
+
+class ProviderSlots:
+    def __init__(self, redis_client, lease_seconds=120):
+        self.r = redis_client
+        self.lease_seconds = lease_seconds
+        self._acquire = self.r.register_script(_ACQUIRE_LUA)
+
+    def try_acquire(self, provider):
+        """Token oder None wenn das Limit des Providers ausgeschöpft ist."""
+        token = uuid.uuid4().hex
+        ok = self._acquire(keys=[f'{KEY_PREFIX}:{provider}'],
+                           args=[time.time(), provider_limit(provider), self.lease_seconds, token])
+        return token if ok else None
+
+    def release(self, provider, token):
+        self.r.zrem(f'{KEY_PREFIX}:{provider}', token)
+
+    def in_use(self, provider):
+        return self.r.zcount(f'{KEY_PREFIX}:{provider}', time.time(), '+inf')
+
+    @contextmanager
+    def slot(self, provider, wait_seconds=0.0, poll=0.5):
+        """Context Manager: liefert True wenn ein Slot gehalten wird, False wenn nach wait_seconds keiner frei war."""
+        deadline = time.time() + wait_seconds
+        token = self.try_acquire(provider)
+        while token is None and time.time() < deadline:
+            time.sleep(poll)
+            token = self.try_acquire(provider)
+        try:
+            yield token is not None
+        finally:
+            if token is not None:
+                self.release(provider, token)
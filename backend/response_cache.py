@@ -0,0 +1,145 @@
+"""Content-addressed On-Disk Cache für rohe Provider-Antworten (historische Candles).
+
+- Key = sha256 der normalisierten URL (Schema/Host klein, Query sortiert, API-Key Parameter entfernt)
+- Body zlib-komprimiert unter {root}/{key[:2]}/{key}.z, Metadaten (Status, Ablauf) im selben File
+- Fenster die vor heute (UTC) enden ändern sich nicht mehr -> permanent; Fenster mit heute -> kurze TTL
+- Hit/Miss Zähler pro Prozess und (falls Redis gesetzt) global im Hash response_cache_stats
+- RESPONSE_CACHE_OFFLINE=1: nie ins Netz, Misses liefern status_code 0 (Fixture-Store für Offline-Benchmarks)
+
+Env: RESPONSE_CACHE_DIR (Default ./cache/provider_responses), RESPONSE_CACHE_TODAY_TTL (Sekunden, Default 300),
+RESPONSE_CACHE_DISABLED=1 schaltet den Cache ab.
+"""
+import os
+import json
+import time
+import zlib
+import hashlib
+import logging
+import requests
+from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+SECRET_PARAMS = {'token', 'apikey', 'api_key', 'access_key', 'key'}
+STATS_KEY = 'response_cache_stats'
+
+
+def normalize_url(url):
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ''))
+
+
+def cache_key(url):
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+class CachedResponse:
+    """Minimaler requests.Response Ersatz (status_code, text, json())."""
+
+    def __init__(self, status_code, text, from_cache=True):
+        self.status_code = status_code
+        self.text = text
+        self.from_cache = from_cache
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ResponseCache:
+    def __init__(self, root=None, today_ttl=None, redis_client=None, offline=None, enabled=None):
+        self.root = root or os.getenv('RESPONSE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'provider_responses'))
+        self.today_ttl = int(today_ttl if today_ttl is not None else os.getenv('RESPONSE_CACHE_TODAY_TTL', '300'))
+        self.offline = offline if offline is not None else os.getenv('RESPONSE_CACHE_OFFLINE', '0') == '1'
+        self.enabled = enabled if enabled is not None else os.getenv('RESPONSE_CACHE_DISABLED', '0') != '1'
+        self.r = redis_client
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0  # echte Netzwerk-Requests (Aufrufer drosseln nur dann)
+
+    def attach_redis(self, redis_client):
+        self.r = redis_client
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f'{key}.z')
+
+    def _count(self, field):
+        if field == 'hits':
+            self.hits += 1
+        elif field == 'misses':
+            self.misses += 1
+        if self.r is not None:
+            try:
+                self.r.hincrby(STATS_KEY, field, 1)
+            except Exception:
+                pass
+
+    def load(self, url):
+        """Gespeicherter Eintrag (dict) oder None wenn nicht vorhanden/abgelaufen."""
+        path = self._path(cache_key(url))
+        try:
+            with open(path, 'rb') as fh:
+                entry = json.loads(zlib.decompress(fh.read()))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Response cache entry unreadable {path}: {e}")
+            return None
+        if entry.get('expires') and entry['expires'] < time.time() and not self.offline:
+            return None
+        return entry
+
+    def store(self, url, status_code, text, permanent):
+        key = cache_key(url)
+        path = self._path(key)
+        entry = {
+            'url': normalize_url(url),
+            'status': status_code,
+            'body': text,
+            'stored': datetime.utcnow().isoformat(),
+            'expires': None if permanent else time.time() + self.today_ttl
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as fh:
+            fh.write(zlib.compress(json.dumps(entry).encode(), 6))
+        os.replace(tmp, path)  # atomar, parallele Worker lesen nie halbe Files
+
+    def get(self, url, timeout=30, window_end=None, cacheable=None):
+        """GET über den Cache. window_end (naive UTC) bestimmt permanent (vor heute) vs. kurze TTL.
+
+        cacheable(text) -> bool entscheidet ob eine 200-Antwort gespeichert wird (z.B. keine Ratelimit-Fehler).
+        """
+        if not self.enabled:
+            self.fetches += 1
+            return requests.get(url, timeout=timeout)
+        entry = self.load(url)
+        if entry is not None:
+            self._count('hits')
+            return CachedResponse(entry['status'], entry['body'])
+        self._count('misses')
+        if self.offline:
+            return CachedResponse(0, 'offline cache miss', from_cache=False)
+        self.fetches += 1
+        resp = requests.get(url, timeout=timeout)
+        if resp.status_code == 200 and (cacheable is None or cacheable(resp.text)):
+            today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            permanent = window_end is not None and window_end <= today
+            try:
+                self.store(url, resp.status_code, resp.text, permanent)
+                self._count('stores')
+            except Exception as e:
+                logging.warning(f"Response cache store failed: {e}")
+        return resp
+
+    def stats(self):
+        """Hit-Ratio dieses Prozesses und (falls Redis) global."""
+        total = self.hits + self.misses
+        out = {'hits': self.hits, 'misses': self.misses, 'hit_ratio': round(self.hits / total, 4) if total else None}
+        if self.r is not None:
+            try:
+                g = {k.decode(): int(v) for k, v in self.r.hgetall(STATS_KEY).items()}
+                g_total = g.get('hits', 0) + g.get('misses', 0)
+                out['global'] = {**g, 'hit_ratio': round(g.get('hits', 0) / g_total, 4) if g_total else None}
+            except Exception:
+                pass
+        return out
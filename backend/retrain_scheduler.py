@@ -0,0 +1,95 @@
+"""Retrain-Scheduler: Trigger sammeln (Debounce) und Single-Flight Lease für train_model (Redis).
+
+Keys:
+    retrain_requests    Hash {reason}:count / {reason}:first / {reason}:last (Epoch-Sekunden) je Trigger-Grund
+    retrain_lease       String Token, SET NX EX = Training läuft (läuft bei abgestürztem Worker von selbst ab)
+
+Ablauf: request() zeichnet Gründe auf (daily, deviation, grok_update, ...). Ein Lauf wird fällig wenn seit dem letzten
+Trigger `debounce` Sekunden vergangen sind, spätestens `max_wait` Sekunden nach dem ersten. claim() entnimmt alle
+Gründe atomar (MULTI: HGETALL + DEL), ein Training trägt damit alle zusammengefassten Gründe. Die Policy (Trading
+aktiv während Marktzeiten -> verschieben) liegt in worker.dispatch_retrain.
+
+Env: RETRAIN_DEBOUNCE_SECONDS (300), RETRAIN_MAX_WAIT_SECONDS (1800), RETRAIN_LEASE_SECONDS (3600)
+"""
+import os
+import time
+import uuid
+
+REQUESTS_KEY = 'retrain_requests'
+LEASE_KEY = 'retrain_lease'
+
+# Lease nur freigeben wenn sie noch dem Aufrufer gehört (abgelaufene Lease evtl. neu vergeben)
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+
+def _parse(raw):
+    """HGETALL Ergebnis -> {reason: {'count', 'first', 'last'}}"""
+    reasons = {}
+    for field, val in raw.items():
+        field = field.decode() if isinstance(field, bytes) else field
+        val = val.decode() if isinstance(val, bytes) else val
+        reason, _, attr = field.rpartition(':')
+        if reason and attr in ('count', 'first', 'last'):
+            reasons.setdefault(reason, {})[attr] = int(val) if attr == 'count' else float(val)
+    return {k: v for k, v in reasons.items() if 'count' in v}
+
+
+class RetrainScheduler:
+    def __init__(self, redis_client, debounce=None, max_wait=None, lease_seconds=None):
+        self.r = redis_client
+        self.debounce = int(debounce if debounce is not None else os.getenv('RETRAIN_DEBOUNCE_SECONDS', '300'))
+        self.max_wait = int(max_wait if max_wait is not None else os.getenv('RETRAIN_MAX_WAIT_SECONDS', '1800'))
+        self.lease_seconds = int(lease_seconds if lease_seconds is not None else os.getenv('RETRAIN_LEASE_SECONDS', '3600'))
+        self._release = self.r.register_script(_RELEASE_LUA)
+
+    def request(self, reason, count=1, first=None, last=None):
+        """Trigger-Grund aufzeichnen (mehrfache Trigger erhöhen count, first bleibt der früheste)."""
+        now = time.time()
+        pipe = self.r.pipeline(transaction=True)
+        pipe.hincrby(REQUESTS_KEY, f'{reason}:count', count)
+        pipe.hsetnx(REQUESTS_KEY, f'{reason}:first', repr(first if first is not None else now))
+        pipe.hset(REQUESTS_KEY, f'{reason}:last', repr(last if last is not None else now))
+        pipe.execute()
+
+    def restore(self, reasons):
+        """Entnommene Gründe zurücklegen (Training lief bereits) -> werden mit neuen Triggern zusammengefasst."""
+        for reason, info in reasons.items():
+            self.request(reason, info.get('count', 1), info.get('first'), info.get('last'))
+
+    def pending(self):
+        return _parse(self.r.hgetall(REQUESTS_KEY))
+
+    def due_at(self, reasons):
+        """Epoch-Sekunden ab denen ein Lauf fällig ist (Debounce nach dem letzten, max_wait nach dem ersten Trigger)."""
+        if not reasons:
+            return None
+        first = min(v.get('first', v.get('last', 0.0)) for v in reasons.values())
+        last = max(v.get('last', first) for v in reasons.values())
+        return min(last + self.debounce, first + self.max_wait)
+
+    def claim(self):
+        """Alle Gründe atomar entnehmen -> {reason: {...}} (leer wenn ein anderer Dispatcher schneller war)."""
+        pipe = self.r.pipeline(transaction=True)
+        pipe.hgetall(REQUESTS_KEY)
+        pipe.delete(REQUESTS_KEY)
+        raw, _ = pipe.execute()
+        return _parse(raw)
+
+    def acquire(self):
+        """Lease für ein Training holen -> Token oder None (Training läuft bereits)."""
+        token = uuid.uuid4().hex
+        if self.r.set(LEASE_KEY, token, nx=True, ex=self.lease_seconds):
+            return token
+        return None
+
+    def running(self):
+        return bool(self.r.exists(LEASE_KEY))
+
+    def release(self, token):
+        return bool(self._release(keys=[LEASE_KEY], args=[token]))
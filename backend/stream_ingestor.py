@@ -0,0 +1,380 @@
+import os, json, time, asyncio, logging, redis, psycopg2
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+from historical_candles import ensure_market_data_schema
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO, format='[stream-ingestor] %(asctime)s %(levelname)s %(message)s')
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://:pass123@redis:6379/0')
+DATABASE_URL = os.getenv('DATABASE_URL')
+FINNHUB_API_KEY = os.getenv('FINNHUB_API_KEY')
+ALPACA_API_KEY = os.getenv('ALPACA_API_KEY')
+ALPACA_SECRET = os.getenv('ALPACA_SECRET')
+
+# finnhub | alpaca  (Replay-Server spricht das Finnhub Protokoll)
+STREAM_PROVIDER = os.getenv('STREAM_PROVIDER', 'finnhub')
+STREAM_URL = os.getenv('STREAM_URL', '')  # z.B. ws://localhost:8765 für lokalen Replay-Server
+STREAM_TICKERS = os.getenv('STREAM_TICKERS', '')  # Optional Override, sonst dynamic_tickers
+FLUSH_INTERVAL = float(os.getenv('STREAM_FLUSH_INTERVAL', '0.5'))  # Sekunden zwischen Redis Updates
+DB_FLUSH_INTERVAL = float(os.getenv('STREAM_DB_FLUSH_INTERVAL', '10'))  # Sekunden zwischen Bulk-Inserts
+BAR_GRACE_SECONDS = int(os.getenv('STREAM_BAR_GRACE', '5'))  # Verspätete Ticks nach Slot-Ende
+RECORD_PATH = os.getenv('STREAM_RECORD_PATH', '')  # Optional: rohe Ticks als JSONL mitschreiben
+MAX_PENDING_BARS = int(os.getenv('STREAM_MAX_PENDING_BARS', '50000'))  # Retry-Puffer bei DB Fehlern (älteste fallen weg)
+
+BAR_INTERVALS = {'1m': 60, '15m': 900}
+KEY_QUOTES = 'stream_quotes'
+KEY_STATUS = 'stream_status'
+
+# Wie init.sql, für Datenbanken die vor dem Stream Ingestor angelegt wurden
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS market_data_1m (
+    time TIMESTAMPTZ NOT NULL,
+    ticker TEXT NOT NULL,
+    open DOUBLE PRECISION,
+    high DOUBLE PRECISION,
+    low DOUBLE PRECISION,
+    close DOUBLE PRECISION,
+    volume BIGINT,
+    PRIMARY KEY (time, ticker)
+);
+CREATE INDEX IF NOT EXISTS idx_market_data_1m_ticker_time ON market_data_1m(ticker, time);
+"""
+
+r = redis.from_url(REDIS_URL)
+
+
+def get_tickers():
+    if STREAM_TICKERS:
+        return [t.strip().upper() for t in STREAM_TICKERS.split(',') if t.strip()]
+    try:
+        dyn_raw = r.get('dynamic_tickers')
+        if dyn_raw:
+            return json.loads(dyn_raw)
+    except Exception as e:
+        logging.error(f"Error getting tickers: {e}")
+    return ['AAPL','MSFT','NVDA','TSLA','AMZN']
+
+
+class BarAggregator:
+    """Aggregiert Ticks in-memory zu OHLCV Bars (Slots UTC-aligned, z.B. 1m und 15m).
+
+    add_tick() liefert fertige Bars zurück sobald ein Tick in den nächsten Slot fällt,
+    close_due() schließt Slots illiquider Ticker nach Ablauf von Slot-Ende + grace.
+    Ticks für bereits geschlossene Slots werden verworfen (kein neuer Ein-Tick-Bar für einen fertigen Slot).
+    """
+
+    def __init__(self, intervals=None, grace_seconds=BAR_GRACE_SECONDS):
+        self.intervals = intervals or BAR_INTERVALS
+        self.grace_seconds = grace_seconds
+        self.open_bars = {}  # (ticker, interval_name) -> bar dict
+        self.closed_slots = {}  # (ticker, interval_name) -> zuletzt geschlossener Slot (epoch)
+        self.last_price = {}  # ticker -> (price, epoch)
+
+    def _close(self, key):
+        bar = self.open_bars.pop(key)
+        self.closed_slots[key] = bar['slot']
+        return bar
+
+    def add_tick(self, ticker, price, size, epoch):
+        completed = []
+        self.last_price[ticker] = (price, epoch)
+        for name, seconds in self.intervals.items():
+            slot = int(epoch // seconds) * seconds
+            key = (ticker, name)
+            if slot <= self.closed_slots.get(key, -1):
+                # Verspäteter Tick für bereits abgeschlossenen Slot -> verwerfen
+                continue
+            bar = self.open_bars.get(key)
+            if bar is not None and slot < bar['slot']:
+                continue
+            if bar is not None and slot > bar['slot']:
+                completed.append(self._close(key))
+                bar = None
+            if bar is None:
+                self.open_bars[key] = {
+                    'ticker': ticker, 'interval': name, 'slot': slot,
+                    'open': price, 'high': price, 'low': price, 'close': price,
+                    'volume': size or 0, 'ticks': 1
+                }
+            else:
+                bar['high'] = max(bar['high'], price)
+                bar['low'] = min(bar['low'], price)
+                bar['close'] = price
+                bar['volume'] += size or 0
+                bar['ticks'] += 1
+        return completed
+
+    def close_due(self, now_epoch):
+        completed = []
+        for key, bar in list(self.open_bars.items()):
+            if now_epoch >= bar['slot'] + self.intervals[bar['interval']] + self.grace_seconds:
+                completed.append(self._close(key))
+        return completed
+
+
+def _parse_rfc3339(value):
+    """RFC3339 mit Nanosekunden (Alpaca) -> epoch Sekunden. Nur der Bruchteil wird auf 6 Stellen gekürzt,
+    der Offset bleibt erhalten (ohne Offset gilt UTC, nie die lokale Zeitzone des Hosts)."""
+    value = value.strip().replace('Z', '+00:00')
+    if '.' in value:
+        head, rest = value.split('.', 1)
+        digits = len(rest) - len(rest.lstrip('0123456789'))
+        value = f"{head}.{rest[:min(digits, 6)]}{rest[digits:]}"
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def parse_message(provider, raw):
+    """Normalisiert eine WebSocket Nachricht zu [(ticker, price, size, epoch_seconds)]."""
+    try:
+        msg = json.loads(raw)
+    except Exception:
+        return []
+    ticks = []
+    if provider == 'alpaca':
+        # Alpaca: Liste von Events, Trades mit T == 't', Quotes mit T == 'q'
+        for ev in msg if isinstance(msg, list) else []:
+            try:
+                if ev.get('T') == 't':
+                    ticks.append((ev['S'], float(ev['p']), float(ev.get('s') or 0), _parse_rfc3339(ev['t'])))
+                elif ev.get('T') == 'q' and ev.get('bp') and ev.get('ap'):
+                    ticks.append((ev['S'], (float(ev['bp']) + float(ev['ap'])) / 2, 0.0, _parse_rfc3339(ev['t'])))
+            except Exception:
+                continue
+        return ticks
+    # Finnhub: {"type":"trade","data":[{"s":"AAPL","p":..,"v":..,"t":ms}]}
+    if isinstance(msg, dict) and msg.get('type') == 'trade':
+        for ev in msg.get('data') or []:
+            try:
+                ticks.append((ev['s'], float(ev['p']), float(ev.get('v') or 0), float(ev['t']) / 1000.0))
+            except Exception:
+                continue
+    return ticks
+
+
+class StreamIngestor:
+    def __init__(self, provider=STREAM_PROVIDER, url=STREAM_URL):
+        self.provider = provider
+        self.url = url or self._default_url()
+        self.aggregator = BarAggregator()
+        self.pending_bars = []
+        self.dirty_prices = {}
+        self.stats = {'ticks': 0, 'bars_1m': 0, 'bars_15m': 0, 'reconnects': 0, 'dropped_bars': 0,
+                      'last_tick': None, 'last_latency_ms': None}
+        self.conn = None
+        self._schema_ok = False
+        self.record_fh = open(RECORD_PATH, 'a') if RECORD_PATH else None
+
+    def _default_url(self):
+        if self.provider == 'alpaca':
+            return 'wss://stream.data.alpaca.markets/v2/iex'
+        return f'wss://ws.finnhub.io?token={FINNHUB_API_KEY}'
+
+    async def _subscribe(self, ws, tickers):
+        if self.provider == 'alpaca':
+            await ws.send(json.dumps({'action': 'auth', 'key': ALPACA_API_KEY, 'secret': ALPACA_SECRET}))
+            await ws.send(json.dumps({'action': 'subscribe', 'trades': tickers}))
+        else:
+            for t in tickers:
+                await ws.send(json.dumps({'type': 'subscribe', 'symbol': t}))
+
+    def _handle_ticks(self, ticks):
+        now = time.time()
+        for ticker, price, size, epoch in ticks:
+            if price <= 0:
+                continue
+            for bar in self.aggregator.add_tick(ticker, price, size, epoch):
+                self.pending_bars.append(bar)
+            self.dirty_prices[ticker] = (price, epoch)
+            self.stats['ticks'] += 1
+            self.stats['last_latency_ms'] = round((now - epoch) * 1000, 1)
+            if self.record_fh:
+                self.record_fh.write(json.dumps({'s': ticker, 'p': price, 'v': size, 't': int(epoch * 1000)}) + '\n')
+        if ticks:
+            self.stats['last_tick'] = datetime.utcnow().isoformat()
+
+    def flush_prices(self):
+        """Live-Preise nach Redis: stream_quotes (Format wie yfinance_quotes) + market_data Einträge."""
+        if not self.dirty_prices:
+            return
+        updates, self.dirty_prices = self.dirty_prices, {}
+        now_iso = datetime.utcnow().isoformat()
+        payload = {
+            'time': now_iso,
+            'prices': {t: p for t, (p, _) in self.aggregator.last_price.items()},
+            'count': len(self.aggregator.last_price)
+        }
+        market = {}
+        try:
+            raw = r.get('market_data')
+            market = json.loads(raw) if raw else {}
+        except Exception:
+            market = {}
+        for t, (price, epoch) in updates.items():
+            entry = market.get(t) or {}
+            entry.update({
+                'price': price,
+                'time': datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None).isoformat(),
+                'source': 'stream'
+            })
+            market[t] = entry
+        pipe = r.pipeline()
+        pipe.set(KEY_QUOTES, json.dumps(payload))
+        pipe.set('market_data', json.dumps(market))
+        pipe.execute()
+
+    def _db(self):
+        if self.conn is None or self.conn.closed:
+            self.conn = psycopg2.connect(DATABASE_URL)
+        if not self._schema_ok:
+            self.ensure_schema(self.conn)
+        return self.conn
+
+    def ensure_schema(self, conn):
+        """market_data_1m + market_data.source/Unique Index idempotent anlegen (einmal je Prozess)."""
+        cur = conn.cursor()
+        cur.execute(SCHEMA_SQL)
+        conn.commit()
+        ensure_market_data_schema(conn)
+        self._schema_ok = True
+
+    def requeue_bars(self, bars):
+        """Nicht geschriebene Bars vorne einreihen; Puffer auf MAX_PENDING_BARS begrenzen (älteste verwerfen)."""
+        self.pending_bars[:0] = bars
+        overflow = len(self.pending_bars) - MAX_PENDING_BARS
+        if overflow > 0:
+            del self.pending_bars[:overflow]
+            self.stats['dropped_bars'] += overflow
+            logging.warning(f"Pending bar buffer full, dropped {overflow} oldest bars")
+
+    def take_completed_bars(self):
+        """Sammelt fertige Bars (inkl. zeitlich abgelaufener Slots) - läuft im Event-Loop Thread."""
+        self.pending_bars.extend(self.aggregator.close_due(time.time()))
+        bars, self.pending_bars = self.pending_bars, []
+        return bars
+
+    def write_bars(self, bars):
+        """Schreibt Bars gesammelt per execute_values (15m -> market_data, 1m -> market_data_1m).
+
+        market_data (source 'stream'): nur eigene Teil-Bars des Streams werden gemischt (z.B. nach Neustart im Slot:
+        open bleibt, high/low GREATEST/LEAST, close vom Stream, volume addiert). Snapshot-Bars werden ersetzt,
+        Provider-/Import-Candles bleiben unverändert - Volumen verschiedener Quellen wird nie addiert.
+        market_data_1m enthält nur Stream-Bars und wird immer gemischt. Beide Tabellen in einer Transaktion,
+        damit ein erneuter Versuch nach Fehler kein Volumen doppelt zählt.
+        """
+        if not bars:
+            return True
+        rows = {'1m': [], '15m': []}
+        for b in bars:
+            rows[b['interval']].append((
+                datetime.fromtimestamp(b['slot'], tz=timezone.utc), b['ticker'],
+                b['open'], b['high'], b['low'], b['close'], int(b['volume'])
+            ))
+        try:
+            conn = self._db()
+            cur = conn.cursor()
+            if rows['15m']:
+                execute_values(cur, """
+                    INSERT INTO market_data AS t (time, ticker, open, high, low, close, volume, source) VALUES %s
+                    ON CONFLICT (time, ticker) DO UPDATE SET
+                        open=CASE WHEN t.source = 'snapshot' THEN EXCLUDED.open ELSE t.open END,
+                        high=CASE WHEN t.source = 'snapshot' THEN EXCLUDED.high ELSE GREATEST(t.high, EXCLUDED.high) END,
+                        low=CASE WHEN t.source = 'snapshot' THEN EXCLUDED.low ELSE LEAST(t.low, EXCLUDED.low) END,
+                        close=EXCLUDED.close,
+                        volume=CASE WHEN t.source = 'snapshot' THEN EXCLUDED.volume
+                                    ELSE COALESCE(t.volume, 0) + EXCLUDED.volume END,
+                        source=EXCLUDED.source
+                    WHERE t.source IN ('stream', 'snapshot')
+                """, rows['15m'], template="(%s, %s, %s, %s, %s, %s, %s, 'stream')", page_size=1000)
+            if rows['1m']:
+                execute_values(cur, """
+                    INSERT INTO market_data_1m AS t (time, ticker, open, high, low, close, volume) VALUES %s
+                    ON CONFLICT (time, ticker) DO UPDATE SET
+                        high=GREATEST(t.high, EXCLUDED.high), low=LEAST(t.low, EXCLUDED.low),
+                        close=EXCLUDED.close, volume=COALESCE(t.volume, 0) + EXCLUDED.volume
+                """, rows['1m'], page_size=1000)
+            conn.commit()
+            self.stats['bars_1m'] += len(rows['1m'])
+            self.stats['bars_15m'] += len(rows['15m'])
+            return True
+        except Exception as e:
+            logging.error(f"Bar flush failed ({len(bars)} bars): {e}")
+            try:
+                self.conn.rollback()
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+            return False
+
+    def write_status(self, connected):
+        status = {
+            'time': datetime.utcnow().isoformat(),
+            'provider': self.provider,
+            'connected': connected,
+            'tickers': len(self.aggregator.last_price),
+            'pending_bars': len(self.pending_bars),
+            **self.stats
+        }
+        r.set(KEY_STATUS, json.dumps(status))
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        last_db = time.time()
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush_prices()
+                if time.time() - last_db >= DB_FLUSH_INTERVAL:
+                    last_db = time.time()
+                    # Blockierende DB Writes im Executor, damit der Empfang nicht stockt
+                    bars = self.take_completed_bars()
+                    if bars:
+                        if await loop.run_in_executor(None, self.write_bars, bars):
+                            logging.info(f"Flushed {len(bars)} bars")
+                        else:
+                            # Bei DB Fehler Bars behalten und beim nächsten Flush erneut versuchen
+                            self.requeue_bars(bars)
+                    self.write_status(True)
+                    if self.record_fh:
+                        self.record_fh.flush()
+            except Exception as e:
+                logging.error(f"Flush loop error: {e}")
+
+    async def run(self):
+        import websockets  # erst für die Verbindung (Parser/Aggregator ohne websockets testbar)
+        flusher = asyncio.create_task(self._flush_loop())
+        backoff = 1
+        try:
+            while True:
+                tickers = get_tickers()
+                try:
+                    async with websockets.connect(self.url, ping_interval=20, max_size=2**22) as ws:
+                        await self._subscribe(ws, tickers)
+                        logging.info(f"Connected to {self.provider} stream, subscribed {len(tickers)} tickers")
+                        backoff = 1
+                        async for raw in ws:
+                            self._handle_ticks(parse_message(self.provider, raw))
+                except Exception as e:
+                    self.stats['reconnects'] += 1
+                    self.write_status(False)
+                    logging.warning(f"Stream disconnected: {e} - reconnect in {backoff}s")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 60)
+        finally:
+            # Nur abgeschlossene Bars schreiben - offene Slots würden sonst unvollständig persistiert
+            flusher.cancel()
+            self.write_bars(self.take_completed_bars())
+
+
+def main():
+    logging.info(f"Stream Ingestor starting (provider={STREAM_PROVIDER})...")
+    asyncio.run(StreamIngestor().run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Lokaler Stand-in WebSocket Server (Finnhub Protokoll) für Offline-Tests des stream_ingestor.
+
+Spielt aufgezeichnete Ticks (JSONL, Format wie STREAM_RECORD_PATH: {"s","p","v","t"}) ab.
+Ohne Datei werden synthetische Random-Walk Ticks für die abonnierten Symbole erzeugt.
+
+Beispiel:
+    python stream_replay_server.py --file ticks.jsonl --speed 10 --loop
+    STREAM_URL=ws://localhost:8765 python stream_ingestor.py
+"""
+import os, json, time, random, asyncio, argparse, logging
+import websockets
+
+logging.basicConfig(level=logging.INFO, format='[stream-replay] %(asctime)s %(levelname)s %(message)s')
+
+
+def load_ticks(path):
+    ticks = []
+    with open(path) as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                ev = json.loads(line)
+                ticks.append({'s': ev['s'], 'p': float(ev['p']), 'v': float(ev.get('v') or 0), 't': int(ev['t'])})
+            except Exception:
+                continue
+    ticks.sort(key=lambda ev: ev['t'])
+    return ticks
+
+
+async def replay_recorded(ws, subscribed, ticks, speed, loop_forever, batch_ms):
+    """Sendet Ticks mit originalem Timing (skaliert über speed); Zeitstempel werden auf 'jetzt' verschoben,
+    damit der Ingestor Bars im aktuellen Slot bildet."""
+    while True:
+        start_wall = time.time()
+        start_tick = ticks[0]['t']
+        batch = []
+        batch_deadline = None
+        for ev in ticks:
+            offset = (ev['t'] - start_tick) / 1000.0 / speed
+            delay = start_wall + offset - time.time()
+            if delay > 0:
+                if batch:
+                    await ws.send(json.dumps({'type': 'trade', 'data': batch}))
+                    batch = []
+                await asyncio.sleep(delay)
+            if ev['s'] not in subscribed:
+                continue
+            batch.append({**ev, 't': int((start_wall + offset) * 1000)})
+            if batch_deadline is None:
+                batch_deadline = time.time() + batch_ms / 1000.0
+            if time.time() >= batch_deadline:
+                await ws.send(json.dumps({'type': 'trade', 'data': batch}))
+                batch = []
+                batch_deadline = None
+        if batch:
+            await ws.send(json.dumps({'type': 'trade', 'data': batch}))
+        if not loop_forever:
+            return
+
+
+async def replay_synthetic(ws, subscribed, rate):
+    prices = {}
+    while True:
+        await asyncio.sleep(1.0 / rate)
+        if not subscribed:
+            continue
+        now_ms = int(time.time() * 1000)
+        data = []
+        for s in list(subscribed):
+            p = prices.get(s) or random.uniform(50, 500)
+            p = round(p * (1 + random.gauss(0, 0.0005)), 4)
+            prices[s] = p
+            data.append({'s': s, 'p': p, 'v': random.randint(1, 500), 't': now_ms})
+        await ws.send(json.dumps({'type': 'trade', 'data': data}))
+
+
+def make_handler(args, ticks):
+    async def handler(ws, path=None):
+        subscribed = set()
+        logging.info("Client connected")
+
+        async def reader():
+            async for raw in ws:
+                try:
+                    msg = json.loads(raw)
+                except Exception:
+                    continue
+                if msg.get('type') == 'subscribe' and msg.get('symbol'):
+                    subscribed.add(msg['symbol'])
+                elif msg.get('type') == 'unsubscribe':
+                    subscribed.discard(msg.get('symbol'))
+
+        async def pinger():
+            while True:
+                await asyncio.sleep(15)
+                await ws.send(json.dumps({'type': 'ping'}))
+
+        tasks = [asyncio.create_task(reader()), asyncio.create_task(pinger())]
+        try:
+            # Kurze Wartezeit damit Subscribe Nachrichten vor dem ersten Tick ankommen
+            await asyncio.sleep(0.2)
+            if ticks:
+                await replay_recorded(ws, subscribed, ticks, args.speed, args.loop, args.batch_ms)
+            else:
+                await replay_synthetic(ws, subscribed, args.rate)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for t in tasks:
+                t.cancel()
+            logging.info("Client disconnected")
+    return handler
+
+
+async def serve(args):
+    ticks = load_ticks(args.file) if args.file else []
+    if args.file:
+        logging.info(f"Loaded {len(ticks)} recorded ticks from {args.file}")
+    async with websockets.serve(make_handler(args, ticks), args.host, args.port):
+        logging.info(f"Replay server listening on ws://{args.host}:{args.port}")
+        await asyncio.Future()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Finnhub-kompatibler Replay WebSocket Server')
+    parser.add_argument('--host', default=os.getenv('STREAM_REPLAY_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('STREAM_REPLAY_PORT', '8765')))
+    parser.add_argument('--file', default=os.getenv('STREAM_REPLAY_FILE', ''), help='JSONL mit aufgezeichneten Ticks')
+    parser.add_argument('--speed', type=float, default=1.0, help='Abspielgeschwindigkeit (10 = 10x schneller)')
+    parser.add_argument('--loop', action='store_true', help='Aufzeichnung endlos wiederholen')
+    parser.add_argument('--batch-ms', type=int, default=50, help='Ticks innerhalb dieses Fensters bündeln')
+    parser.add_argument('--rate', type=float, default=5.0, help='Synthetische Ticks pro Sekunde und Symbol')
+    args = parser.parse_args()
+    asyncio.run(serve(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""import_bars: Zeitstempel über einen Sommerzeitwechsel (Offsets -05:00/-04:00 in einer Datei)."""
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from import_bars import iter_chunks, resolve_columns, normalize_frame, resample_bars, to_utc  # noqa: E402
+
+
+def test_file_crossing_dst_change(tmp_path):
+    # US-Sommerzeit beginnt am 10.03.2024: Eröffnung 09:30 ET = 14:30 UTC vorher, 13:30 UTC danach
+    path = tmp_path / 'AAPL.csv'
+    path.write_text(
+        'timestamp,open,high,low,close,volume\n'
+        '2024-03-08T09:30:00-05:00,10,11,9,10.5,100\n'
+        '2024-03-08T09:35:00-05:00,10.5,11,10,10.8,50\n'
+        '2024-03-11T09:30:00-04:00,11,12,10,11.5,200\n'
+        '2024-03-11T09:45:00-04:00,11.5,12,11,11.7,80\n'
+    )
+    chunk = next(iter_chunks(str(path), 1000))
+    df, rejected = normalize_frame(chunk, resolve_columns(chunk.columns), 'AAPL', 'US/Eastern')
+    assert rejected == 0
+    assert df['time'].tolist() == [pd.Timestamp(t, tz='UTC') for t in (
+        '2024-03-08 14:30', '2024-03-08 14:35', '2024-03-11 13:30', '2024-03-11 13:45')]
+    bars = resample_bars(df, '15min')
+    assert len(bars) == 3
+    assert bars.iloc[0]['volume'] == 150
+
+
+def test_naive_values_localized_in_source_tz():
+    out = to_utc(pd.Series(['2024-03-08 09:30:00', '2024-03-11 09:30:00', 'kein datum']), 'US/Eastern')
+    assert out.tolist()[:2] == [pd.Timestamp('2024-03-08 14:30', tz='UTC'), pd.Timestamp('2024-03-11 13:30', tz='UTC')]
+    assert pd.isna(out.iloc[2])
+
+
+def test_mixed_offset_formats():
+    out = to_utc(pd.Series(['2024-03-11 09:30:00-04:00', '2024-03-11T13:45:00Z', '2024-03-11 10:00:00+0000']), 'US/Eastern')
+    assert out.tolist() == [pd.Timestamp(t, tz='UTC') for t in ('2024-03-11 13:30', '2024-03-11 13:45', '2024-03-11 10:00')]
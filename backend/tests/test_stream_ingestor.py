@@ -0,0 +1,51 @@
+"""stream_ingestor: Alpaca RFC3339 Zeitstempel mit Nanosekunden unabhängig von der Host-Zeitzone."""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream_ingestor import _parse_rfc3339, parse_message  # noqa: E402
+
+
+@pytest.fixture
+def new_york_tz(monkeypatch):
+    # Lokale Zeitzone != UTC: ein naiver Zeitstempel würde um 5 Stunden verschoben
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.parametrize('value', [
+    '2024-03-01T15:30:00.123456789Z',
+    '2024-03-01T15:30:00.123456789+00:00',
+    '2024-03-01T10:30:00.123456789-05:00',
+    '2024-03-01T15:30:00.123456Z',
+])
+def test_nanosecond_timestamps_keep_offset(new_york_tz, value):
+    assert _parse_rfc3339(value) == pytest.approx(1709307000.123456, abs=1e-6)
+
+
+def test_timestamp_without_fraction_or_offset_is_utc(new_york_tz):
+    assert _parse_rfc3339('2024-03-01T15:30:00Z') == 1709307000
+    assert _parse_rfc3339('2024-03-01T15:30:00') == 1709307000
+
+
+def test_alpaca_trade_message(new_york_tz):
+    raw = '[{"T":"t","S":"AAPL","p":180.5,"s":100,"t":"2024-03-01T15:30:00.123456789Z"}]'
+    [(ticker, price, size, epoch)] = parse_message('alpaca', raw)
+    assert (ticker, price, size) == ('AAPL', 180.5, 100.0)
+    assert epoch == pytest.approx(1709307000.123456, abs=1e-6)
+
+
+def test_requeue_caps_pending_buffer(monkeypatch):
+    import stream_ingestor
+    monkeypatch.setattr(stream_ingestor, 'MAX_PENDING_BARS', 3)
+    ingestor = stream_ingestor.StreamIngestor(url='ws://localhost')
+    ingestor.pending_bars = [{'slot': 4}, {'slot': 5}]
+    ingestor.requeue_bars([{'slot': 1}, {'slot': 2}, {'slot': 3}])
+    assert [b['slot'] for b in ingestor.pending_bars] == [3, 4, 5]
+    assert ingestor.stats['dropped_bars'] == 2
@@ -0,0 +1,560 @@
+"""Training-Orchestrator: Horizonte (15/30/60) gleichzeitig in eigenen Prozessen auf einem gemeinsamen Datensatz.
+
+train_model schreibt die kodierte Feature-Matrix + alle Targets einmal als Parquet (TRAIN_DATASET_DIR/dataset.parquet,
+meta.json mit Feature-Liste). Je Horizont startet ein eigener Python-Prozess (subprocess statt multiprocessing:
+Celery Prefork-Worker sind daemonic und dürfen keine multiprocessing-Kinder starten), liest per Arrow memory_map nur
+die Feature-Spalten + sein Target und trainiert mit der zugeteilten Anzahl Kerne. Ergebnis (Metriken, Feature-Liste
+des Predictors, Dauer) schreibt jeder Prozess als JSON nach TRAIN_DATASET_DIR/result_{hz}.json, Log nach train_{hz}.log.
+
+Modus incremental (Warm Start): Hyperparameter + Modelltypen der besten Basismodelle des Vorgängers (optional nur
+die Top-K), Fit mit kleinem Zeitlimit; Validierung sind nur Zeilen nach dem Trainingsende des Vorgängers
+(train_max_time in dessen training_meta.json), die er also nicht gesehen hat. Die ältere Hälfte davon dient dem
+Warm Start als tuning_data, die jüngere Hälfte nur dem Vergleich: Vorgänger und Warm Start werden auf diesem Holdout
+bewertet, den keiner von beiden gesehen hat. Ist der Warm Start um mehr als die Toleranz schlechter (oder fehlt ein
+passender Vorgänger bzw. hat der Holdout weniger als TRAIN_INCREMENTAL_MIN_VAL_ROWS Zeilen), folgt ein voller Fit.
+Sonst refit_full auf allen Zeilen inkl. Holdout. training_meta.json im Modellverzeichnis hält Modus, Validierungs-MAE, verwendete Basismodelle und
+train_max_time.
+
+Latenz-Budget: TRAIN_INFER_LIMIT_MS > 0 gibt AutoGluon infer_limit (Sekunden je Zeile bei infer_limit_batch_size
+Zeilen, Default = Anzahl Ticker im Training, so wie generate_predictions einen Batch je Horizont vorhersagt) und
+schnellere Presets mit; AutoGluon wählt dann nur Modelle/Ensembles die das Budget einhalten. Nach dem Fit misst der
+Prozess predict() eines frisch geladenen Predictors (Batch 1 und Batchgröße) und legt die Latenz in
+training_meta.json (inference) und im Ergebnis ab.
+
+Distillation (TRAIN_DISTILL=1): nach dem Fit destilliert AutoGluon das Ensemble auf einen einzelnen LightGBM (Labels =
+Vorhersagen des Lehrers, Training auf allen außer den jüngsten TRAIN_VALIDATION_FRACTION Zeilen). Der Schüler wird per
+clone_for_deployment als eigener Predictor unter {Modellverzeichnis}/distilled abgelegt und aus dem Lehrer wieder
+entfernt. Report je Horizont (training_meta.json distill): MAE von Lehrer und Schüler auf den jüngsten Zeilen (der
+Lehrer hat sie im Training gesehen -> mae_delta ist eher zu pessimistisch), Abweichung Schüler/Lehrer sowie Ladezeit,
+RSS-Zuwachs und Latenz je Zeile, gemessen für beide in einem frischen Prozess (--probe).
+
+Env:
+  TRAIN_PARALLEL                 1 = Horizonte gleichzeitig (Default), 0 = nacheinander (gleicher Ablauf)
+  TRAIN_CPUS_PER_HORIZON         "4" (alle Horizonte) oder "15:2,30:2,60:4"; Default: CPU-Kerne / Anzahl Horizonte
+  TRAIN_DATASET_DIR              Datensatz + Ergebnisse (Default ./training_data)
+  TRAIN_INCREMENTAL_TIME_LIMIT   Zeitlimit Warm Start in Sekunden (Default 45)
+  TRAIN_INCREMENTAL_TOP_K        nur die besten K Basismodelle neu fitten (Default 0 = alle)
+  TRAIN_INCREMENTAL_TOLERANCE    erlaubte relative MAE-Verschlechterung ggü. Vorgänger (Default 0.05)
+  TRAIN_INCREMENTAL_MIN_VAL_ROWS Mindestgröße des Warm-Start-Holdouts (jüngere Hälfte der neuen Zeilen, Default 200)
+  TRAIN_VALIDATION_FRACTION      Anteil jüngster Zeilen als Validierung der Distillation (Default 0.1)
+  TRAIN_PRESETS                  AutoGluon Presets, kommasepariert (Default: AutoGluon-Default bzw. mit Latenz-Budget
+                                 medium_quality,optimize_for_deployment)
+  TRAIN_INFER_LIMIT_MS           Inferenz-Budget in Millisekunden je Zeile (Default 0 = ohne Budget)
+  TRAIN_INFER_LIMIT_BATCH_SIZE   Batchgröße für das Budget (Default: Anzahl Ticker im Training)
+  TRAIN_DISTILL                  1 = Ensemble je Horizont zusätzlich auf einen LightGBM destillieren (Default 0)
+  TRAIN_DISTILL_TIME_LIMIT       Zeitlimit der Distillation in Sekunden (Default 60)
+  TRAIN_DISTILL_AUGMENT          Augmentierung der Distillation: munge | spunge (Default leer = keine)
+
+Einzelner Horizont (so ruft run_horizons die Kind-Prozesse auf):
+
+    python training_orchestrator.py --dataset ./training_data --horizon 15 --label target_15 \\
+        --path ./autogluon_model_15 --time-limit 160 --num-cpus 2 [--mode incremental --prev-path ./autogluon_model_15] \\
+        [--infer-batch-size 120]
+
+Ladezeit/RSS/Latenz eines Predictors in einem frischen Prozess (so misst die Distillation Lehrer und Schüler):
+
+    python training_orchestrator.py --probe ./autogluon_model_15 --sample ./training_data/probe_target_15.parquet \\
+        --out probe.json
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+
+DATASET_FILE = 'dataset.parquet'
+META_FILE = 'meta.json'
+MODEL_META_FILE = 'training_meta.json'
+DISTILLED_DIR = 'distilled'
+
+DEPLOYMENT_PRESETS = ['medium_quality', 'optimize_for_deployment']
+LATENCY_REPEAT = 5
+
+# AutoGluon Modellklasse -> Schlüssel im hyperparameters dict von fit()
+MODEL_KEYS = {
+    'LGBModel': 'GBM',
+    'CatBoostModel': 'CAT',
+    'XGBoostModel': 'XGB',
+    'RFModel': 'RF',
+    'XTModel': 'XT',
+    'KNNModel': 'KNN',
+    'LinearModel': 'LR',
+    'NNFastAiTabularModel': 'FASTAI',
+    'TabularNeuralNetTorchModel': 'NN_TORCH',
+}
+
+
+def dataset_dir():
+    return os.getenv('TRAIN_DATASET_DIR', './training_data')
+
+
+def cpu_allocation(horizons, spec=None, parallel=True):
+    """{hz: Kerne}; spec wie TRAIN_CPUS_PER_HORIZON ("4" oder "15:2,30:2,60:4"), fehlende -> gleichmäßig aufteilen."""
+    spec = spec if spec is not None else os.getenv('TRAIN_CPUS_PER_HORIZON', '')
+    total = os.cpu_count() or 1
+    default = max(1, total // len(horizons)) if parallel and horizons else total
+    alloc = {hz: default for hz in horizons}
+    spec = spec.strip()
+    if spec and ':' not in spec:
+        return {hz: max(1, int(spec)) for hz in horizons}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        hz, n = part.split(':', 1)
+        if hz.strip() in alloc:
+            alloc[hz.strip()] = max(1, int(n))
+    return alloc
+
+
+def latency_constraints(batch_size=None):
+    """Env -> zusätzliche fit() Argumente (presets, infer_limit, infer_limit_batch_size); leer ohne Konfiguration."""
+    kwargs = {}
+    presets = [p.strip() for p in os.getenv('TRAIN_PRESETS', '').split(',') if p.strip()]
+    limit_ms = float(os.getenv('TRAIN_INFER_LIMIT_MS', '0') or 0)
+    if limit_ms > 0:
+        kwargs['infer_limit'] = limit_ms / 1000
+        kwargs['infer_limit_batch_size'] = int(os.getenv('TRAIN_INFER_LIMIT_BATCH_SIZE', '0') or 0) or batch_size or 1
+        presets = presets or DEPLOYMENT_PRESETS
+    if presets:
+        kwargs['presets'] = presets
+    return kwargs
+
+
+def measure_latency(predictor, df, features, batch_sizes, repeat=LATENCY_REPEAT):
+    """Median-Latenz von predict() je Batchgröße -> {n: {'batch_ms', 'row_ms'}} (erster Aufruf = Warm-up)."""
+    out = {}
+    for n in sorted(set(batch_sizes)):
+        X = df[features].tail(n)
+        if X.empty:
+            continue
+        predictor.predict(X)
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            predictor.predict(X)
+            times.append(time.perf_counter() - t0)
+        ms = float(np.median(times)) * 1000
+        out[str(len(X))] = {'batch_ms': round(ms, 3), 'row_ms': round(ms / len(X), 4)}
+    return out
+
+
+def distill_enabled():
+    return os.getenv('TRAIN_DISTILL', '0') == '1'
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def probe_model(path, sample_path, repeat=LATENCY_REPEAT):
+    """Ladezeit (load + erster predict, AutoGluon lädt Modelle lazy), RSS-Zuwachs und Latenz eines Predictors.
+
+    Aussagekräftig nur in einem frischen Prozess (siehe _probe / --probe).
+    """
+    from autogluon.tabular import TabularPredictor
+    X = pd.read_parquet(sample_path)
+    base = _rss_mb()
+    t0 = time.perf_counter()
+    predictor = TabularPredictor.load(path)
+    predictor.predict(X.head(1))
+    load_seconds = time.perf_counter() - t0
+    rss = _rss_mb() - base
+    latency = measure_latency(predictor, X, list(X.columns), [1, len(X)], repeat)
+    return {'load_seconds': round(load_seconds, 3), 'rss_mb': round(rss, 1), 'latency': latency}
+
+
+def _probe(path, sample_path, timeout=600):
+    """probe_model in einem eigenen Python-Prozess -> dict (bei Fehler {'error'})."""
+    out = f'{sample_path}.{os.path.basename(os.path.normpath(path))}.json'
+    cmd = [sys.executable, os.path.abspath(__file__), '--probe', path, '--sample', sample_path, '--out', out]
+    if os.path.exists(out):
+        os.remove(out)
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, timeout=timeout,
+                              cwd=os.getcwd())
+        if proc.returncode != 0:
+            return {'error': (proc.stderr.strip().splitlines() or [f'exit code {proc.returncode}'])[-1][:200]}
+        with open(out) as fh:
+            return json.load(fh)
+    except (subprocess.SubprocessError, OSError, ValueError) as e:
+        return {'error': str(e)[:200]}
+
+
+def write_dataset(df, features, labels, directory=None, extra=('time',)):
+    """Feature-Matrix + Targets (+ extra, z.B. time für die Validierung im Warm Start) einmal als Parquet schreiben.
+
+    -> {'path', 'mb', 'seconds'}
+    """
+    directory = directory or dataset_dir()
+    os.makedirs(directory, exist_ok=True)
+    started = time.time()
+    path = os.path.join(directory, DATASET_FILE)
+    tmp = path + '.tmp'
+    extra = [c for c in extra if c in df.columns and c not in features]
+    df[list(features) + list(labels) + extra].reset_index(drop=True).to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    with open(os.path.join(directory, META_FILE), 'w') as fh:
+        json.dump({'features': list(features), 'labels': list(labels), 'extra': extra, 'rows': int(len(df))}, fh)
+    return {'path': path, 'mb': round(os.path.getsize(path) / 1e6, 2), 'seconds': round(time.time() - started, 3)}
+
+
+def _result_path(directory, hz):
+    return os.path.join(directory, f'result_{hz}.json')
+
+
+def run_horizons(horizons, paths, time_limit, directory=None, cpus=None, parallel=None, on_done=None, grace=300,
+                 mode='full', prev_paths=None, infer_batch_size=None):
+    """Ein Prozess je Horizont starten und einsammeln -> (results {hz: dict}, timing dict).
+
+    horizons: {hz: label_col}, paths: {hz: Modellverzeichnis}. on_done(hz, result) nach jedem fertigen Horizont.
+    mode='incremental' mit prev_paths {hz: Vorgänger-Verzeichnis} startet mit Warm Start (Fallback: voller Fit).
+    infer_batch_size: Zeilen je predict() in der Inferenz (Latenz-Budget und -Messung).
+    Prozesse die time_limit (+ Warm-Start-Limit) + grace Sekunden überschreiten werden beendet.
+    """
+    directory = directory or dataset_dir()
+    parallel = parallel if parallel is not None else os.getenv('TRAIN_PARALLEL', '1') == '1'
+    cpus = cpus or cpu_allocation(horizons, parallel=parallel)
+    prev_paths = prev_paths or {}
+    incremental_limit = int(os.getenv('TRAIN_INCREMENTAL_TIME_LIMIT', '45'))
+    kill_after = time_limit + grace + (incremental_limit if mode == 'incremental' else 0)
+    if distill_enabled():
+        kill_after += int(os.getenv('TRAIN_DISTILL_TIME_LIMIT', '60')) + grace
+    script = os.path.abspath(__file__)
+    pending = list(horizons.items())
+    running = {}
+    results = {}
+    started = time.time()
+    while pending or running:
+        while pending and (parallel or not running):
+            hz, label = pending.pop(0)
+            result_file = _result_path(directory, hz)
+            if os.path.exists(result_file):
+                os.remove(result_file)
+            log = open(os.path.join(directory, f'train_{hz}.log'), 'w')
+            cmd = [sys.executable, script, '--dataset', directory, '--horizon', hz, '--label', label,
+                   '--path', paths[hz], '--time-limit', str(time_limit), '--num-cpus', str(cpus[hz])]
+            if mode == 'incremental' and prev_paths.get(hz):
+                cmd += ['--mode', 'incremental', '--prev-path', prev_paths[hz],
+                        '--incremental-time-limit', str(incremental_limit)]
+            if infer_batch_size:
+                cmd += ['--infer-batch-size', str(infer_batch_size)]
+            proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, cwd=os.getcwd())
+            running[hz] = (proc, log, time.time())
+        time.sleep(0.5)
+        for hz, (proc, log, t0) in list(running.items()):
+            if proc.poll() is None:
+                if time.time() - t0 <= kill_after:
+                    continue
+                proc.kill()
+                proc.wait()
+            log.close()
+            del running[hz]
+            try:
+                with open(_result_path(directory, hz)) as fh:
+                    results[hz] = json.load(fh)
+            except (OSError, ValueError):
+                results[hz] = {'status': 'error', 'error': f'exit code {proc.returncode}, siehe train_{hz}.log',
+                               'seconds': round(time.time() - t0, 3)}
+            if on_done:
+                on_done(hz, results[hz])
+    wall = time.time() - started
+    per_hz = {hz: res.get('seconds') for hz, res in results.items()}
+    summed = sum(s for s in per_hz.values() if s)
+    timing = {
+        'mode': 'parallel' if parallel else 'sequential',
+        'train_mode': mode,
+        'fit_modes': {hz: res.get('fit_mode') for hz, res in results.items()},
+        'cpus': cpus,
+        'wall_seconds': round(wall, 3),
+        'horizon_seconds': per_hz,
+        # sequentielles Äquivalent (Summe der Horizont-Laufzeiten bei gleicher Kernzuteilung) / Wall-Clock
+        'sequential_seconds': round(summed, 3),
+        'speedup': round(summed / wall, 2) if wall > 0 else None,
+    }
+    return results, timing
+
+
+def _fit(train_df, path, time_limit, num_cpus, **kwargs):
+    from autogluon.tabular import TabularDataset, TabularPredictor
+    return TabularPredictor(label='target', path=path, eval_metric='mean_absolute_error')\
+        .fit(TabularDataset(train_df), time_limit=time_limit, num_cpus=num_cpus, verbosity=0, **kwargs)
+
+
+def _mae(predictor, df, features):
+    return float(np.mean(np.abs(predictor.predict(df[features]).values - df['target'].values)))
+
+
+def _metrics(predictor, train_df, features, mae):
+    # Approx MAPE
+    y_true = train_df['target']
+    y_pred = predictor.predict(train_df[features])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mape = float(np.mean(np.abs((y_true - y_pred) / np.where(y_true == 0, np.nan, y_true))))
+    # R^2 (einfach)
+    ss_res = float(((y_true - y_pred) ** 2).sum())
+    ss_tot = float(((y_true - y_true.mean()) ** 2).sum())
+    r2 = 1 - ss_res / ss_tot if ss_tot else None
+    return {'mae': mae, 'mape': mape, 'r2': r2, 'rows': int(len(train_df))}
+
+
+def _leaderboard_mae(predictor):
+    """MAE aus Leaderboard (Bestes Modell = erste Zeile, score_val = -MAE)."""
+    lb = predictor.leaderboard(silent=True)
+    if not lb.empty and 'score_val' in lb.columns:
+        score_val = lb.iloc[0].get('score_val')
+        if score_val is not None:
+            return abs(float(score_val))
+    return None
+
+
+def previous_hyperparameters(predictor, top_k=0):
+    """Hyperparameter + Modelltypen der besten Basismodelle (ohne Ensembles) -> (hyperparameters für fit(), Namen)."""
+    lb = predictor.leaderboard(silent=True).sort_values('score_val', ascending=False)
+    info = predictor.info().get('model_info', {})
+    hyperparameters, used = {}, []
+    for name in lb['model']:
+        key = MODEL_KEYS.get(info.get(name, {}).get('model_type'))
+        if key is None:
+            continue
+        hyperparameters.setdefault(key, []).append(info[name].get('hyperparameters') or {})
+        used.append(name)
+        if top_k and len(used) >= top_k:
+            break
+    return hyperparameters, used
+
+
+def _write_model_meta(path, meta):
+    with open(os.path.join(path, MODEL_META_FILE), 'w') as fh:
+        json.dump(meta, fh)
+
+
+def _read_model_meta(path):
+    try:
+        with open(os.path.join(path, MODEL_META_FILE)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _train_max_time(train_df):
+    """Jüngste Trainingszeile als ISO-String (None ohne time Spalte)."""
+    if 'time' not in train_df.columns or train_df.empty:
+        return None
+    return pd.Timestamp(train_df['time'].max()).isoformat()
+
+
+def _train_incremental(train_df, features, path, prev_path, time_limit, num_cpus, top_k, tolerance, min_val_rows,
+                       fit_kwargs=None):
+    """Warm Start vom Vorgänger -> (predictor, info) oder (None, info) wenn ein voller Fit nötig ist."""
+    from autogluon.tabular import TabularPredictor
+    started = time.time()
+    info = {'prev_path': prev_path}
+    if not prev_path or not os.path.isdir(prev_path) or 'time' not in train_df.columns:
+        info['fallback'] = 'no_previous_model'
+        return None, info
+    prev = TabularPredictor.load(prev_path)
+    if set(prev.feature_metadata.get_features()) != set(features):
+        info['fallback'] = 'feature_schema_changed'
+        return None, info
+    hyperparameters, used = previous_hyperparameters(prev, top_k)
+    if not hyperparameters:
+        info['fallback'] = 'no_base_models'
+        return None, info
+    # Validierung nur auf Zeilen nach dem Trainingsende des Vorgängers -> Referenz-MAE ist out-of-sample
+    prev_max = _read_model_meta(prev_path).get('train_max_time')
+    if not prev_max:
+        info['fallback'] = 'previous_train_time_unknown'
+        return None, info
+    prev_max = pd.Timestamp(prev_max)
+    times = pd.to_datetime(train_df['time'])
+    if times.dt.tz is None and prev_max.tzinfo is not None:
+        prev_max = prev_max.tz_convert('UTC').tz_localize(None)
+    elif times.dt.tz is not None and prev_max.tzinfo is None:
+        prev_max = prev_max.tz_localize('UTC')
+    newer = (times > prev_max).values
+    fit_part, new_part = train_df[~newer], train_df[newer]
+    # Neue Zeilen chronologisch teilen: ältere Hälfte Tuning des Warm Starts, jüngere Hälfte Holdout für den
+    # Vergleich (für beide Modelle ungesehen)
+    cut = times[newer].quantile(0.5)
+    is_holdout = (times[newer] > cut).values
+    tune_part, val_part = new_part[~is_holdout], new_part[is_holdout]
+    info.update({'prev_train_max_time': prev_max.isoformat(), 'tune_rows': int(len(tune_part)),
+                 'val_rows': int(len(val_part))})
+    if fit_part.empty or tune_part.empty or len(val_part) < max(min_val_rows, 1):
+        info['fallback'] = 'validation_after_prev_too_small'
+        return None, info
+    # Vorgänger vor dem Fit bewerten (AutoGluon lädt Modelle lazy, prev_path kann gleich path sein)
+    reference = _mae(prev, val_part, features)
+    cols = features + ['target']
+    predictor = _fit(fit_part[cols], path, time_limit, num_cpus, tuning_data=tune_part[cols],
+                     hyperparameters=hyperparameters, **(fit_kwargs or {}))
+    mae = _mae(predictor, val_part, features)
+    info.update({'models': used, 'val_mae': mae, 'reference_mae': reference,
+                 'seconds': round(time.time() - started, 3)})
+    if mae > reference * (1 + tolerance):
+        info['fallback'] = 'mae_regressed'
+        return None, info
+    # Endmodell auf Training + Tuning + Holdout (gleiche Hyperparameter / Iterationen)
+    predictor.refit_full(set_best_to_refit_full=True, train_data_extra=val_part[cols])
+    return predictor, info
+
+
+def distill_horizon(predictor, path, train_df, features, time_limit, val_fraction, sample_path, augment=None):
+    """Ensemble -> ein LightGBM (AutoGluon distill), eigener Predictor unter {path}/distilled -> Report."""
+    from autogluon.tabular import TabularPredictor
+    started = time.time()
+    cut = train_df['time'].quantile(1 - val_fraction)
+    fit_part, val_part = train_df[train_df['time'] < cut], train_df[train_df['time'] >= cut]
+    if fit_part.empty or val_part.empty:
+        return {'status': 'skipped', 'reason': 'validation_split_empty'}
+    cols = features + ['target']
+    augment = augment if augment is not None else (os.getenv('TRAIN_DISTILL_AUGMENT', '') or None)
+    names = predictor.distill(train_data=fit_part[cols], tuning_data=val_part[cols], time_limit=time_limit,
+                              hyperparameters={'GBM': {}}, augment_method=augment, models_name_suffix='DSTL')
+    student = names[0]
+    student_path = os.path.join(path, DISTILLED_DIR)
+    predictor.clone_for_deployment(path=student_path, model=student, dirs_exist_ok=True)
+    # Lehrer bleibt wie trainiert (model_best, Leaderboard für den Warm Start)
+    predictor.delete_models(models_to_delete=[student], dry_run=False)
+    y = val_part['target'].values
+    teacher_pred = predictor.predict(val_part[features]).values
+    student_pred = TabularPredictor.load(student_path).predict(val_part[features]).values
+    teacher_mae = float(np.mean(np.abs(teacher_pred - y)))
+    student_mae = float(np.mean(np.abs(student_pred - y)))
+    return {
+        'status': 'ok',
+        'model': student,
+        'path': student_path,
+        'augment': augment,
+        'holdout_rows': int(len(val_part)),
+        'teacher': {'mae': teacher_mae, **_probe(path, sample_path)},
+        'student': {'mae': student_mae, **_probe(student_path, sample_path)},
+        'mae_delta': student_mae - teacher_mae,
+        'mae_delta_pct': (student_mae - teacher_mae) / teacher_mae if teacher_mae else None,
+        'fidelity_mae': float(np.mean(np.abs(student_pred - teacher_pred))),
+        'seconds': round(time.time() - started, 3),
+    }
+
+
+def train_horizon(directory, label, path, time_limit, num_cpus, mode='full', prev_path=None,
+                  incremental_time_limit=None, top_k=None, tolerance=None, val_fraction=None, infer_batch_size=None,
+                  min_val_rows=None):
+    """Einen Horizont trainieren (im Kind-Prozess) -> Metriken, Inferenz-Latenz + Feature-Liste des Predictors."""
+    from autogluon.tabular import TabularPredictor
+    started = time.time()
+    with open(os.path.join(directory, META_FILE)) as fh:
+        meta = json.load(fh)
+    features = meta['features']
+    # time immer laden: train_max_time im training_meta.json ist die Validierungsgrenze des nächsten Warm Starts
+    extra = meta.get('extra', [])
+    train_df = pd.read_parquet(os.path.join(directory, DATASET_FILE), columns=features + [label] + extra,
+                               memory_map=True)
+    train_df = train_df.rename(columns={label: 'target'})
+    predictor, incremental = None, None
+    constraints = latency_constraints(infer_batch_size)
+    if mode == 'incremental':
+        predictor, incremental = _train_incremental(
+            train_df, features, path, prev_path,
+            incremental_time_limit or int(os.getenv('TRAIN_INCREMENTAL_TIME_LIMIT', '45')), num_cpus,
+            top_k if top_k is not None else int(os.getenv('TRAIN_INCREMENTAL_TOP_K', '0')),
+            tolerance if tolerance is not None else float(os.getenv('TRAIN_INCREMENTAL_TOLERANCE', '0.05')),
+            min_val_rows if min_val_rows is not None else int(os.getenv('TRAIN_INCREMENTAL_MIN_VAL_ROWS', '200')),
+            constraints)
+        if predictor is None:
+            logging.info(f"Incremental fit fallback to full fit: {incremental.get('fallback')}")
+    if predictor is not None:
+        fit_mode = 'incremental'
+        mae = incremental['val_mae']
+    else:
+        fit_mode = 'full' if mode == 'full' else 'full_fallback'
+        predictor = _fit(train_df[features + ['target']], path, time_limit, num_cpus, **constraints)
+        mae = _leaderboard_mae(predictor)
+    result = _metrics(predictor, train_df, features, mae)
+    # Latenz wie in generate_predictions: frisch geladener Predictor, ein predict() je Batch
+    batch_size = constraints.get('infer_limit_batch_size') or infer_batch_size or 1
+    latency = measure_latency(TabularPredictor.load(path), train_df, features, [1, batch_size])
+    limit_ms = constraints['infer_limit'] * 1000 if 'infer_limit' in constraints else None
+    inference = {
+        'presets': constraints.get('presets'),
+        'infer_limit_ms': limit_ms,
+        'batch_size': batch_size,
+        'model_best': predictor.model_best,
+        'latency': latency,
+        'within_budget': (latency[str(min(batch_size, len(train_df)))]['row_ms'] <= limit_ms) if limit_ms else None,
+    }
+    distill = None
+    if distill_enabled():
+        sample_path = os.path.join(directory, f'probe_{label}.parquet')
+        train_df[features].tail(batch_size).to_parquet(sample_path, index=False)
+        try:
+            distill = distill_horizon(
+                predictor, path, train_df, features, int(os.getenv('TRAIN_DISTILL_TIME_LIMIT', '60')),
+                val_fraction if val_fraction is not None else float(os.getenv('TRAIN_VALIDATION_FRACTION', '0.1')),
+                sample_path)
+        except Exception as e:
+            logging.exception("Distillation failed")
+            distill = {'status': 'error', 'error': str(e)[:300]}
+    _write_model_meta(path, {'fit_mode': fit_mode, 'val_mae': mae, 'incremental': incremental,
+                             'inference': inference, 'distill': distill, 'trained_at': time.time(),
+                             'train_max_time': _train_max_time(train_df)})
+    result.update({
+        'status': 'ok',
+        'fit_mode': fit_mode,
+        'incremental': incremental,
+        'inference': inference,
+        'distill': distill,
+        'features': list(predictor.feature_metadata.get_features()),
+        'num_cpus': num_cpus,
+        'seconds': round(time.time() - started, 3),
+    })
+    return result
+
+
+def main():
+    if sys.argv[1:2] == ['--probe']:
+        p = argparse.ArgumentParser()
+        p.add_argument('--probe', required=True)
+        p.add_argument('--sample', required=True)
+        p.add_argument('--out', required=True)
+        args = p.parse_args()
+        result = probe_model(args.probe, args.sample)
+        with open(args.out, 'w') as fh:
+            json.dump(result, fh)
+        return
+    p = argparse.ArgumentParser()
+    p.add_argument('--dataset', required=True)
+    p.add_argument('--horizon', required=True)
+    p.add_argument('--label', required=True)
+    p.add_argument('--path', required=True)
+    p.add_argument('--time-limit', type=int, required=True)
+    p.add_argument('--num-cpus', type=int, required=True)
+    p.add_argument('--mode', choices=['full', 'incremental'], default='full')
+    p.add_argument('--prev-path')
+    p.add_argument('--incremental-time-limit', type=int)
+    p.add_argument('--infer-batch-size', type=int)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    started = time.time()
+    try:
+        result = train_horizon(args.dataset, args.label, args.path, args.time_limit, args.num_cpus, args.mode,
+                               args.prev_path, args.incremental_time_limit,
+                               infer_batch_size=args.infer_batch_size)
+    except Exception as e:
+        logging.exception(f"Training horizon {args.horizon} failed")
+        result = {'status': 'error', 'error': str(e)[:300], 'seconds': round(time.time() - started, 3)}
+    out = _result_path(args.dataset, args.horizon)
+    with open(out + '.tmp', 'w') as fh:
+        json.dump(result, fh)
+    os.replace(out + '.tmp', out)
+    sys.exit(0 if result['status'] == 'ok' else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+"""Versionierte Parquet-Snapshots des Trainingsframes (Store-Zeilen + Cross-Section), fortgeschrieben per Watermark.
+
+Ein Snapshot ist ein unveränderliches Verzeichnis TRAIN_SNAPSHOT_DIR/{id} mit Parquet-Teilen (part-NNNNN.parquet),
+manifest.json (Eltern-Snapshot, Fingerprint, Watermark, Teile mit Startzeit) und payloads.json (yfinance Payloads des
+Laufs, daraus entstehen Sektoren und YF-Features). update() schreibt nur Zeilen ab `watermark - overlap` als neuen
+Teil; die Teile des Vorgängers werden per Hardlink übernommen (kein Kopieren). Zeilen eines Teils gelten nur vor dem
+frühesten Start eines späteren Teils -> späte Candles im letzten Slot und Backfills (rewind()) ersetzen alte Zeilen.
+
+Voller Neuaufbau wenn kein Vorgänger existiert, sich der Fingerprint (zustandslose Pipeline, Cross-Section Spalten,
+Sektor-Zuordnung) ändert, der Feature Store zurückgesetzt wurde oder der Basis-Snapshot älter als max_age ist.
+Teile vollständig vor dem Trainingsfenster entfallen; bei mehr als max_parts Teilen wird zu einem Teil kompaktiert.
+
+Keys:
+    training_snapshot_rewind   Epoch-Sekunden der frühesten nachträglich eingefügten Candle (Lua: nur kleiner setzen)
+
+Env: TRAIN_SNAPSHOT_DIR (./training_snapshots), TRAIN_SNAPSHOT_OVERLAP_MINUTES (60), TRAIN_SNAPSHOT_MAX_PARTS (8),
+     TRAIN_SNAPSHOT_MAX_AGE_HOURS (24), TRAIN_SNAPSHOT_KEEP (3)
+
+Snapshot für Experimente als ein Frame exportieren:
+
+    python training_snapshots.py --list
+    python training_snapshots.py --export s20250920101500123-3fa2c1 --out frame.parquet
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+REWIND_KEY = 'training_snapshot_rewind'
+MANIFEST_FILE = 'manifest.json'
+PAYLOADS_FILE = 'payloads.json'
+STAGING = '.staging'
+
+_REWIND_LUA = """
+local cur = redis.call('GET', KEYS[1])
+if (not cur) or tonumber(ARGV[1]) < tonumber(cur) then
+    redis.call('SET', KEYS[1], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# Marker nur löschen wenn seit dem Lesen kein früherer Backfill dazukam
+_CLEAR_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+
+def _epoch(ts):
+    ts = pd.Timestamp(ts)
+    return (ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')).timestamp()
+
+
+def _utc_series(s):
+    s = pd.to_datetime(s)
+    return s.dt.tz_localize('UTC') if s.dt.tz is None else s.dt.tz_convert('UTC')
+
+
+def _epochs(s):
+    return (_utc_series(s) - pd.Timestamp(0, tz='UTC')).dt.total_seconds().to_numpy(dtype=float)
+
+
+def frame_fingerprint(derive_fingerprint, columns, sectors):
+    """Fingerprint der Snapshot-Zeilen: zustandslose Pipeline + Spaltenliste + Sektor-Zuordnung (Cross-Section)."""
+    raw = json.dumps([derive_fingerprint, list(columns), sorted(sectors.items())])
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+class TrainingSnapshots:
+    def __init__(self, redis_client=None, root=None, overlap_minutes=None, max_parts=None, max_age_hours=None, keep=None):
+        self.r = redis_client
+        self.root = root or os.getenv('TRAIN_SNAPSHOT_DIR', './training_snapshots')
+        self.overlap = 60 * int(overlap_minutes if overlap_minutes is not None
+                                else os.getenv('TRAIN_SNAPSHOT_OVERLAP_MINUTES', '60'))
+        self.max_parts = int(max_parts if max_parts is not None else os.getenv('TRAIN_SNAPSHOT_MAX_PARTS', '8'))
+        self.max_age = 3600 * float(max_age_hours if max_age_hours is not None
+                                    else os.getenv('TRAIN_SNAPSHOT_MAX_AGE_HOURS', '24'))
+        self.keep = int(keep if keep is not None else os.getenv('TRAIN_SNAPSHOT_KEEP', '3'))
+        # Ohne Redis (CLI: --list/--export) nur Lesen
+        self._rewind = self.r.register_script(_REWIND_LUA) if self.r is not None else None
+        self._clear = self.r.register_script(_CLEAR_LUA) if self.r is not None else None
+
+    def rewind(self, since):
+        """Nächstes update() liest ab `since` neu (Backfill älterer Candles)."""
+        return bool(self._rewind(keys=[REWIND_KEY], args=[repr(_epoch(since))]))
+
+    def rewind_rows(self, rows):
+        """rewind() für (time, ticker, ...) Tupel wie insert_candles sie bekommt (früheste Zeit)."""
+        return self.rewind(min(row[0] for row in rows)) if rows else False
+
+    def path(self, snapshot_id):
+        return os.path.join(self.root, snapshot_id)
+
+    def snapshots(self):
+        """Fertige Snapshots, älteste zuerst (id beginnt mit UTC-Zeitstempel)."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root)
+                      if d != STAGING and os.path.exists(os.path.join(self.root, d, MANIFEST_FILE)))
+
+    def manifest(self, snapshot_id):
+        with open(os.path.join(self.path(snapshot_id), MANIFEST_FILE)) as fh:
+            return json.load(fh)
+
+    def latest(self):
+        ids = self.snapshots()
+        return self.manifest(ids[-1]) if ids else None
+
+    def payloads(self, snapshot_id):
+        try:
+            with open(os.path.join(self.path(snapshot_id), PAYLOADS_FILE)) as fh:
+                return json.load(fh)
+        except OSError:
+            return {}
+
+    def load(self, snapshot_id, since=None):
+        """Snapshot als ein Frame (überholte Zeilen früherer Teile entfernt), optional nur time >= since."""
+        return self._resolve(self.path(snapshot_id), self.manifest(snapshot_id)['parts'], since)
+
+    @staticmethod
+    def _resolve(directory, parts, since=None):
+        frames = []
+        valid_until = float('inf')
+        # Rückwärts: ein Teil gilt nur vor dem frühesten Start aller späteren Teile
+        for part in reversed(parts):
+            df = pd.read_parquet(os.path.join(directory, part['file']), memory_map=True)
+            epochs = _epochs(df['time']) if len(df) else np.array([])
+            keep = epochs < valid_until
+            if since is not None:
+                keep &= epochs >= _epoch(since)
+            frames.append(df[keep])
+            if part['start'] is not None:
+                valid_until = min(valid_until, part['start'])
+        if not frames:
+            return pd.DataFrame()
+        out = pd.concat(frames[::-1], ignore_index=True)
+        return out.sort_values(['ticker', 'time'], kind='stable').reset_index(drop=True)
+
+    def update(self, build, fingerprint, since, payloads=None, force=False):
+        """Neuen Snapshot schreiben -> (Frame time >= since, Info).
+
+        build(after) liefert den Trainingsframe ab Zeitpunkt `after` (None = ganzes Fenster ab since).
+        """
+        started = time.time()
+        prev = self.latest()
+        marker = self.r.get(REWIND_KEY)
+        marker = marker.decode() if isinstance(marker, bytes) else marker
+        cutoff = _epoch(since)
+        reason = None
+        if force:
+            reason = 'forced'
+        elif prev is None:
+            reason = 'no_previous'
+        elif prev.get('fingerprint') != fingerprint:
+            reason = 'fingerprint'
+        elif started - prev.get('base_created', 0) > self.max_age:
+            reason = 'max_age'
+        after = None
+        if reason is None:
+            after = prev['watermark'] - self.overlap if prev.get('watermark') is not None else cutoff
+            if marker:
+                after = min(after, float(marker))
+            if after <= cutoff:
+                reason, after = 'rewind_before_window', None
+
+        snapshot_id = datetime.now(timezone.utc).strftime('s%Y%m%d%H%M%S%f')[:-3] + '-' + uuid.uuid4().hex[:6]
+        staging = os.path.join(self.root, STAGING, snapshot_id)
+        os.makedirs(staging)
+        try:
+            t0 = time.time()
+            new = build(datetime.fromtimestamp(after, timezone.utc) if after is not None else None)
+            build_seconds = time.time() - t0
+            parts = []
+            if after is not None:
+                prev_dir = self.path(prev['id'])
+                for part in prev['parts']:
+                    # Teile komplett vor dem Trainingsfenster fallen weg
+                    if part['end'] is not None and part['end'] < cutoff:
+                        continue
+                    _link(os.path.join(prev_dir, part['file']), os.path.join(staging, part['file']))
+                    parts.append(part)
+            seq = (max(int(p['file'][5:10]) for p in parts) + 1) if parts else 0
+            parts.append(_write_part(staging, seq, new, after))
+            compacted = False
+            if len(parts) > self.max_parts:
+                merged = self._resolve(staging, parts)
+                for part in parts:
+                    os.remove(os.path.join(staging, part['file']))
+                parts = [_write_part(staging, seq + 1, merged, None)]
+                compacted = True
+            frame = self._resolve(staging, parts, since)
+            watermark = _utc_series(frame['time']).max().timestamp() if len(frame) else None
+            manifest = {
+                'id': snapshot_id,
+                'parent': prev['id'] if after is not None else None,
+                'created': started,
+                'base_created': prev.get('base_created', started) if after is not None and not compacted else started,
+                'fingerprint': fingerprint,
+                'watermark': watermark,
+                'rows': int(len(frame)),
+                'parts': parts,
+            }
+            if payloads is not None:
+                with open(os.path.join(staging, PAYLOADS_FILE), 'w') as fh:
+                    json.dump(payloads, fh, default=str)
+            with open(os.path.join(staging, MANIFEST_FILE), 'w') as fh:
+                json.dump(manifest, fh)
+            os.rename(staging, self.path(snapshot_id))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if marker:
+            self._clear(keys=[REWIND_KEY], args=[marker])
+        info = {
+            'id': snapshot_id,
+            'mode': 'append' if after is not None else 'full',
+            'rebuild_reason': reason,
+            'parent': manifest['parent'],
+            'after': datetime.fromtimestamp(after, timezone.utc).isoformat() if after is not None else None,
+            'new_rows': int(len(new)),
+            'rows': manifest['rows'],
+            'parts': len(parts),
+            'compacted': compacted,
+            'mb': round(sum(os.path.getsize(os.path.join(self.path(snapshot_id), p['file'])) for p in parts) / 1e6, 2),
+            'build_seconds': round(build_seconds, 3),
+            'seconds': round(time.time() - started, 3),
+        }
+        return frame, info
+
+    def gc(self, pinned=(), staging_max_age=86400):
+        """Snapshots außer den letzten keep und den gepinnten (von Registry-Versionen referenziert) löschen."""
+        ids = self.snapshots()
+        pinned = set(pinned)
+        doomed = [s for s in ids[:-self.keep] if s not in pinned] if self.keep > 0 else []
+        for s in doomed:
+            shutil.rmtree(self.path(s), ignore_errors=True)
+        staging_root = os.path.join(self.root, STAGING)
+        if os.path.isdir(staging_root):
+            for s in os.listdir(staging_root):
+                path = os.path.join(staging_root, s)
+                if time.time() - os.path.getmtime(path) > staging_max_age:
+                    shutil.rmtree(path, ignore_errors=True)
+        return {'deleted': doomed, 'kept': [s for s in ids if s not in doomed]}
+
+
+def _link(src, dst):
+    """Hardlink (Teile sind unveränderlich), Kopie falls das Dateisystem keine Links kann."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _write_part(directory, seq, df, after):
+    name = f'part-{seq:05d}.parquet'
+    df.reset_index(drop=True).to_parquet(os.path.join(directory, name), index=False)
+    times = _utc_series(df['time']) if len(df) else None
+    return {
+        'file': name,
+        'start': after,
+        'end': times.max().timestamp() if times is not None else None,
+        'rows': int(len(df)),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--root', default=None)
+    p.add_argument('--list', action='store_true')
+    p.add_argument('--export', metavar='ID', nargs='?', const='latest')
+    p.add_argument('--out', default='frame.parquet')
+    args = p.parse_args()
+    store = TrainingSnapshots(root=args.root)
+    if args.list:
+        for s in store.snapshots():
+            m = store.manifest(s)
+            print(f"{s} parent={m['parent']} rows={m['rows']} parts={len(m['parts'])} fingerprint={m['fingerprint']}")
+    if args.export:
+        ids = store.snapshots()
+        snapshot_id = ids[-1] if args.export == 'latest' and ids else args.export
+        df = store.load(snapshot_id)
+        df.to_parquet(args.out, index=False)
+        print(f"{snapshot_id}: {len(df)} rows -> {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,36 @@
 import os
 import json
 import time
+import random
 import requests
 import redis
 import psycopg2
 from autogluon.tabular import TabularPredictor
-from celery import Celery
+from celery import Celery, group, chord
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from celery.schedules import crontab
 from grok_top_stocks import get_top_stocks_prediction
+from bar_builder import SnapshotBarBuilder
+from consensus import readings_matrix, aggregate_consensus
+from historical_candles import fetch_candles, last_candle_times, provider_last_times, record_provider_last, record_provider_empty, ensure_market_data_schema, PROVIDER_EMPTY_LOOKBACK, candle_rows, insert_candles, split_windows, PROVIDERS, PROVIDER_ORDER, response_cache
+from provider_limits import ProviderSlots, provider_limit
+from backfill_checkpoints import BackfillCheckpoints
+from backfill_queue import BackfillQueue, backfill_priority
+from retrain_scheduler import RetrainScheduler
+from model_registry import ModelRegistry
+from training_snapshots import TrainingSnapshots, frame_fingerprint
+from feature_join import load_yfinance_payloads, yfinance_frame, join_yfinance_features, YF_FEATURES
+from cross_section import ticker_sectors, join_cross_section, CROSS_SECTION_COLUMNS
+from feature_pipeline import DEFAULT_PIPELINE as FEATURES, FeaturePipeline, encode_steps, load_artifact, model_schema, usable_schema
+from feature_store import FeatureStore
+from online_features import OnlineFeatures
+from candle_hooks import CandleHooks
+from market_calendar import last_closed_slot
+from gap_detector import detect_gaps
+from training_orchestrator import write_dataset, run_horizons, DISTILLED_DIR
+import numpy as np
 import pytz
 import holidays
 try:
@@ -34,6 +54,32 @@ app = Celery('worker', broker=REDIS_URL, backend=REDIS_URL)
 # Redis
 r = redis.from_url(REDIS_URL)
 
+# 15m Bars aus Snapshot-Quotes (fetch_data)
+bar_builder = SnapshotBarBuilder(r)
+
+# Provider-Concurrency für parallele Backfill-Fenster
+provider_slots = ProviderSlots(r)
+backfill_checkpoints = BackfillCheckpoints(r)
+backfill_queue = BackfillQueue(r)
+# Hit/Miss Zähler des Provider-Response-Caches global in Redis (response_cache_stats)
+response_cache.attach_redis(r)
+# Materialisierte Features je Candle (market_features, Watermark je Ticker in Redis)
+feature_store = FeatureStore(r, FEATURES)
+# Online Feature-State je Ticker für generate_predictions (Ringpuffer im Speicher, Snapshot online_feature_state)
+online_features = OnlineFeatures(r, FEATURES)
+# Retrain-Trigger sammeln (Debounce) + Single-Flight Lease für train_model
+retrain_scheduler = RetrainScheduler(r)
+# Versionierte Modelle (MODEL_REGISTRY_DIR/{version}, Metadaten model_versions, Pointer model_registry_active)
+model_registry = ModelRegistry(r)
+# Parquet-Snapshots des Trainingsframes (TRAIN_SNAPSHOT_DIR), fortgeschrieben per Watermark
+training_snapshots = TrainingSnapshots(r)
+# Rewind/Invalidate nach Candle-Inserts (auch von import_bars.py genutzt)
+candle_hooks = CandleHooks(r, FEATURES, feature_store, training_snapshots, online_features)
+
+def _candles_inserted(rows):
+    """Nach Insert (ggf. älterer) Candles: Feature Store Watermark zurücksetzen + Online-State invalidieren."""
+    candle_hooks.inserted(rows)
+
 # Database (lazy fallback retry)
 def _connect_db():
     for attempt in range(3):
@@ -68,6 +114,12 @@ BASE_TICKERS = ['AAPL', 'NVDA', 'MSFT', 'TSLA', 'AMZN', 'META', 'GOOGL', 'BRK.B'
 # ================= Helper / Utility =================
 
 DEVIATION_THRESHOLD = 0.08  # 8% vom Nutzer gewünscht
+# Retrain-Gründe für die TRAIN_MODE=auto einen Warm Start statt eines vollen Fits nutzt
+INCREMENTAL_TRIGGERS = {'deviation', 'grok_update'}
+
+# Konsens-Preis (fetch_data): Spaltenreihenfolge der Reading-Matrix + Priorität der Primärquelle
+CONSENSUS_SOURCES = ['finnhub', 'twelvedata', 'fmp', 'marketstack', 'yfinance', 'stub']
+FETCH_PRIMARY_PRIORITY = ['finnhub', 'twelvedata', 'fmp', 'marketstack', 'yfinance', 'stub']
 
 # ================= MARKET HOURS VALIDATION =================
 
@@ -255,6 +307,23 @@ def ensure_defaults():
 
 ensure_defaults()
 
+def ensure_schema():
+    """Tabellen aus init.sql die nach dem ersten Start dazukamen (market_data.source, market_features inkl. ind_*,
+    model_versions)."""
+    try:
+        ensure_market_data_schema(conn)
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"ensure_schema market_data failed: {e}")
+    try:
+        feature_store.ensure_schema(conn)
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"ensure_schema market_features failed: {e}")
+    model_registry.ensure_schema(conn)
+
+ensure_schema()
+
 # ===== Training Status Utilities =====
 def _training_status_update(**kwargs):
     status = _redis_json_get('ml_training_status', {}) or {}
@@ -534,6 +603,8 @@ def fetch_data():
     - Per-Ticker Logging (Redis Key: market_fetch_log, FIFO 400 Einträge)
     - Multi-Source Statistics (Redis Key: market_source_stats)
     - Intelligent Fallback Chain
+    - Snapshots werden über bar_builder zu echten 15m Bars (aligned Slots) aggregiert;
+      abgelaufene Slots werden einmalig per Upsert in market_data geschrieben
     """
     data = _redis_json_get('market_data', {}) or {}
     cur = conn.cursor()
@@ -542,6 +613,8 @@ def fetch_data():
     stats = {'finnhub': 0, 'twelvedata': 0, 'fmp': 0, 'marketstack': 0, 'yfinance': 0, 'stub': 0, 'failed': 0}
     
     # API Keys
+    td_key = os.getenv('TWELVE_DATA_API_KEY')
+    fmp_key = os.getenv('FMP_API_KEY')
     allow_stub = os.getenv('PRICE_STUB_ENABLED','0') == '1'
     import random
 
@@ -601,6 +674,8 @@ def fetch_data():
         if len(fetch_log) > 400:
             del fetch_log[:len(fetch_log)-400]
 
+    readings_by_ticker = {}
+
     # YFinance Preise aus separatem Service (optional)
     yfinance_payload = _redis_json_get('yfinance_quotes') or {}
     yf_prices = yfinance_payload.get('prices', {}) if isinstance(yfinance_payload, dict) else {}
@@ -739,44 +814,45 @@ def fetch_data():
         if not readings:
             stats['failed'] += 1; append_log(ticker,'none','failed_all')
             continue
-        # Aggregation: Median Preis
-        import statistics
-        prices = [r['price'] for r in readings if r.get('price') is not None]
-        if not prices:
+        readings_by_ticker[ticker] = readings
+    # Aggregation: Konsens (Median + MAD Ausreißer) für alle Ticker in einem NumPy Durchlauf
+    agg_tickers, price_matrix = readings_matrix(readings_by_ticker, CONSENSUS_SOURCES)
+    agg = aggregate_consensus(price_matrix, CONSENSUS_SOURCES, FETCH_PRIMARY_PRIORITY)
+    now_iso = datetime.utcnow().isoformat()
+    for i, ticker in enumerate(agg_tickers):
+        readings = readings_by_ticker[ticker]
+        if agg['primary'][i] < 0:
             stats['failed'] += 1; append_log(ticker,'aggregate','failed_all','no numeric prices')
             continue
-        agg_price = statistics.median(prices)
-        # Referenz für open/high/low: aus erster bevorzugten Quelle (Finnhub > TwelveData > FMP > Stub)
-        priority_order = ['finnhub','twelvedata','fmp','stub']
-        primary = None
-        for psrc in priority_order:
-            primary = next((r for r in readings if r['source']==psrc), None)
-            if primary: break
-        open_p = primary.get('open'); high_p = primary.get('high'); low_p = primary.get('low'); vol = primary.get('volume')
-        # Abweichungsmetrik
-        deviations = []
-        for r_ in readings:
-            try:
-                deviations.append({'source': r_['source'], 'delta_pct': (r_['price']-agg_price)/agg_price if agg_price else 0})
-            except Exception:
-                pass
+        agg_price = float(agg['consensus'][i])
+        # Referenz für change/volume: Primärquelle (Finnhub > TwelveData > FMP > Marketstack > YFinance > Stub)
+        primary_src = CONSENSUS_SOURCES[agg['primary'][i]]
+        primary = next(r_ for r_ in readings if r_['source'] == primary_src)
+        vol = primary.get('volume')
+        deviations = [
+            {'source': src, 'delta_pct': float(agg['deviation'][i, j]), 'outlier': bool(agg['outlier'][i, j])}
+            for j, src in enumerate(CONSENSUS_SOURCES) if not np.isnan(price_matrix[i, j])
+        ]
         data[ticker] = {
             'price': agg_price,
             'change': primary.get('change'),
             'change_percent': primary.get('change_pct'),
-            'time': datetime.utcnow().isoformat(),
+            'time': now_iso,
             'sources_used': [r_['source'] for r_ in readings],
+            'primary_source': primary_src,
             'source_deviation': deviations
         }
         try:
-            # ON CONFLICT schützt vor Duplicate-Key (time,ticker) wenn mehrere fetch_data Läufe denselben 15m Slot treffen
-            cur.execute("""
-                INSERT INTO market_data (time, ticker, open, high, low, close, volume)
-                VALUES (NOW(), %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (time, ticker) DO NOTHING
-            """, (ticker, open_p, high_p, low_p, agg_price, vol or 0))
+            # Laufende OHLC/Volumen-Delta im aktuellen 15m Slot (Redis) statt Zeile mit NOW() + Tages-OHLC
+            bar_builder.update(ticker, agg_price, vol)
         except Exception as e:
-            logging.warning(f"Insert realtime candle {ticker} failed: {e}")
+            logging.warning(f"Bar update {ticker} failed: {e}")
+    try:
+        finalized = bar_builder.finalize_due(cur)
+        if finalized:
+            logging.info(f"fetch_data: {finalized} 15m Bars finalisiert")
+    except Exception as e:
+        logging.warning(f"Bar finalize failed: {e}")
     conn.commit()
     _redis_json_set('market_data', data)
     _redis_json_set('market_fetch_log', fetch_log)
@@ -1025,14 +1101,7 @@ def fetch_grok_deepersearch():
                 pass
         if run_hook:
             r.set(hook_key, datetime.utcnow().isoformat())
-            status = _redis_json_get('retrain_status', {}) or {}
-            if not status.get('pending'):
-                status.update({'pending': True, 'trigger': 'grok_update'})
-                _redis_json_set('retrain_status', status)
-                try:
-                    train_model.delay('grok_update')
-                except Exception as e:
-                    logging.error(f"Retrain hook (deepersearch) failed: {e}")
+            _request_retrain('grok_update')
     return items
 
 @app.task
@@ -1152,14 +1221,7 @@ def fetch_grok_deepersearch_xai():
                 pass
         if run_hook:
             r.set(hook_key, datetime.utcnow().isoformat())
-            status = _redis_json_get('retrain_status', {}) or {}
-            if not status.get('pending'):
-                status.update({'pending': True, 'trigger': 'grok_update'})
-                _redis_json_set('retrain_status', status)
-                try:
-                    train_model.delay('grok_update')
-                except Exception as e:
-                    logging.error(f"Retrain hook (deepersearch_xai) failed: {e}")
+            _request_retrain('grok_update')
     return items
 
 @app.task
@@ -1234,20 +1296,27 @@ def grok_health():
     _redis_json_set('grok_fetch_log', fetch_log)
     return health
 @app.task
-def fetch_historical_data():
-    """Hole historische Daten (30 Tage, 15m) für dynamische Ticker mit Fallback Finnhub -> TwelveData -> FMP.
+def fetch_historical_data(full: bool = False, lookback_days: int = 30):
+    """Hole historische Daten (15m) für dynamische Ticker mit Fallback Finnhub -> TwelveData -> FMP.
+
+    Inkrementell (Default):
+    - Angefragt wird nur der Teil ab der letzten Provider-Candle (Redis Hash historical_provider_last); MAX(time)
+      in market_data zählt nicht, weil Bar-Builder/Stream dort jeden Slot selbst schreiben
+    - Ticker deren letzte Provider-Candle den letzten abgeschlossenen Session-Slot abdeckt werden ohne Netzwerk
+      übersprungen
+    - Ticker ohne Historie (oder full=True) laden das komplette Fenster (lookback_days)
 
     Erweiterungen:
     - Detailliertes per-Ticker Logging (Redis Key: historical_fetch_log, max 300 Einträge FIFO)
     - TwelveData pseudo-Pagination (mehrere 5-Tages-Segmente falls nötig)
     - Quelle & Candle-Zähler pro Ticker
+    - Ein Bulk-Insert für alle Ticker am Ende
     """
     cur = conn.cursor()
     tickers = get_dynamic_tickers()
     end_dt = datetime.utcnow()
-    start_dt = end_dt - timedelta(days=30)
-    inserted = 0
-    source_stats = { 'finnhub': 0, 'twelvedata': 0, 'fmp': 0, 'failed': 0 }
+    window_start = end_dt - timedelta(days=lookback_days)
+    source_stats = { 'finnhub': 0, 'twelvedata': 0, 'fmp': 0, 'failed': 0, 'skipped_current': 0 }
 
     fetch_log = _redis_json_get('historical_fetch_log', []) or []
 
@@ -1266,147 +1335,51 @@ def fetch_historical_data():
             # FIFO beschränken
             del fetch_log[:len(fetch_log)-300]
 
-    td_key = os.getenv('TWELVE_DATA_API_KEY')
-    fmp_key = os.getenv('FMP_API_KEY')
-
-    def fetch_candles_ticker(ticker: str):
-        # 1) Finnhub
-        try:
-            start_time = int(start_dt.timestamp())
-            end_time = int(end_dt.timestamp())
-            url = f'https://finnhub.io/api/v1/stock/candle?symbol={ticker}&resolution=15&from={start_time}&to={end_time}&token={FINNHUB_API_KEY}'
-            resp = requests.get(url, timeout=30)
-            if resp.status_code == 200:
-                js = resp.json()
-                if js.get('s') == 'ok' and js.get('t'):
-                    source_stats['finnhub'] += 1
-                    candles = [
-                        {
-                            'time': datetime.fromtimestamp(js['t'][i]),
-                            'open': js['o'][i],
-                            'high': js['h'][i],
-                            'low': js['l'][i],
-                            'close': js['c'][i],
-                            'volume': js['v'][i]
-                        } for i in range(len(js['t']))
-                    ]
-                    append_fetch_log(ticker, 'finnhub', 'ok', len(candles), 200)
-                    return candles
-                append_fetch_log(ticker, 'finnhub', 'empty', 0, 200, js.get('s'))
-            else:
-                append_fetch_log(ticker, 'finnhub', 'http_error', 0, resp.status_code, resp.text[:120])
-        except Exception as e:
-            logging.warning(f"Finnhub fail {ticker}: {e}")
-            append_fetch_log(ticker, 'finnhub', 'exception', 0, None, str(e)[:120])
-        # 2) Twelve Data (Intraday 15min) – begrenzt: liefert meist weniger Tage je Call
-        if td_key:
-            try:
-                # Pagination über 5-Tage Fenster (heuristisch) – TwelveData Limit umgehen
-                parsed_total = []
-                window = 5
-                current_start = start_dt
-                while current_start < end_dt:
-                    current_end = min(current_start + timedelta(days=window), end_dt)
-                    url = (
-                        f'https://api.twelvedata.com/time_series?symbol={ticker}'
-                        f'&interval=15min&apikey={td_key}&start_date={current_start.strftime("%Y-%m-%d %H:%M:%S")}'
-                        f'&end_date={current_end.strftime("%Y-%m-%d %H:%M:%S")}&format=JSON'
-                    )
-                    resp = requests.get(url, timeout=30)
-                    if resp.status_code == 200:
-                        js = resp.json()
-                        values = js.get('values') or []
-                        # Falls Error-Struktur
-                        if isinstance(js, dict) and js.get('status') == 'error':
-                            append_fetch_log(ticker, 'twelvedata', 'api_error', 0, 200, js.get('message'))
-                            break
-                        for row in reversed(values):
-                            try:
-                                ts = datetime.fromisoformat(row['datetime'])
-                                if ts < start_dt or ts > end_dt:
-                                    continue
-                                parsed_total.append({
-                                    'time': ts,
-                                    'open': float(row['open']),
-                                    'high': float(row['high']),
-                                    'low': float(row['low']),
-                                    'close': float(row['close']),
-                                    'volume': float(row.get('volume', 0) or 0)
-                                })
-                            except Exception:
-                                continue
-                    else:
-                        append_fetch_log(ticker, 'twelvedata', 'http_error', 0, resp.status_code, resp.text[:120])
-                        break
-                    # leichte Pause zur Ratelimit Schonung
-                    time.sleep(0.25)
-                    current_start = current_end
-                if parsed_total:
-                    source_stats['twelvedata'] += 1
-                    append_fetch_log(ticker, 'twelvedata', 'ok', len(parsed_total), 200)
-                    return parsed_total
-                append_fetch_log(ticker, 'twelvedata', 'empty', 0, 200)
-            except Exception as e:
-                logging.warning(f"TwelveData fail {ticker}: {e}")
-                append_fetch_log(ticker, 'twelvedata', 'exception', 0, None, str(e)[:120])
-        # 3) FMP (Financial Modeling Prep) – 15min historisch
-        if fmp_key:
-            try:
-                # Endpoint: https://financialmodelingprep.com/api/v3/historical-chart/15min/AAPL?apikey=...
-                url = f'https://financialmodelingprep.com/api/v3/historical-chart/15min/{ticker}?apikey={fmp_key}'
-                resp = requests.get(url, timeout=30)
-                if resp.status_code == 200:
-                    arr = resp.json()
-                    parsed = []
-                    for row in arr:
-                        try:
-                            ts = datetime.fromisoformat(row['date'])
-                            if ts < start_dt or ts > end_dt:
-                                continue
-                            parsed.append({
-                                'time': ts,
-                                'open': float(row['open']),
-                                'high': float(row['high']),
-                                'low': float(row['low']),
-                                'close': float(row['close']),
-                                'volume': float(row.get('volume', 0) or 0)
-                            })
-                        except Exception:
-                            continue
-                    if parsed:
-                        source_stats['fmp'] += 1
-                        candles = list(reversed(parsed))  # Älteste zuerst
-                        append_fetch_log(ticker, 'fmp', 'ok', len(candles), 200)
-                        return candles
-                    append_fetch_log(ticker, 'fmp', 'empty', 0, 200)
-                else:
-                    append_fetch_log(ticker, 'fmp', 'http_error', 0, resp.status_code, resp.text[:120])
-            except Exception as e:
-                logging.warning(f"FMP fail {ticker}: {e}")
-                append_fetch_log(ticker, 'fmp', 'exception', 0, None, str(e)[:120])
-        source_stats['failed'] += 1
-        append_fetch_log(ticker, 'none', 'failed_all', 0, None)
-        return []
-
+    last_times = {} if full else provider_last_times(r, tickers)
+    if not full:
+        # Fehlende Watermark aus vorhandenen Provider-Candles übernehmen statt das ganze Fenster neu zu laden
+        last_times.update(last_candle_times(cur, [t for t in tickers if t not in last_times]))
+    current_slot = last_closed_slot()
+    rows = []
+    empty = []
     for ticker in tickers:
-        candles = fetch_candles_ticker(ticker)
-        for c in candles:
-            try:
-                cur.execute("""
-                    INSERT INTO market_data (time, ticker, open, high, low, close, volume)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (time, ticker) DO NOTHING
-                """, (
-                    c['time'], ticker, c['open'], c['high'], c['low'], c['close'], c['volume']
-                ))
-                inserted += 1
-            except Exception as e:
-                logging.error(f"Insert fail {ticker} {c.get('time')}: {e}")
-        # leichte Pause um Rate Limits zu schonen
-        time.sleep(0.4)
+        last = last_times.get(ticker)
+        if last is not None and current_slot is not None and last >= current_slot:
+            source_stats['skipped_current'] += 1
+            continue
+        start_dt = window_start
+        if last is not None:
+            # Nächster Slot nach letzter gespeicherter Candle
+            start_dt = max(window_start, last.astimezone(pytz.utc).replace(tzinfo=None) + timedelta(minutes=15))
+        fetches = response_cache.fetches
+        source, candles = fetch_candles(ticker, start_dt, end_dt, log=append_fetch_log)
+        source_stats[source or 'failed'] += 1
+        rows.extend(candle_rows(ticker, candles))
+        if not candles and last is None:
+            empty.append(ticker)
+        # leichte Pause um Rate Limits zu schonen (nur wenn tatsächlich ein Provider angefragt wurde)
+        if response_cache.fetches != fetches:
+            time.sleep(0.4)
 
-    conn.commit()
-    result = {"inserted": inserted, "tickers": len(tickers), "sources": source_stats}
+    inserted = 0
+    try:
+        inserted = insert_candles(cur, rows)
+        conn.commit()
+        record_provider_last(r, rows)
+        record_provider_empty(r, empty, end_dt - PROVIDER_EMPTY_LOOKBACK)
+    except Exception as e:
+        logging.error(f"Historical bulk insert failed ({len(rows)} candles): {e}")
+    if inserted:
+        _candles_inserted(rows)
+    result = {
+        "inserted": inserted,
+        "candles": len(rows),
+        "tickers": len(tickers),
+        "fetched": len(tickers) - source_stats['skipped_current'],
+        "mode": "full" if full else "incremental",
+        "sources": source_stats,
+        "cache": response_cache.stats()
+    }
     _redis_json_set('historical_source_stats', {
         'time': datetime.utcnow().isoformat(),
         **result
@@ -1417,139 +1390,87 @@ def fetch_historical_data():
     return result
 
 @app.task
-def backfill_ticker(ticker: str, days: int = 60):
-    """Gezielter Backfill für einzelnen Ticker über längeren Zeitraum (Default 60 Tage) mit Fallback-Quellen.
-
-    Nutzt gleiche Logik wie fetch_historical_data (Pagination TwelveData, Finnhub, FMP).
+def backfill_ticker(ticker: str, days: int = 60, reset: bool = False):
+    """Gezielter, fortsetzbarer Backfill für einzelnen Ticker (Default 60 Tage) mit Fallback-Quellen.
+
+    - Zeitraum in 5-Tages Fenster (Grenzen auf UTC-Mitternacht, stabil über Re-Runs)
+    - Pro Fenster Fallback Finnhub -> TwelveData -> FMP, Insert + Commit sofort nach jedem Fenster
+    - Checkpoint pro (Ticker, Provider, Fenster) in Redis (backfill_checkpoint:{ticker}); ein erneuter Lauf
+      überspringt fertige Fenster, Neustart/Abbruch verliert höchstens das laufende Fenster
+    - Provider-Fehler (HTTP 429, Timeout, API Error) -> Provider für den Rest des Laufs aus, Fenster bleibt offen
+    - reset=True verwirft alle Checkpoints des Tickers
     Ergebnis-Statistik in Redis Key historical_backfill_status (letzte 50 Einträge FIFO).
     """
     cur = conn.cursor()
+    if reset:
+        backfill_checkpoints.clear(ticker)
     end_dt = datetime.utcnow()
-    start_dt = end_dt - timedelta(days=days)
+    windows = split_windows(end_dt - timedelta(days=days), end_dt, 5, aligned=True)
     inserted = 0
-    sources_used = []
-
-    def insert_batch(candles):
-        nonlocal inserted
-        for c in candles:
+    candles_by_source = {}
+    skipped = 0
+    open_windows = 0
+    failing = set()
+    statuses = {}
+
+    def log_status(t, source, status, candles, http_status=None, note=None):
+        statuses[source] = status
+
+    for ws, we in windows:
+        if backfill_checkpoints.done_by(ticker, ws, we, PROVIDER_ORDER + ['none']):
+            skipped += 1
+            continue
+        statuses.clear()
+        source, candles = None, []
+        for provider in PROVIDER_ORDER:
+            if provider in failing:
+                continue
+            candles = PROVIDERS[provider](ticker, ws, we, log=log_status, timeout=40)
+            if candles:
+                source = provider
+                break
+            # Kein Key -> kein Status; 'empty' ist eine gültige Antwort, alles andere gilt als Fehler
+            if statuses.get(provider) not in (None, 'empty'):
+                failing.add(provider)
+        n = 0
+        if candles:
             try:
-                cur.execute("""
-                    INSERT INTO market_data (time, ticker, open, high, low, close, volume)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (time, ticker) DO NOTHING
-                """, (c['time'], ticker, c['open'], c['high'], c['low'], c['close'], c['volume']))
-                inserted += 1
+                rows = candle_rows(ticker, candles)
+                n = insert_candles(cur, rows)
+                conn.commit()
+                if n:
+                    _candles_inserted(rows)
             except Exception as e:
-                logging.error(f"Backfill insert fail {ticker} {c.get('time')}: {e}")
-
-    # Re-Use interne Funktion aus fetch_historical_data indem Zeitraum temporär angepasst werden könnte.
-    # Zur Vereinfachung duplizieren wir Minimal-Logik (könnte refaktorisiert werden).
-    # 1 Finnhub
-    try:
-        s_time = int(start_dt.timestamp()); e_time = int(end_dt.timestamp())
-        url = f'https://finnhub.io/api/v1/stock/candle?symbol={ticker}&resolution=15&from={s_time}&to={e_time}&token={FINNHUB_API_KEY}'
-        resp = requests.get(url, timeout=40)
-        if resp.status_code == 200:
-            js = resp.json()
-            if js.get('s') == 'ok' and js.get('t'):
-                candles = [{
-                    'time': datetime.fromtimestamp(js['t'][i]),
-                    'open': js['o'][i],
-                    'high': js['h'][i],
-                    'low': js['l'][i],
-                    'close': js['c'][i],
-                    'volume': js['v'][i]
-                } for i in range(len(js['t']))]
-                insert_batch(candles)
-                sources_used.append({'source': 'finnhub', 'candles': len(candles)})
-    except Exception as e:
-        logging.warning(f"Backfill Finnhub fail {ticker}: {e}")
-    # 2 TwelveData Pagination
-    td_key = os.getenv('TWELVE_DATA_API_KEY')
-    if td_key:
-        try:
-            window = 5
-            parsed_total = []
-            cur_start = start_dt
-            while cur_start < end_dt:
-                cur_end = min(cur_start + timedelta(days=window), end_dt)
-                url = (
-                    f'https://api.twelvedata.com/time_series?symbol={ticker}'
-                    f'&interval=15min&apikey={td_key}&start_date={cur_start.strftime("%Y-%m-%d %H:%M:%S")}'
-                    f'&end_date={cur_end.strftime("%Y-%m-%d %H:%M:%S")}&format=JSON'
-                )
-                resp = requests.get(url, timeout=40)
-                if resp.status_code == 200:
-                    js = resp.json()
-                    if isinstance(js, dict) and js.get('status') == 'error':
-                        break
-                    values = js.get('values') or []
-                    for row in reversed(values):
-                        try:
-                            ts = datetime.fromisoformat(row['datetime'])
-                            if ts < start_dt or ts > end_dt: continue
-                            parsed_total.append({
-                                'time': ts,
-                                'open': float(row['open']),
-                                'high': float(row['high']),
-                                'low': float(row['low']),
-                                'close': float(row['close']),
-                                'volume': float(row.get('volume', 0) or 0)
-                            })
-                        except Exception:
-                            continue
-                else:
-                    break
-                time.sleep(0.25)
-                cur_start = cur_end
-            if parsed_total:
-                insert_batch(parsed_total)
-                sources_used.append({'source': 'twelvedata', 'candles': len(parsed_total)})
-        except Exception as e:
-            logging.warning(f"Backfill TwelveData fail {ticker}: {e}")
-    # 3 FMP
-    fmp_key = os.getenv('FMP_API_KEY')
-    if fmp_key:
-        try:
-            url = f'https://financialmodelingprep.com/api/v3/historical-chart/15min/{ticker}?apikey={fmp_key}'
-            resp = requests.get(url, timeout=40)
-            if resp.status_code == 200:
-                arr = resp.json(); parsed = []
-                for row in arr:
-                    try:
-                        ts = datetime.fromisoformat(row['date'])
-                        if ts < start_dt or ts > end_dt: continue
-                        parsed.append({
-                            'time': ts,
-                            'open': float(row['open']),
-                            'high': float(row['high']),
-                            'low': float(row['low']),
-                            'close': float(row['close']),
-                            'volume': float(row.get('volume', 0) or 0)
-                        })
-                    except Exception:
-                        continue
-                if parsed:
-                    parsed = list(reversed(parsed))
-                    insert_batch(parsed)
-                    sources_used.append({'source': 'fmp', 'candles': len(parsed)})
-        except Exception as e:
-            logging.warning(f"Backfill FMP fail {ticker}: {e}")
+                logging.error(f"Backfill insert fail {ticker} {ws:%Y-%m-%d}..{we:%Y-%m-%d}: {e}")
+                open_windows += 1
+                continue
+            inserted += n
+            candles_by_source[source] = candles_by_source.get(source, 0) + len(candles)
+        # Leeres Fenster nur als erledigt markieren wenn kein Provider ausgefallen ist (sonst evtl. Daten verpasst)
+        if (source or not failing) and backfill_checkpoints.mark(ticker, source or 'none', ws, we, len(candles), n):
+            continue
+        open_windows += 1
 
-    conn.commit()
+    sources_used = [{'source': src, 'candles': cnt} for src, cnt in candles_by_source.items()]
     status_list = _redis_json_get('historical_backfill_status', []) or []
     status_list.append({
         'time': datetime.utcnow().isoformat(),
         'ticker': ticker,
         'days': days,
         'inserted': inserted,
-        'sources': sources_used
+        'sources': sources_used,
+        'windows': len(windows),
+        'windows_skipped': skipped,
+        'windows_open': open_windows,
+        'failing_providers': sorted(failing),
+        'cache': response_cache.stats()
     })
     if len(status_list) > 50:
         status_list = status_list[-50:]
     _redis_json_set('historical_backfill_status', status_list)
-    logging.info(f"Backfill {ticker} days={days} inserted={inserted} sources={sources_used}")
-    return {'ticker': ticker, 'inserted': inserted, 'sources': sources_used}
+    logging.info(f"Backfill {ticker} days={days} inserted={inserted} sources={sources_used} skipped={skipped}/{len(windows)} open={open_windows}")
+    return {'ticker': ticker, 'inserted': inserted, 'sources': sources_used,
+            'windows_skipped': skipped, 'windows_open': open_windows}
 
 @app.task
 def training_diagnostics():
@@ -1576,13 +1497,21 @@ def training_diagnostics():
     _redis_json_set('training_diagnostics', {'generated': datetime.utcnow().isoformat(), 'window_days': 14, 'tickers': diag})
     return diag
 
+def _backfill_priority_context():
+    """(gehaltene Ticker, grok_top10 Ticker) für die Backfill-Priorität."""
+    held = {pos.get('ticker') or pos.get('symbol') for pos in (_redis_json_get('portfolio_positions', []) or [])}
+    top10 = {item.get('ticker') for item in (_redis_json_get('grok_top10', []) or []) if isinstance(item, dict)}
+    return held - {None}, top10 - {None}
+
 @app.task
 def scan_and_backfill_low_history(min_rows: int = 150, days: int = 60, max_backfills: int = 5):
     """Automatischer Scanner für Ticker mit zu wenig historischen Zeilen.
 
     Kriterien:
     - Zählt Zeilen der letzten 14 Tage (wie training_diagnostics Basis) pro Ticker (market_data)
-    - Für Ticker mit rows < min_rows wird (bis max_backfills pro Run) ein backfill_ticker.delay(ticker, days) ausgelöst
+    - Ticker mit rows < min_rows werden in die Backfill-Queue (backfill_queue.py) eingereiht, Priorität aus
+      Defizit (1 - rows/min_rows) + Portfolio/grok_top10 Bonus; bereits laufende Backfills werden nicht erneut eingereiht
+    - drain_backfill_queue startet höchstens max_backfills parallel
     - Schreibt Statusliste in Redis Key auto_backfill_status (letzte 50 Runs FIFO)
 
     Redis Key auto_backfill_status Format Beispiel:
@@ -1591,11 +1520,11 @@ def scan_and_backfill_low_history(min_rows: int = 150, days: int = 60, max_backf
       "min_rows": 150,
       "days": 60,
       "candidates": [
-         {"ticker":"PG","rows":42,"backfill_triggered":true},
-         {"ticker":"JNJ","rows":95,"backfill_triggered":false}
+         {"ticker":"PG","rows":42,"priority":122.0,"enqueued":true},
+         {"ticker":"JNJ","rows":95,"priority":36.67,"enqueued":false}
       ],
-      "triggered": ["PG"],
-      "remaining_budget": 4
+      "enqueued": ["PG"],
+      "queue": {"queued": 1, "inflight": 1, "top": [...]}
     }
     """
     cur = conn.cursor()
@@ -1606,49 +1535,297 @@ def scan_and_backfill_low_history(min_rows: int = 150, days: int = 60, max_backf
         GROUP BY ticker
     """)
     rows = cur.fetchall()
-    candidates = []
-    for t, cnt in rows:
-        if cnt < min_rows:
-            candidates.append((t, int(cnt)))
-    # Sortiere aufsteigend nach rows (wenigste zuerst)
-    candidates.sort(key=lambda x: x[1])
-    triggered = []
+    held, top10 = _backfill_priority_context()
+    enqueued = []
     results = []
-    budget = max_backfills
-    for t, cnt in candidates:
-        do_trigger = budget > 0
-        if do_trigger:
-            try:
-                backfill_ticker.delay(t, days)
-                triggered.append(t)
-                budget -= 1
-                triggered_flag = True
-            except Exception as e:
-                logging.error(f"auto backfill trigger failed {t}: {e}")
-                triggered_flag = False
-        else:
-            triggered_flag = False
-        results.append({
-            'ticker': t,
-            'rows': cnt,
-            'backfill_triggered': triggered_flag
-        })
+    for t, cnt in rows:
+        cnt = int(cnt)
+        if cnt >= min_rows:
+            continue
+        prio = backfill_priority(1 - cnt / min_rows, t in held, t in top10)
+        ok = backfill_queue.enqueue(t, prio, {'days': days})
+        if ok:
+            enqueued.append(t)
+        results.append({'ticker': t, 'rows': cnt, 'priority': prio, 'enqueued': ok})
+    results.sort(key=lambda x: x['priority'], reverse=True)
+    if enqueued:
+        drain_backfill_queue.delay(max_inflight=max_backfills)
     status_entry = {
         'time': datetime.utcnow().isoformat(),
         'min_rows': min_rows,
         'days': days,
         'candidates': results,
-        'triggered': triggered,
-        'remaining_budget': budget
+        'enqueued': enqueued,
+        'queue': backfill_queue.snapshot()
     }
     history = _redis_json_get('auto_backfill_status', []) or []
     history.append(status_entry)
     if len(history) > 50:
         history = history[-50:]
     _redis_json_set('auto_backfill_status', history)
-    logging.info(f"scan_and_backfill_low_history: triggered={triggered} remaining_budget={budget}")
+    logging.info(f"scan_and_backfill_low_history: enqueued={enqueued}")
+    return status_entry
+
+@app.task
+def backfill_gap(ticker: str, start_iso: str, end_iso: str):
+    """Backfill genau eines fehlenden Bereichs [start, end) (aus scan_and_backfill_gaps) mit Provider-Fallback.
+
+    Ergebnis-Statistik wie backfill_ticker in Redis Key historical_backfill_status (letzte 50 Einträge FIFO).
+    """
+    cur = conn.cursor()
+    start_dt = datetime.fromisoformat(start_iso)
+    end_dt = datetime.fromisoformat(end_iso)
+    source, candles = fetch_candles(ticker, start_dt, end_dt, timeout=40)
+    inserted = 0
+    try:
+        inserted = insert_candles(cur, candle_rows(ticker, candles))
+    except Exception as e:
+        logging.error(f"Gap backfill insert fail {ticker} {start_iso}..{end_iso}: {e}")
+    conn.commit()
+    if inserted:
+        _candles_inserted(candle_rows(ticker, candles))
+    status_list = _redis_json_get('historical_backfill_status', []) or []
+    status_list.append({
+        'time': datetime.utcnow().isoformat(),
+        'ticker': ticker,
+        'range': [start_iso, end_iso],
+        'inserted': inserted,
+        'sources': [{'source': source, 'candles': len(candles)}] if source else []
+    })
+    if len(status_list) > 50:
+        status_list = status_list[-50:]
+    _redis_json_set('historical_backfill_status', status_list)
+    logging.info(f"Gap backfill {ticker} {start_iso}..{end_iso} source={source} inserted={inserted}")
+    return {'ticker': ticker, 'start': start_iso, 'end': end_iso, 'source': source, 'inserted': inserted}
+
+@app.task(bind=True, max_retries=30)
+def backfill_window(self, ticker: str, start_iso: str, end_iso: str, skip=None):
+    """Fenster-Job des Backfill-Orchestrators: Provider-Fallback unter Concurrency-Limits, ohne DB Insert.
+
+    Provider deren Limit ausgeschöpft ist werden übersprungen; liefert keiner der freien Provider Daten,
+    wird der Job später nur für die noch nicht versuchten Provider wiederholt.
+    Rückgabe enthält die Candles als Zeilen, der Chord-Callback backfill_merge fügt alles mit einem Insert ein.
+    """
+    start_dt = datetime.fromisoformat(start_iso)
+    end_dt = datetime.fromisoformat(end_iso)
+    done = backfill_checkpoints.done_by(ticker, start_dt, end_dt, PROVIDER_ORDER + ['none'])
+    if done:
+        return {'ticker': ticker, 'start': start_iso, 'end': end_iso, 'source': 'checkpoint', 'rows': [],
+                'seconds': 0, 'retries': 0}
+    tried = list(skip or [])
+    busy = []
+    errors = []
+    t0 = time.time()
+
+    def log_status(t, source, status, candles, http_status=None, note=None):
+        if status not in ('ok', 'empty'):
+            errors.append(source)
+
+    for provider in PROVIDER_ORDER:
+        if provider in tried:
+            continue
+        with provider_slots.slot(provider) as held:
+            if not held:
+                busy.append(provider)
+                continue
+            candles = PROVIDERS[provider](ticker, start_dt, end_dt, log=log_status, timeout=40)
+        tried.append(provider)
+        if candles:
+            return {
+                'ticker': ticker, 'start': start_iso, 'end': end_iso, 'source': provider,
+                'rows': [[c['time'].isoformat(), c['open'], c['high'], c['low'], c['close'], c['volume']] for c in candles],
+                'seconds': round(time.time() - t0, 3), 'retries': self.request.retries
+            }
+    if busy and self.request.retries < self.max_retries:
+        raise self.retry(args=(ticker, start_iso, end_iso), kwargs={'skip': tried}, countdown=3 + random.random() * 5)
+    return {'ticker': ticker, 'start': start_iso, 'end': end_iso, 'source': None, 'rows': [],
+            'complete': not busy and not errors and not skip, 'seconds': round(time.time() - t0, 3), 'retries': self.request.retries}
+
+@app.task
+def backfill_merge(results, run: dict):
+    """Chord-Callback: alle Fenster-Ergebnisse mit einem Bulk-Insert schreiben und Durchsatz melden.
+
+    Redis Keys: backfill_run_status (letzter Run), backfill_runs (letzte 20 Runs FIFO)
+    """
+    cur = conn.cursor()
+    rows = [
+        (datetime.fromisoformat(row[0]), res['ticker'], row[1], row[2], row[3], row[4], row[5])
+        for res in results if res for row in res['rows']
+    ]
+    inserted = 0
+    error = None
+    try:
+        inserted = insert_candles(cur, rows)
+        conn.commit()
+        if inserted:
+            _candles_inserted(rows)
+        # Checkpoints erst nach Commit; leere Fenster nur wenn alle Provider geantwortet haben
+        for res in results:
+            if res and res.get('source') != 'checkpoint' and (res.get('source') or res.get('complete')):
+                backfill_checkpoints.mark(res['ticker'], res.get('source') or 'none',
+                                          datetime.fromisoformat(res['start']), datetime.fromisoformat(res['end']),
+                                          len(res['rows']), None)
+    except Exception as e:
+        error = str(e)[:200]
+        logging.error(f"Backfill merge insert failed ({len(rows)} candles): {e}")
+    elapsed = max(time.time() - run['started'], 1e-6)
+    sources = {}
+    for res in results:
+        key = (res or {}).get('source') or 'failed'
+        sources[key] = sources.get(key, 0) + 1
+    report = {
+        **run,
+        'finished': datetime.utcnow().isoformat(),
+        'windows_done': len(results),
+        'windows_failed': sources.get('failed', 0),
+        'candles': len(rows),
+        'inserted': inserted,
+        'elapsed_s': round(elapsed, 2),
+        'candles_per_s': round(len(rows) / elapsed, 1),
+        'windows_per_s': round(len(results) / elapsed, 2),
+        'provider_seconds': round(sum((res or {}).get('seconds', 0) for res in results), 2),
+        'sources': sources,
+        'error': error
+    }
+    _redis_json_set('backfill_run_status', report)
+    history = _redis_json_get('backfill_runs', []) or []
+    history.append(report)
+    _redis_json_set('backfill_runs', history[-20:])
+    logging.info(f"Backfill run {run.get('run_id')}: windows={len(results)} candles={len(rows)} inserted={inserted} {report['candles_per_s']}/s")
+    return report
+
+@app.task
+def backfill_universe(tickers=None, days: int = 60, window_days: int = 5):
+    """Backfill-Orchestrator: Zeitraum je Ticker in Fenster-Jobs zerlegen und parallel als Celery chord ausführen.
+
+    - Ein backfill_window Job pro (Ticker, Fenster), Verteilung über alle Worker-Prozesse
+    - Provider-Concurrency über Redis Semaphore (BACKFILL_MAX_CONCURRENCY_<PROVIDER>)
+    - backfill_merge schreibt alle Candles mit einem Bulk-Insert und meldet Durchsatz
+    """
+    tickers = tickers or get_dynamic_tickers()
+    end_dt = datetime.utcnow()
+    start_dt = end_dt - timedelta(days=days)
+    windows = split_windows(start_dt, end_dt, window_days, aligned=True)
+    jobs = [backfill_window.s(t, ws.isoformat(), we.isoformat()) for t in tickers for ws, we in windows]
+    run = {
+        'run_id': f"bf-{int(time.time())}",
+        'started': time.time(),
+        'started_iso': datetime.utcnow().isoformat(),
+        'tickers': len(tickers),
+        'days': days,
+        'window_days': window_days,
+        'windows_total': len(jobs),
+        'limits': {p: provider_limit(p) for p in PROVIDER_ORDER}
+    }
+    if not jobs:
+        return run
+    chord(group(jobs))(backfill_merge.s(run))
+    _redis_json_set('backfill_run_status', {**run, 'status': 'running'})
+    logging.info(f"Backfill run {run['run_id']} dispatched: {len(jobs)} window jobs for {len(tickers)} tickers")
+    return run
+
+@app.task
+def scan_and_backfill_gaps(days: int = 30, max_inflight: int = None, max_attempts: int = 3):
+    """Kalenderbasierte Gap-Erkennung (NYSE Sessions, Feiertage, verkürzte Tage) + gezielter Backfill.
+
+    - Erwartetes 15m Raster der letzten `days` Tage bis zum letzten abgeschlossenen Slot
+    - Vergleich mit gespeicherten Zeitstempeln aller dynamischen Ticker in einem vektorisierten Durchlauf
+    - Fehlende Bereiche pro Ticker als ein Auftrag in die Backfill-Queue; Priorität aus Anteil fehlender Slots
+      + Portfolio/grok_top10 Bonus, laufende Ticker werden nicht doppelt eingereiht
+    - Bereiche die nach max_attempts eingereihten Backfills weiter fehlen (Provider ohne Daten, Handelsstopp) werden
+      übersprungen (Redis Hash gap_backfill_attempts "{Versuche}|{epoch}", Felder verfallen einzeln nach `days` Tagen)
+    - Status in Redis Key gap_scan_status (letzte 50 Runs FIFO)
+    """
+    cur = conn.cursor()
+    tickers = get_dynamic_tickers()
+    closed_slot = last_closed_slot()
+    if closed_slot is None:
+        return {'error': 'no closed session slot'}
+    end_dt = closed_slot + timedelta(minutes=15)
+    start_dt = end_dt - timedelta(days=days)
+    gaps, stats = detect_gaps(cur, tickers, start_dt, end_dt)
+
+    held, top10 = _backfill_priority_context()
+    now_epoch = int(time.time())
+    attempts = {}
+    stale = []
+    for field, value in r.hgetall('gap_backfill_attempts').items():
+        field = field.decode() if isinstance(field, bytes) else field
+        value = value.decode() if isinstance(value, bytes) else value
+        count, _, last = value.partition('|')
+        if not last or now_epoch - int(last) > days * 86400:
+            stale.append(field)
+        else:
+            attempts[field] = int(count)
+    if stale:
+        r.hdel('gap_backfill_attempts', *stale)
+    enqueued = []
+    exhausted = 0
+    for ticker, lst in gaps.items():
+        ranges = []
+        fields = []
+        for g in lst:
+            field = f"{ticker}|{g['start'].isoformat()}|{g['end'].isoformat()}"
+            if attempts.get(field, 0) >= max_attempts:
+                exhausted += 1
+                continue
+            ranges.append([g['start'].isoformat(), g['end'].isoformat()])
+            fields.append(field)
+        if not ranges:
+            continue
+        missing = sum(g['slots'] for g in lst)
+        prio = backfill_priority(missing / max(stats['grid_slots'], 1), ticker in held, ticker in top10)
+        if backfill_queue.enqueue(ticker, prio, {'ranges': ranges}):
+            # Versuch zählt nur, wenn der Bereich tatsächlich eingereiht wurde
+            for field in fields:
+                r.hset('gap_backfill_attempts', field, f"{attempts.get(field, 0) + 1}|{now_epoch}")
+            enqueued.append({'ticker': ticker, 'ranges': len(ranges), 'slots': missing, 'priority': prio})
+    if enqueued:
+        drain_backfill_queue.delay(max_inflight=max_inflight)
+
+    status_entry = {
+        'time': datetime.utcnow().isoformat(),
+        'window': [start_dt.isoformat(), end_dt.isoformat()],
+        **stats,
+        'tickers_with_gaps': len(gaps),
+        'enqueued': sorted(enqueued, key=lambda x: x['priority'], reverse=True),
+        'skipped_exhausted': exhausted,
+        'queue': backfill_queue.snapshot()
+    }
+    history = _redis_json_get('gap_scan_status', []) or []
+    history.append(status_entry)
+    if len(history) > 50:
+        history = history[-50:]
+    _redis_json_set('gap_scan_status', history)
+    logging.info(f"scan_and_backfill_gaps: tickers_with_gaps={len(gaps)} enqueued={len(enqueued)} missing_slots={stats['missing_slots']}")
     return status_entry
 
+@app.task
+def drain_backfill_queue(max_inflight: int = None, max_dispatch: int = 10):
+    """Begrenzter Consumer der Backfill-Queue: höchste Priorität zuerst, nie mehr als max_inflight
+    gleichzeitig (Default BACKFILL_MAX_INFLIGHT, 3), Lease pro Ticker verhindert Doppel-Backfills."""
+    max_inflight = max_inflight or int(os.getenv('BACKFILL_MAX_INFLIGHT', '3'))
+    claimed = backfill_queue.claim(max_inflight, max_dispatch)
+    for ticker, payload, token in claimed:
+        run_queued_backfill.delay(ticker, payload, token, max_inflight=max_inflight)
+    if claimed:
+        logging.info(f"drain_backfill_queue: dispatched {[t for t, _, _ in claimed]}")
+    return {'dispatched': [t for t, _, _ in claimed], 'queue': backfill_queue.snapshot()}
+
+@app.task
+def run_queued_backfill(ticker: str, payload: dict, token: str, max_inflight: int = None):
+    """Führt einen Queue-Auftrag aus (Bereiche -> backfill_gap, sonst backfill_ticker) und gibt die Lease frei.
+
+    max_inflight des auslösenden Drains wird an den Folge-Drain weitergereicht (sonst Env-Default)."""
+    try:
+        if payload.get('ranges'):
+            return [backfill_gap(ticker, start_iso, end_iso) for start_iso, end_iso in payload['ranges']]
+        return backfill_ticker(ticker, int(payload.get('days', 60)))
+    finally:
+        backfill_queue.release(ticker, token)
+        # Frei gewordenen Slot sofort wieder belegen
+        drain_backfill_queue.delay(max_inflight=max_inflight)
+
 @app.task
 def compute_prediction_quality_metrics(window_hours: int = 24):
     """Aggregiert Qualitätsmetriken der Vorhersagen basierend auf deviation_tracker.
@@ -1736,147 +1913,209 @@ def compute_prediction_quality_metrics(window_hours: int = 24):
     logging.info(f"compute_prediction_quality_metrics: horizons={list(result_hz.keys())}")
     return payload
 
-def _add_yfinance_enhanced_features(df, tickers):
-    """Add YFinance Enhanced Features to training data"""
-    import json
-    from datetime import datetime, timedelta
-    
-    # Initialize new columns
-    yf_features = ['sma_20', 'sma_50', 'sma_200', 'rsi', 'macd', 'macd_signal', 
-                   'bb_upper', 'bb_lower', 'volume_ratio', 'pe_ratio', 'market_cap', 
-                   'beta', 'news_sentiment_avg', 'news_count']
-    
-    for feature in yf_features:
-        df[feature] = None
-    
+def _add_yfinance_enhanced_features(df, tickers, payloads=None):
+    """Add YFinance Enhanced Features to training data (ein Merge auf (ticker, date), siehe feature_join.py)"""
     try:
-        # Hole YFinance Enhanced Daten aus Redis
-        for ticker in tickers:
-            yf_key = f'yfinance_enhanced:{ticker}'
-            yf_data_raw = r.get(yf_key)
-            
-            if not yf_data_raw:
-                continue
-                
-            yf_data = json.loads(yf_data_raw)
-            historical_data = yf_data.get('historical_data', [])
-            fundamentals = yf_data.get('fundamentals', {})
-            news = yf_data.get('news', [])
-            
-            # Fundamentals (static pro Ticker)
-            pe_ratio = fundamentals.get('pe_ratio')
-            market_cap = fundamentals.get('market_cap')
-            beta = fundamentals.get('beta')
-            
-            # News Sentiment (vereinfacht: Anzahl News als Proxy für Aktivität)
-            news_count = len(news)
-            # TODO: Implement proper sentiment analysis
-            news_sentiment_avg = 0.5  # Neutral baseline
-            
-            # Historical/Technical Data matchen
-            for hist_row in historical_data:
-                hist_date = hist_row['date']
-                
-                # Finde matching rows in df
-                ticker_mask = df['ticker'] == ticker
-                date_mask = pd.to_datetime(df['time']).dt.strftime('%Y-%m-%d') == hist_date
-                matching_mask = ticker_mask & date_mask
-                
-                if matching_mask.any():
-                    # Technical Indicators
-                    df.loc[matching_mask, 'sma_20'] = hist_row.get('sma_20')
-                    df.loc[matching_mask, 'sma_50'] = hist_row.get('sma_50')
-                    df.loc[matching_mask, 'sma_200'] = hist_row.get('sma_200')
-                    df.loc[matching_mask, 'rsi'] = hist_row.get('rsi')
-                    df.loc[matching_mask, 'macd'] = hist_row.get('macd')
-                    df.loc[matching_mask, 'macd_signal'] = hist_row.get('macd_signal')
-                    df.loc[matching_mask, 'bb_upper'] = hist_row.get('bb_upper')
-                    df.loc[matching_mask, 'bb_lower'] = hist_row.get('bb_lower')
-                    df.loc[matching_mask, 'volume_ratio'] = hist_row.get('volume_ratio')
-                    
-                    # Fundamentals (same for all dates of this ticker)
-                    df.loc[matching_mask, 'pe_ratio'] = pe_ratio
-                    df.loc[matching_mask, 'market_cap'] = market_cap
-                    df.loc[matching_mask, 'beta'] = beta
-                    df.loc[matching_mask, 'news_sentiment_avg'] = news_sentiment_avg
-                    df.loc[matching_mask, 'news_count'] = news_count
-        
+        if payloads is None:
+            payloads = load_yfinance_payloads(r, tickers)
+        yf = yfinance_frame({t: payloads[t] for t in tickers if t in payloads})
+        df = join_yfinance_features(df, yf)
         # Count how many YF features were added
-        yf_count = sum(df[col].notna().sum() for col in yf_features)
-        logging.info(f"Added {yf_count} YFinance enhanced features across {len(yf_features)} columns")
-        
+        yf_count = int(df[YF_FEATURES].notna().sum().sum())
+        logging.info(f"Added {yf_count} YFinance enhanced features across {len(YF_FEATURES)} columns")
     except Exception as e:
         logging.warning(f"Error adding YFinance enhanced features: {e}")
-    
+        for feature in YF_FEATURES:
+            if feature not in df.columns:
+                df[feature] = None
     return df
 
+def _add_cross_section_features(df, payloads):
+    """Markt-/Sektor-Aggregate je Zeitstempel über alle Zeilen von df (ein Merge, siehe cross_section.py)"""
+    try:
+        sectors = ticker_sectors(payloads)
+        df = join_cross_section(df, sectors)
+        logging.info(f"Added cross-section features: timestamps={df['time'].nunique()} sectors={len(set(sectors.values()))}")
+    except Exception as e:
+        logging.warning(f"Error adding cross-section features: {e}")
+        for feature in CROSS_SECTION_COLUMNS:
+            if feature not in df.columns:
+                df[feature] = None
+    return df
+
+@app.task
+def update_feature_store(tickers=None, rebuild: bool = False, prune: bool = True):
+    """Feature Store (market_features) inkrementell aktualisieren; rebuild=True verwirft alle Watermarks.
+
+    Status in Redis feature_store_status.
+    """
+    if rebuild:
+        r.delete('feature_store_fingerprint')
+    try:
+        stats = feature_store.update(conn, tickers)
+        if prune:
+            cur = conn.cursor()
+            stats['pruned'] = feature_store.prune(cur)
+            conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"update_feature_store failed: {e}")
+        stats = {'error': str(e)[:200]}
+    stats.update({'time': datetime.utcnow().isoformat(), 'fingerprint': FEATURES.derive_fingerprint})
+    _redis_json_set('feature_store_status', stats)
+    return stats
+
+def _trading_active():
+    """Trading läuft: Markt offen und Auto-Trading in trading_settings aktiviert (wie trade_bot prüft)."""
+    return is_market_open() and bool((_redis_json_get('trading_settings', {}) or {}).get('enabled', False))
+
+def _retrain_status_update(**kwargs):
+    status = _redis_json_get('retrain_status', {}) or {}
+    status.update(kwargs)
+    _redis_json_set('retrain_status', status)
+
+def _request_retrain(reason):
+    """Retrain anfordern statt train_model.delay: Gründe sammeln, nach dem Debounce-Fenster ein gemeinsamer Lauf."""
+    try:
+        retrain_scheduler.request(reason)
+        pending = retrain_scheduler.pending()
+        due = retrain_scheduler.due_at(pending)
+        _retrain_status_update(pending=True, state='debouncing', reasons=pending,
+                               due=datetime.utcfromtimestamp(due).isoformat())
+        dispatch_retrain.apply_async(countdown=max(1, int(due - time.time()) + 1))
+    except Exception as e:
+        logging.error(f"Retrain request ({reason}) failed: {e}")
+
+@app.task
+def dispatch_retrain():
+    """Gesammelte Retrain-Anfragen prüfen und höchstens ein Training starten.
+
+    Wartet bis das Debounce-Fenster abgelaufen ist, verschiebt während Trading in Marktzeiten aktiv ist und solange
+    ein Training die Lease hält (Beat retrain-dispatch prüft erneut). Status in retrain_status.
+    """
+    pending = retrain_scheduler.pending()
+    if not pending:
+        return {'state': 'idle'}
+    due = retrain_scheduler.due_at(pending)
+    state = None
+    if time.time() < due:
+        state = 'debouncing'
+    elif _trading_active():
+        state = 'deferred_trading'
+    elif retrain_scheduler.running():
+        state = 'busy'
+    if state:
+        _retrain_status_update(pending=True, state=state, reasons=pending, due=datetime.utcfromtimestamp(due).isoformat())
+        return {'state': state, 'reasons': sorted(pending)}
+    reasons = retrain_scheduler.claim()
+    if not reasons:
+        return {'state': 'idle'}
+    trigger = '+'.join(sorted(reasons))
+    _retrain_status_update(pending=False, state='queued', trigger=trigger, reasons=reasons)
+    train_model.delay(trigger, reasons)
+    logging.info(f"Retrain dispatched trigger={trigger} reasons={reasons}")
+    return {'state': 'queued', 'trigger': trigger, 'reasons': reasons}
+
 @app.task
-def train_model(trigger: str = 'manual'):
+def train_model(trigger: str = 'manual', reasons=None):
+    """Single-Flight: höchstens ein Training gleichzeitig (Redis Lease retrain_lease, siehe retrain_scheduler.py).
+
+    Läuft bereits ein Training, werden die Gründe wieder eingereiht und mit späteren Triggern zusammengefasst.
+    """
+    token = retrain_scheduler.acquire()
+    if not token:
+        if reasons:
+            retrain_scheduler.restore(reasons)
+        else:
+            retrain_scheduler.request(trigger)
+        _retrain_status_update(pending=True, state='busy')
+        logging.info(f"train_model({trigger}) skipped: training already running, request coalesced")
+        return f"Training already running - {trigger} coalesced"
+    try:
+        _retrain_status_update(state='running', trigger=trigger)
+        return _train_model(trigger, reasons or {trigger: {'count': 1}})
+    finally:
+        retrain_scheduler.release(token)
+        _retrain_status_update(state='idle', pending=bool(retrain_scheduler.pending()))
+
+def _train_mode(reasons):
+    """TRAIN_MODE=full|incremental|auto (Default): auto -> Warm Start wenn nur Routine-Trigger (Abweichung, Grok)
+    vorliegen; daily/manual trainieren voll. Fehlt ein Vorgänger oder verschlechtert sich die Validierungs-MAE,
+    fällt der Horizont selbst auf einen vollen Fit zurück (training_orchestrator.py)."""
+    mode = os.getenv('TRAIN_MODE', 'auto')
+    if mode == 'auto':
+        return 'incremental' if reasons and set(reasons) <= INCREMENTAL_TRIGGERS else 'full'
+    return mode
+
+def _train_model(trigger, reasons):
     """Trainiert drei separate AutoGluon Modelle für 15/30/60 Minuten Horizonte.
 
     - 15m: shift -1 (bei 15m Candle-Auflösung)
     - 30m: shift -2
     - 60m: shift -4 (bestehende Logik)
-    Speichert Modelle unter ./autogluon_model_{15|30|60}
+    Speichert Modelle unter ./autogluon_model_{15|30|60}; die Horizonte laufen als eigene Prozesse auf einem
+    gemeinsamen Parquet-Datensatz (training_orchestrator.py), Laufzeiten/Speedup in last_training_stats.training.
     Metriken (MAE, MAPE approximiert, ggf. R^2) werden gesammelt und in last_training_stats.metrics abgelegt.
     Historie der Metriken in model_metrics_history (Rolling 30).
     """
-    import pandas as pd
     _training_status_update(active=True, stage='query_data', progress=0.02, trigger=trigger, event='start', detail='Beginne SQL Fetch')
+    # Feature Store inkrementell nachziehen, danach fertige Feature-Zeilen lesen (Grok as-of Candle-Zeit, leakage-frei)
+    try:
+        store_stats = feature_store.update(conn)
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Feature store update failed: {e}")
+        store_stats = {'error': str(e)[:200]}
     cur = conn.cursor()
-    # Leakage-freie Abfrage: Grok Features + YFinance Enhanced Data
-    cur.execute("""
-        SELECT md.ticker, md.time, md.open, md.high, md.low, md.close, md.volume,
-               LAG(md.close, 1) OVER (PARTITION BY md.ticker ORDER BY md.time) as prev_close,
-               LAG(md.close, 5) OVER (PARTITION BY md.ticker ORDER BY md.time) as prev_close_5,
-               LAG(md.close, 15) OVER (PARTITION BY md.ticker ORDER BY md.time) as prev_close_15,
-               ds.sentiment AS grok_sentiment,
-               ts.expected_gain AS grok_expected_gain
-        FROM market_data md
-        LEFT JOIN LATERAL (
-            SELECT sentiment FROM grok_deepersearch d
-            WHERE d.ticker = md.ticker AND d.time <= md.time
-            ORDER BY d.time DESC LIMIT 1
-        ) ds ON TRUE
-        LEFT JOIN LATERAL (
-            SELECT expected_gain FROM grok_topstocks t
-            WHERE t.ticker = md.ticker AND t.time <= md.time
-            ORDER BY t.time DESC LIMIT 1
-        ) ts ON TRUE
-        WHERE md.time >= NOW() - INTERVAL '14 days'
-        ORDER BY md.ticker, md.time
-    """)
-    rows = cur.fetchall()
-    raw_count = len(rows)
+    since_days = 14
+    yf_payloads = load_yfinance_payloads(r, feature_store.stored_tickers())
+
+    def _build_frame(after):
+        # Markt-/Sektor-Kontext je Zeitstempel über alle Ticker im Store (vor dem Ticker-Filter)
+        return _add_cross_section_features(feature_store.load(cur, since_days=since_days, after=after), yf_payloads)
+
+    # Trainingsframe aus dem Parquet-Snapshot, aus Postgres nur Zeilen ab der Snapshot-Watermark (training_snapshots.py)
+    snapshot_fp = frame_fingerprint(FEATURES.derive_fingerprint, feature_store.columns + CROSS_SECTION_COLUMNS,
+                                    ticker_sectors(yf_payloads))
+    try:
+        df, snapshot = training_snapshots.update(_build_frame, snapshot_fp,
+                                                 datetime.now(timezone.utc) - timedelta(days=since_days),
+                                                 payloads=yf_payloads, force=bool(store_stats.get('reset')))
+        snapshot['gc'] = training_snapshots.gc(pinned=model_registry.snapshots().values())
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Training snapshot failed, loading from feature store: {e}")
+        snapshot = {'id': None, 'error': str(e)[:200]}
+        try:
+            df = _build_frame(None)
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Loading training frame failed: {e}")
+            _redis_json_set('last_training_stats', {
+                'time': datetime.utcnow().isoformat(),
+                'trigger': trigger,
+                'status': 'failed',
+                'error': f"training frame: {e}"[:300],
+                'feature_store': store_stats,
+                'snapshot': snapshot
+            })
+            _training_status_update(active=False, stage='failed', progress=1.0, event='failed', detail=str(e)[:180])
+            return f"Training failed: {e}"
+    raw_count = len(df)
 
     # Mindestzeilen pro Ticker (konfigurierbar via ENV)
     min_rows = int(os.getenv('TRAIN_MIN_ROWS', '150'))
-    # Zerlege in per-Ticker Listen
-    from collections import defaultdict
-    bucket = defaultdict(list)
-    for r in rows:
-        bucket[r[0]].append(r)
-    included = []
-    excluded = []
-    filtered_rows = []
-    for ticker, lst in bucket.items():
-        if len(lst) >= min_rows:
-            included.append(ticker)
-            filtered_rows.extend(lst)
-        else:
-            excluded.append({'ticker': ticker, 'rows': len(lst)})
+    counts = df.groupby('ticker').size()
+    included = counts[counts >= min_rows].index.tolist()
+    excluded = [{'ticker': t, 'rows': int(n)} for t, n in counts[counts < min_rows].items()]
     # Falls alles ausgeschlossen -> Degraded Mode: nimm Top 5 nach Row Count
     degraded_mode = False
     if not included:
         degraded_mode = True
-        top = sorted(bucket.items(), key=lambda kv: len(kv[1]), reverse=True)[:5]
-        filtered_rows = []
-        included = []
-        for t, lst in top:
-            included.append(t)
-            filtered_rows.extend(lst)
+        included = counts.sort_values(ascending=False, kind='stable').head(5).index.tolist()
         excluded = [e for e in excluded if e['ticker'] not in included]
-    raw_filtered = len(filtered_rows)
+    df = df[df['ticker'].isin(included)].reset_index(drop=True)
+    raw_filtered = len(df)
     _training_status_update(stage='filter_tickers', progress=0.10, event='filter', detail=f'raw={raw_count} filtered_candidate={raw_filtered}')
     if raw_filtered < 100:
         logging.warning(f"Not enough data after filter: raw={raw_count} filtered={raw_filtered}")
@@ -1894,19 +2133,11 @@ def train_model(trigger: str = 'manual'):
         })
         _training_status_update(active=False, stage='skipped_insufficient_raw', progress=1.0, event='skip', detail='Zu wenig gefilterte Daten')
         return f"Insufficient data: raw={raw_count} filtered={raw_filtered}"
-    df = pd.DataFrame(filtered_rows, columns=['ticker', 'time', 'open', 'high', 'low', 'close', 'volume', 'prev_close', 'prev_close_5', 'prev_close_15', 'grok_sentiment', 'grok_expected_gain'])
-    _training_status_update(stage='feature_engineering', progress=0.20, event='feature_eng', detail=f'rows={len(df)} tickers={len(included)}')
+    _training_status_update(stage='feature_engineering', progress=0.20, event='feature_eng', detail=f'rows={len(df)} tickers={len(included)} store_rows={store_stats.get("rows")}')
     
     # YFinance Enhanced Features hinzufügen
-    df = _add_yfinance_enhanced_features(df, included)
+    df = _add_yfinance_enhanced_features(df, included, yf_payloads)
     
-    # Feature Engineering
-    df['price_change'] = df['close'] - df['prev_close']
-    df['price_change_5'] = df['close'] - df['prev_close_5']
-    df['price_change_15'] = df['close'] - df['prev_close_15']
-    df['volatility'] = (df['high'] - df['low']) / df['close']
-    df['hour'] = pd.to_datetime(df['time']).dt.hour
-    df['day_of_week'] = pd.to_datetime(df['time']).dt.dayofweek
     # Targets für mehrere Horizonte
     df['target_15'] = df.groupby('ticker')['close'].shift(-1)
     df['target_30'] = df.groupby('ticker')['close'].shift(-2)
@@ -1929,72 +2160,69 @@ def train_model(trigger: str = 'manual'):
         })
         _training_status_update(active=False, stage='skipped_insufficient_clean', progress=1.0, event='skip', detail='Zu wenig saubere Daten')
         return f"Insufficient clean data: {clean_count} rows"
-    # Imputation für Grok Features (Median) + Missing Flags
-    for col in ['grok_sentiment','grok_expected_gain']:
-        median_val = df_clean[col].median() if not df_clean[col].dropna().empty else 0.0
-        missing_flag = df_clean[col].isna().astype(int)
-        df_clean.loc[:, f'{col}_missing'] = missing_flag
-        df_clean.loc[:, col] = df_clean[col].fillna(median_val)
+    # Imputation für Grok Features (Median) + Missing Flags, Ticker-Vokabular -> Pipeline-Zustand
+    feature_state = FEATURES.fit(df_clean)
     _training_status_update(stage='imputation', progress=0.35, event='impute', detail='Grok Features imputiert')
     # Speichere Imputation Stats in Redis
     imputation_stats = {
         'time': datetime.utcnow().isoformat(),
-        'grok_sentiment_median': float(df_clean['grok_sentiment'].median()) if not df_clean['grok_sentiment'].dropna().empty else 0.0,
-        'grok_expected_gain_median': float(df_clean['grok_expected_gain'].median()) if not df_clean['grok_expected_gain'].dropna().empty else 0.0
+        'grok_sentiment_median': feature_state['medians']['grok_sentiment'],
+        'grok_expected_gain_median': feature_state['medians']['grok_expected_gain'],
+        'fingerprint': FEATURES.fingerprint
     }
     _redis_json_set('feature_imputation', imputation_stats)
-    df_enc = pd.get_dummies(df_clean, columns=['ticker'], prefix='ticker')
+    df_enc = FEATURES.encode(df_clean, feature_state, training=True)
+    base_features = list(df_enc.columns)
+    for label_col in ['target_15', 'target_30', 'target_60']:
+        df_enc[label_col] = df_clean[label_col].values
     _training_status_update(stage='encoding', progress=0.45, event='encode', detail=f'encoded_cols={len(df_enc.columns)}')
-    base_features = [c for c in df_enc.columns if c not in ['time','target_15','target_30','target_60']]
     started = datetime.utcnow().isoformat()
     metrics = {}
     model_paths = {}
+    feature_schemas = {}
     horizons = {'15':'target_15','30':'target_30','60':'target_60'}
-    from autogluon.tabular import TabularDataset
+    version = None
     try:
         total_time_budget = 480  # Sekunden gesamt Budget heuristisch
         per_model_time = int(total_time_budget / len(horizons))
         horizon_count = len(horizons)
-        for idx,(hz,label_col) in enumerate(horizons.items(), start=1):
-            train_df = df_enc[base_features + [label_col]].rename(columns={label_col:'target'})
-            td = TabularDataset(train_df)
-            path = f'./autogluon_model_{hz}'
-            predictor = TabularPredictor(label='target', path=path, eval_metric='mean_absolute_error')\
-                .fit(td, time_limit=per_model_time, verbosity=0)
-            lb = predictor.leaderboard(silent=True)
-            # MAE aus Leaderboard (Bestes Modell = erste Zeile)
-            mae = None
-            if not lb.empty and 'score_val' in lb.columns:
-                # score_val ist neg MAE bei mae metric? In AutoGluon: lower = better; bei mae -> score_val = -MAE
-                best = lb.iloc[0]
-                score_val = best.get('score_val')
-                if score_val is not None:
-                    mae = abs(float(score_val))
-            # Approx MAPE
-            y_true = train_df['target']
-            y_pred = predictor.predict(train_df[base_features])
-            import numpy as np
-            with np.errstate(divide='ignore', invalid='ignore'):
-                mape = float(np.mean(np.abs((y_true - y_pred) / np.where(y_true==0, np.nan, y_true))))
-            # R^2 (einfach)
-            ss_res = float(((y_true - y_pred)**2).sum())
-            ss_tot = float(((y_true - y_true.mean())**2).sum())
-            r2 = 1 - ss_res/ss_tot if ss_tot else None
-            metrics[hz] = {
-                'mae': mae,
-                'mape': mape,
-                'r2': r2,
-                'rows': int(len(train_df))
-            }
-            model_paths[hz] = path
-            _training_status_update(stage=f'training_horizon_{hz}', progress=0.45 + 0.45 * (idx / horizon_count), event='horizon_trained', detail=f'hz={hz} mae={mae}')
+        # Ein gemeinsamer Datensatz auf Platte (Parquet) statt einer train_df Kopie je Horizont
+        dataset = write_dataset(df_enc.assign(time=df_clean['time'].values), base_features, list(horizons.values()))
+        _training_status_update(stage='training', progress=0.5, event='dataset_written', detail=f"dataset={dataset['mb']}MB")
+        # Neue Registry-Version: Training schreibt ins Staging, Inferenz sieht sie erst nach der Promotion
+        version, paths = model_registry.create(conn, trigger, horizons)
+        finished = []
+
+        def _horizon_done(hz, res):
+            finished.append(hz)
+            detail = f"hz={hz} mode={res.get('fit_mode')} mae={res.get('mae')}" if res.get('status') == 'ok' else f"hz={hz} error={res.get('error')}"
+            _training_status_update(stage=f'training_horizon_{hz}', progress=0.5 + 0.4 * (len(finished) / horizon_count), event='horizon_trained', detail=detail)
+
+        # Horizonte als eigene Prozesse (parallel, Kerne je Horizont konfigurierbar, siehe training_orchestrator.py)
+        prev_paths = _active_model_paths()
+        train_mode = _train_mode(reasons)
+        # Latenz-Budget/-Messung auf die Batchgröße von generate_predictions (ein predict() über alle Ticker)
+        results, timing = run_horizons(horizons, paths, per_model_time, on_done=_horizon_done,
+                                       mode=train_mode, prev_paths=prev_paths, infer_batch_size=len(included))
+        failed = {hz: res.get('error') for hz, res in results.items() if res.get('status') != 'ok'}
+        if failed:
+            raise RuntimeError(f"horizon training failed: {failed}")
+        for hz, res in results.items():
+            metrics[hz] = {k: res.get(k) for k in ('mae', 'mape', 'r2', 'rows', 'fit_mode', 'inference', 'distill')}
+            feature_schemas[hz] = res.get('features') or []
+            # Schema-Registry der Modellversion: Fingerprint, Zustand (Vokabular, Mediane), Feature-Liste + dtypes
+            FEATURES.save(paths[hz], feature_state, model_schema(feature_schemas[hz], df_enc))
+        timing['dataset'] = dataset
+        logging.info(f"Horizon training {timing['mode']}: wall={timing['wall_seconds']}s speedup=x{timing['speedup']} cpus={timing['cpus']}")
+        # Version einfrieren (rename aus dem Staging) und per Pointer-SET aktivieren, danach alte Versionen aufräumen
+        model_paths = model_registry.commit(conn, version, metrics, FEATURES.fingerprint, timing, snapshot.get('id'))
+        model_registry.promote(conn, version, model_paths)
+        gc = model_registry.gc(conn)
         # Set flags
         _redis_json_set('model_trained', True)
         _redis_json_set('model_path', model_paths.get('60'))
         _redis_json_set('model_paths_multi', model_paths)
-        status = _redis_json_get('retrain_status', {}) or {}
-        status.update({'last_retrain': datetime.utcnow().isoformat(), 'trigger': trigger, 'pending': False})
-        _redis_json_set('retrain_status', status)
+        _retrain_status_update(last_retrain=datetime.utcnow().isoformat(), trigger=trigger, last_reasons=reasons)
         # Metrik-Historie
         history = _redis_json_get('model_metrics_history', []) or []
         history.append({'time': datetime.utcnow().isoformat(), 'trigger': trigger, 'metrics': metrics})
@@ -2013,17 +2241,17 @@ def train_model(trigger: str = 'manual'):
             'degraded_mode': degraded_mode,
             'status': 'success',
             'started': started,
-            'metrics': metrics
+            'metrics': metrics,
+            'feature_fingerprint': FEATURES.fingerprint,
+            'training': timing,
+            'triggers': reasons,
+            'model_version': version,
+            'registry_gc': gc,
+            'snapshot': snapshot
         })
-        logging.info(f"Multi-horizon models trained metrics={metrics}")
+        logging.info(f"Multi-horizon models trained version={version} metrics={metrics}")
         # Persistiere Feature-Schema je Horizon für spätere Inferenz-Diagnose
         try:
-            feature_schemas = {}
-            for hz, predictor in predictors.items():
-                try:
-                    feature_schemas[hz] = list(predictor.feature_metadata.get_features())
-                except Exception:
-                    feature_schemas[hz] = []
             _redis_json_set('model_features_multi', feature_schemas)
         except Exception as e:
             logging.warning(f"Konnte model_features_multi nicht speichern: {e}")
@@ -2031,6 +2259,8 @@ def train_model(trigger: str = 'manual'):
         return f"Trained multi-horizon models: {metrics}"
     except Exception as e:
         logging.error(f"Multi-horizon training failed: {e}")
+        if version:
+            model_registry.fail(conn, version, e)
         _redis_json_set('last_training_stats', {
             'time': datetime.utcnow().isoformat(),
             'trigger': trigger,
@@ -2043,50 +2273,82 @@ def train_model(trigger: str = 'manual'):
             'degraded_mode': degraded_mode,
             'status': 'failed',
             'error': str(e),
-            'started': started
+            'started': started,
+            'model_version': version,
+            'snapshot': snapshot
         })
         _training_status_update(active=False, stage='failed', progress=1.0, event='failed', detail=str(e)[:180])
         return f"Training failed: {e}"
 
-@app.task
-def generate_predictions():
-    """Erstellt Multi-Horizon Vorhersagen (15/30/60) und speichert strukturierte Ergebnisse.
+def _active_model_paths():
+    """{hz: Pfad} der aktiven Registry-Version; ohne Registry-Pointer (ältere Installationen) model_paths_multi."""
+    active = model_registry.active()
+    if active:
+        return active.get('paths') or {}
+    return _redis_json_get('model_paths_multi', {}) or {}
 
-    Neues Schema predictions_current:
-    {
-      "AAPL": {
-        "current_price": 234.10,
-        "timestamp": "...",
-        "horizons": {
-          "15": {"predicted_price": 234.50, "change_pct": 0.0017, "eta": "..."},
-          "30": {...},
-          "60": {...}
-        }
-      },
-      ...
-    }
+# Geladene Predictors je Prozess, neu geladen sobald der Registry-Pointer auf eine andere Version zeigt
+_predictor_cache = {'version': None, 'variant': None, 'predictors': {}, 'artifacts': {}}
 
-    predictions_pending Liste Einträge:
-    {ticker, horizon, predicted, timestamp, eta}
-    (eta = Zielzeitpunkt wann Abgleich stattfinden soll)
+def _load_multi_predictors(log_prefix='generate_predictions'):
+    """Lädt Modelle der aktiven Registry-Version + deren Feature-Pipeline Artefakte -> (predictors, artifacts).
+
+    Versionen sind unveränderlich: gleiche Version -> Cache, neue Version -> Hot-Swap beim nächsten Aufruf.
+    PREDICT_MODEL=distilled lädt je Horizont den destillierten LightGBM ({Modell}/distilled, TRAIN_DISTILL=1),
+    ohne Schüler den Lehrer; das Feature-Artefakt kommt immer vom Lehrer (gleiche Features).
     """
-    import pandas as pd
-    import numpy as np
-    cur = conn.cursor()
-    tickers = get_dynamic_tickers()
-    model_paths = _redis_json_get('model_paths_multi', {}) or {}
+    variant = os.getenv('PREDICT_MODEL', 'teacher')
+    active = model_registry.active()
+    version = (active or {}).get('version')
+    if version and version == _predictor_cache['version'] and variant == _predictor_cache['variant']:
+        return _predictor_cache['predictors'], _predictor_cache['artifacts']
+    model_paths = (active or {}).get('paths') or _redis_json_get('model_paths_multi', {}) or {}
     predictors = {}
+    artifacts = {}
     for hz, path in model_paths.items():
         try:
             if os.path.isdir(path):
-                predictors[hz] = TabularPredictor.load(path)
+                student = os.path.join(path, DISTILLED_DIR)
+                if variant == 'distilled' and not os.path.isdir(student):
+                    logging.warning(f"{log_prefix}: kein destilliertes Modell für {hz}, nutze Ensemble")
+                use_student = variant == 'distilled' and os.path.isdir(student)
+                predictors[hz] = TabularPredictor.load(student if use_student else path)
+                artifacts[hz] = load_artifact(path)
         except Exception as e:
-            logging.error(f"Could not load predictor horizon {hz}: {e}")
-    if not predictors:
-        logging.warning("generate_predictions: keine Multi-Horizon Modelle geladen")
-        return None
-    now = datetime.utcnow()
-    # Grok Feature Maps (einmalig pro Run)
+            logging.error(f"{log_prefix}: load predictor {hz} failed: {e}")
+    if version and len(predictors) == len(model_paths):
+        _predictor_cache.update({'version': version, 'variant': variant, 'predictors': predictors,
+                                 'artifacts': artifacts})
+        logging.info(f"{log_prefix}: model version {version} ({variant}) loaded")
+    return predictors, artifacts
+
+def _feature_state(artifact):
+    """Pipeline-Zustand eines Modells; ältere Modelle ohne Artefakt -> feature_imputation + BASE_TICKERS."""
+    if artifact and artifact.get('state'):
+        return artifact['state']
+    imputation = _redis_json_get('feature_imputation', {}) or {}
+    return {
+        'medians': {
+            'grok_sentiment': imputation.get('grok_sentiment_median', 0.0),
+            'grok_expected_gain': imputation.get('grok_expected_gain_median', 0.0)
+        },
+        'vocab': {'ticker': sorted(BASE_TICKERS)}
+    }
+
+def _feature_pipeline(artifact):
+    """Pipeline passend zum Modell: aktuelle bei gleichem Fingerprint, sonst Ticker-Encoding aus der gespeicherten
+    Spezifikation (ältere Modelle ohne Artefakt wurden mit One-Hot trainiert)."""
+    if artifact and artifact.get('fingerprint') == FEATURES.fingerprint:
+        return FEATURES
+    ops = {step.get('op') for step in ((artifact or {}).get('spec') or {}).get('encode', [])}
+    encoding = 'category' if 'category' in ops else 'onehot'
+    return FeaturePipeline(encode_steps=encode_steps(encoding, 'target_stats' in ops))
+
+def _latest_grok_features(cur):
+    """Letzte Grok Werte (7 Tage) je Ticker -> (sentiment_map, expected_gain_map).
+
+    Sentiment aus grok_deepersearch, Fallback grok_topstocks; expected_gain aus grok_topstocks.
+    """
     grok_sent_map = {}
     grok_exp_gain_map = {}
     try:
@@ -2111,91 +2373,126 @@ def generate_predictions():
                 grok_exp_gain_map[t] = eg
     except Exception as e:
         logging.error(f"Grok feature maps build failed: {e}")
+    return grok_sent_map, grok_exp_gain_map
+
+def _inference_rows(cur, tickers, min_rows=20):
+    """Letzte Feature-Zeile je Ticker aus dem Online-State (Grok aktuell + Markt-/Sektor-Kontext + YFinance wie im Training).
+
+    Rückgabe: (DataFrame eine Zeile je Ticker, bars_per_ticker dict)
+    """
+    try:
+        online_features.min_rows = min_rows
+        sync = online_features.sync(cur, tickers)
+        logging.debug(f"online features sync {sync}")
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Online feature sync failed: {e}")
+    last, counts = online_features.rows(tickers)
+    if last.empty:
+        return last, counts
+    # Grok Stand "jetzt" (Training nutzt den Stand zum Candle-Zeitpunkt, der für die letzte Candle dem aktuellen entspricht)
+    grok_sent_map, grok_exp_gain_map = _latest_grok_features(cur)
+    last['grok_sentiment'] = last['ticker'].map(grok_sent_map)
+    last['grok_expected_gain'] = last['ticker'].map(grok_exp_gain_map)
+    payloads = load_yfinance_payloads(r, list(last['ticker']))
+    last = _add_cross_section_features(last, payloads)
+    last = _add_yfinance_enhanced_features(last, list(last['ticker']), payloads)
+    return last, counts
+
+def _align_features(X, expected_cols):
+    """Spalten auf das Schema des Predictors bringen -> (X, missing, extra)."""
+    missing = [c for c in expected_cols if c not in X.columns]
+    extra = [c for c in X.columns if c not in expected_cols]
+    return X.reindex(columns=expected_cols, fill_value=0), missing, extra
+
+def _fingerprint_status(artifact):
+    if not artifact:
+        return 'missing'
+    return 'match' if artifact.get('fingerprint') == FEATURES.fingerprint else 'mismatch'
+
+@app.task
+def generate_predictions():
+    """Erstellt Multi-Horizon Vorhersagen (15/30/60) und speichert strukturierte Ergebnisse.
+
+    Neues Schema predictions_current:
+    {
+      "AAPL": {
+        "current_price": 234.10,
+        "timestamp": "...",
+        "horizons": {
+          "15": {"predicted_price": 234.50, "change_pct": 0.0017, "eta": "..."},
+          "30": {...},
+          "60": {...}
+        }
+      },
+      ...
+    }
+
+    predictions_pending Liste Einträge:
+    {ticker, horizon, predicted, timestamp, eta}
+    (eta = Zielzeitpunkt wann Abgleich stattfinden soll)
+
+    Features: Online-State je Ticker (online_features.py, O(1) je neuer Bar), ein predict() je Horizon.
+    """
+    cur = conn.cursor()
+    tickers = get_dynamic_tickers()
+    predictors, artifacts = _load_multi_predictors('generate_predictions')
+    if not predictors:
+        logging.warning("generate_predictions: keine Multi-Horizon Modelle geladen")
+        return None
+    now = datetime.utcnow()
     preds_struct = {}
     pending = _redis_json_get('predictions_pending', []) or []
-    # Lade Imputations-Statistiken (Median Werte) aus Training
-    imputation = _redis_json_get('feature_imputation', {}) or {}
-    median_sent = imputation.get('grok_sentiment_median', 0.0)
-    median_gain = imputation.get('grok_expected_gain_median', 0.0)
-    for t in tickers:
-        cur.execute("""
-            SELECT time, close, open, high, low, volume FROM market_data
-            WHERE ticker=%s ORDER BY time DESC LIMIT 40
-        """, (t,))
-        rows = cur.fetchall()
-        if len(rows) < 20:
-            continue
-        rows = list(reversed(rows))
-        df = pd.DataFrame(rows, columns=['time','close','open','high','low','volume'])
-        df['prev_close'] = df['close'].shift(1)
-        df['prev_close_5'] = df['close'].shift(5)
-        df['prev_close_15'] = df['close'].shift(15)
-        df['price_change'] = df['close'] - df['prev_close']
-        df['price_change_5'] = df['close'] - df['prev_close_5']
-        df['price_change_15'] = df['close'] - df['prev_close_15']
-        df['volatility'] = (df['high'] - df['low']) / df['close']
-        df['hour'] = pd.to_datetime(df['time']).dt.hour
-        df['day_of_week'] = pd.to_datetime(df['time']).dt.dayofweek
-        # Grok Features für diesen Ticker (können None sein) + Missing Flags + Imputation
-        raw_sent = grok_sent_map.get(t)
-        raw_gain = grok_exp_gain_map.get(t)
-        df['grok_sentiment'] = raw_sent if raw_sent is not None else median_sent
-        df['grok_sentiment_missing'] = 0 if raw_sent is not None else 1
-        df['grok_expected_gain'] = raw_gain if raw_gain is not None else median_gain
-        df['grok_expected_gain_missing'] = 0 if raw_gain is not None else 1
-        # One-hot ticker: gleiche Struktur wie Training (Training nutzte get_dummies auf Ticker) -> hier nur ein Flag pro möglichem Basisticker
-        # Hinweis: Falls dynamische neue Ticker außerhalb BASE_TICKERS trainiert wurden, wäre Persistenz der Dummy-Spalten nötig.
-        # Vereinfachung: Wir setzen nur bekannte Basis-Ticker-Spalten; fehlende Spalten ignoriert AutoGluon überwiegend nicht – daher prüfen wir existierende Spalten im Modell.
-        dynamic_all = set(BASE_TICKERS)
-        for base in dynamic_all:
-            df[f'ticker_{base}'] = 1 if t == base else 0
-        # Letzte Zeile für Features
-        last_row = df.iloc[-1:].drop(columns=['time'])
-        # Prune Columns nicht in Predictor erwartet (robust gegen evtl. zusätzliche Spalten)
-        # (AutoGluon kann meist ignorieren, aber wir reduzieren Risiko)
-        horizons_out = {}
-        current_price = float(df['close'].iloc[-1])
-        for hz, predictor in predictors.items():
-            try:
+    last, _ = _inference_rows(cur, tickers)
+    if last.empty:
+        _redis_json_set('predictions_current', preds_struct)
+        return preds_struct
+    row_tickers = list(last['ticker'])
+    current_prices = last['close'].astype(float).tolist()
+    horizons_out = {t: {} for t in row_tickers}
+    for hz, predictor in predictors.items():
+        artifact = artifacts.get(hz)
+        fp_status = _fingerprint_status(artifact)
+        if fp_status == 'mismatch':
+            logging.warning(f"generate_predictions hz={hz}: Feature-Fingerprint {artifact.get('fingerprint')} != {FEATURES.fingerprint} (Modell neu trainieren)")
+        try:
+            schema = usable_schema(artifact, FEATURES)
+            if schema:
+                # Vorab ausgerichtete Matrix direkt aus der Schema-Registry des Modells
+                X = FEATURES.encode(last, artifact['state'], schema)
+            else:
+                X = _feature_pipeline(artifact).encode(last, _feature_state(artifact))
                 expected_cols = list(predictor.feature_metadata.get_features())
-                use_row = last_row.copy()
-                drop_cols = [c for c in use_row.columns if c not in expected_cols]
-                if drop_cols:
-                    logging.debug(f"Prediction {t} hz={hz}: dropping cols {drop_cols}")
-                    use_row = use_row.drop(columns=drop_cols)
-                missing_cols = []
-                for c in expected_cols:
-                    if c not in use_row.columns:
-                        use_row[c] = 0
-                        missing_cols.append(c)
-                if missing_cols:
-                    logging.debug(f"Prediction {t} hz={hz}: added missing cols {missing_cols}")
-                # Reorder strictly
-                use_row = use_row[expected_cols]
-                pred_series = predictor.predict(use_row)
-                pred_val = float(getattr(pred_series, 'iloc', pred_series)[0])
-                horizon_minutes = int(hz)
-                eta = (now + timedelta(minutes=horizon_minutes)).isoformat()
-                change_pct = (pred_val - current_price) / current_price if current_price else None
-                horizons_out[hz] = {
-                    'predicted_price': pred_val,
-                    'change_pct': change_pct,
-                    'eta': eta
-                }
-                pending.append({
-                    'ticker': t,
-                    'horizon': hz,
-                    'predicted': pred_val,
-                    'timestamp': now.isoformat(),
-                    'eta': eta
-                })
-            except Exception as e:
-                logging.exception(f"Prediction failed {t} horizon {hz} features={list(last_row.columns)} expected={expected_cols if 'expected_cols' in locals() else 'n/a'} error")
-        if horizons_out:
+                X, missing_cols, drop_cols = _align_features(X, expected_cols)
+                if missing_cols or drop_cols:
+                    logging.debug(f"Prediction hz={hz}: added missing cols {missing_cols} dropped {drop_cols}")
+            pred_vals = np.asarray(predictor.predict(X), dtype=float)
+        except Exception:
+            logging.exception(f"Prediction failed horizon {hz} tickers={len(row_tickers)}")
+            continue
+        horizon_minutes = int(hz)
+        eta = (now + timedelta(minutes=horizon_minutes)).isoformat()
+        for t, current_price, pred_val in zip(row_tickers, current_prices, pred_vals):
+            pred_val = float(pred_val)
+            change_pct = (pred_val - current_price) / current_price if current_price else None
+            horizons_out[t][hz] = {
+                'predicted_price': pred_val,
+                'change_pct': change_pct,
+                'eta': eta
+            }
+            pending.append({
+                'ticker': t,
+                'horizon': hz,
+                'predicted': pred_val,
+                'timestamp': now.isoformat(),
+                'eta': eta
+            })
+    for t, current_price in zip(row_tickers, current_prices):
+        if horizons_out[t]:
             preds_struct[t] = {
                 'current_price': current_price,
                 'timestamp': now.isoformat(),
-                'horizons': horizons_out
+                'horizons': horizons_out[t]
             }
     _redis_json_set('predictions_current', preds_struct)
     _redis_json_set('predictions_pending', pending)
@@ -2206,102 +2503,80 @@ def diagnose_predictions(limit_tickers: int = 10):
     """Diagnostiziert warum Vorhersagen evtl. leer bleiben.
 
     Schritte:
-    - Prüft geladene Modelle & erwartete Feature-Schemata (Redis Key model_features_multi)
-    - Zählt verfügbare Candles (letzte 60) pro Ticker und prüft Minimalanforderung (>=20)
-    - Baut Feature-Zeile identisch zu generate_predictions und vergleicht erwartete vs tatsächliche Spalten
+    - Prüft geladene Modelle, Feature-Fingerprint (feature_pipeline.json) & erwartete Feature-Schemata
+    - Zählt verfügbare Bars (Online Feature-State) pro Ticker und prüft Minimalanforderung (>=20)
+    - Baut Feature-Zeile mit derselben Pipeline wie generate_predictions (inkl. Grok/YFinance) und vergleicht Spalten
     - Versucht Einzel-Prediction je Horizon und fängt Exception vollständig ab
 
     Rückgabe (und Redis Key prediction_diagnostics):
     {
       "time": ISO,
+      "fingerprint": "...",
+      "fingerprints": {"15": "match"|"mismatch"|"missing", ...},
+      "schemas": {"15": "registry"|"legacy", ...},
       "tickers": [
          {
            "ticker": "AAPL",
            "rows": 40,
            "skipped_reason": null | "insufficient_rows",
            "features_built": [...],
-           "missing_in_row": [...],
-           "extra_in_row": [...],
            "per_horizon": {
-               "15": {"status": "ok"|"error", "error": "..."},
+               "15": {"status": "ok"|"error", "error": "...", "missing_in_row": [...], "extra_dropped": [...], "in_vocab": true},
                ...
            }
          }, ... (limitiert)
       ]
     }
     """
-    import pandas as pd
     cur = conn.cursor()
-    tickers = get_dynamic_tickers()
-    model_paths = _redis_json_get('model_paths_multi', {}) or {}
-    predictors = {}
-    for hz, path in model_paths.items():
+    universe = get_dynamic_tickers()
+    tickers = universe[:limit_tickers]
+    predictors, artifacts = _load_multi_predictors('Diagnose')
+    feature_schemas = _redis_json_get('model_features_multi', {}) or {}
+    # Zeilen für das ganze Universum wie in generate_predictions (Markt-/Sektor-Aggregate), Report nur für tickers
+    last, counts = _inference_rows(cur, universe)
+    by_ticker = {t: i for i, t in enumerate(last['ticker'])} if not last.empty else {}
+    encoded = {}
+    for hz in predictors:
         try:
-            if os.path.isdir(path):
-                predictors[hz] = TabularPredictor.load(path)
+            artifact = artifacts.get(hz)
+            encoded[hz] = _feature_pipeline(artifact).encode(last, _feature_state(artifact)) if by_ticker else None
         except Exception as e:
-            logging.error(f"Diagnose: load predictor {hz} failed: {e}")
-    feature_schemas = _redis_json_get('model_features_multi', {}) or {}
-    imputation = _redis_json_get('feature_imputation', {}) or {}
-    median_sent = imputation.get('grok_sentiment_median', 0.0)
-    median_gain = imputation.get('grok_expected_gain_median', 0.0)
+            encoded[hz] = e
     results = []
-    for t in tickers[:limit_tickers]:
-        cur.execute("""
-            SELECT time, close, open, high, low, volume FROM market_data
-            WHERE ticker=%s ORDER BY time DESC LIMIT 60
-        """, (t,))
-        rows = cur.fetchall()
-        entry = { 'ticker': t, 'rows': len(rows), 'skipped_reason': None }
-        if len(rows) < 20:
+    for t in tickers:
+        entry = { 'ticker': t, 'rows': int(counts.get(t, 0)), 'skipped_reason': None }
+        if t not in by_ticker:
             entry['skipped_reason'] = 'insufficient_rows'
             results.append(entry)
             continue
-        rows = list(reversed(rows))
-        df = pd.DataFrame(rows, columns=['time','close','open','high','low','volume'])
-        df['prev_close'] = df['close'].shift(1)
-        df['prev_close_5'] = df['close'].shift(5)
-        df['prev_close_15'] = df['close'].shift(15)
-        df['price_change'] = df['close'] - df['prev_close']
-        df['price_change_5'] = df['close'] - df['prev_close_5']
-        df['price_change_15'] = df['close'] - df['prev_close_15']
-        df['volatility'] = (df['high'] - df['low']) / df['close']
-        df['hour'] = pd.to_datetime(df['time']).dt.hour
-        df['day_of_week'] = pd.to_datetime(df['time']).dt.dayofweek
-        raw_sent = None; raw_gain = None
-        df['grok_sentiment'] = raw_sent if raw_sent is not None else median_sent
-        df['grok_sentiment_missing'] = 0 if raw_sent is not None else 1
-        df['grok_expected_gain'] = raw_gain if raw_gain is not None else median_gain
-        df['grok_expected_gain_missing'] = 0 if raw_gain is not None else 1
-        for base in BASE_TICKERS:
-            df[f'ticker_{base}'] = 1 if t == base else 0
-        last_row = df.iloc[-1:].drop(columns=['time'])
-        entry['features_built'] = list(last_row.columns)
+        idx = by_ticker[t]
         per_hz = {}
         for hz, predictor in predictors.items():
+            X = encoded.get(hz)
+            if isinstance(X, Exception):
+                per_hz[hz] = {'status': 'error', 'error': str(X)[:180]}
+                continue
+            entry.setdefault('features_built', list(X.columns))
             expected = feature_schemas.get(hz) or list(predictor.feature_metadata.get_features())
-            use_row = last_row.copy()
-            drop_cols = [c for c in use_row.columns if c not in expected]
-            use_row = use_row.drop(columns=drop_cols) if drop_cols else use_row
-            missing = []
-            for c in expected:
-                if c not in use_row.columns:
-                    use_row[c] = 0
-                    missing.append(c)
-            # reorder
-            try:
-                use_row = use_row[expected]
-            except Exception:
-                pass
+            use_row, missing, drop_cols = _align_features(X.iloc[idx:idx + 1], expected)
             try:
                 pred_series = predictor.predict(use_row)
                 _ = float(getattr(pred_series, 'iloc', pred_series)[0])
                 per_hz[hz] = {'status': 'ok', 'missing_in_row': missing, 'extra_dropped': drop_cols}
             except Exception as e:
                 per_hz[hz] = {'status': 'error', 'error': str(e)[:180], 'missing_in_row': missing, 'extra_dropped': drop_cols}
+            # Ticker ohne Eintrag im Vokabular des Modells -> fehlende Kategorie bzw. alle ticker_* Spalten 0
+            per_hz[hz]['in_vocab'] = t in _feature_state(artifacts.get(hz)).get('vocab', {}).get('ticker', [])
         entry['per_horizon'] = per_hz
         results.append(entry)
-    diag = { 'time': datetime.utcnow().isoformat(), 'tickers': results }
+    diag = {
+        'time': datetime.utcnow().isoformat(),
+        'fingerprint': FEATURES.fingerprint,
+        'fingerprints': {hz: _fingerprint_status(a) for hz, a in artifacts.items()},
+        'schemas': {hz: 'registry' if usable_schema(a, FEATURES) else 'legacy' for hz, a in artifacts.items()},
+        'tickers': results
+    }
     _redis_json_set('prediction_diagnostics', diag)
     logging.info(f"diagnose_predictions summary tickers={len(results)}")
     return diag
@@ -2343,10 +2618,7 @@ def retrain_check():
             still_pending.append(item)
     _redis_json_set('predictions_pending', still_pending)
     if triggered:
-        status = _redis_json_get('retrain_status', {}) or {}
-        status.update({'pending': True, 'trigger': 'deviation'})
-        _redis_json_set('retrain_status', status)
-        train_model.delay('deviation')
+        _request_retrain('deviation')
     return {'remaining': len(still_pending), 'retrain_triggered': triggered}
 
 @app.task
@@ -2508,7 +2780,7 @@ def trade_bot():
 @app.task
 def daily_train():
     fetch_data.delay()
-    train_model.delay('daily')
+    _request_retrain('daily')
 
 # Schedule daily at 09:00 UTC
 app.conf.beat_schedule = {
@@ -2536,6 +2808,11 @@ app.conf.beat_schedule = {
         'task': 'worker.retrain_check',
         'schedule': crontab(minute='*/30'),
     },
+    # Gesammelte Retrain-Anfragen (Debounce / während Trading verschoben / Training lief) nachholen
+    'retrain-dispatch': {
+        'task': 'worker.dispatch_retrain',
+        'schedule': crontab(minute='*/5'),
+    },
     'tradebot-auto': {
         'task': 'worker.trade_bot',
         'schedule': crontab(minute='*/10'),
@@ -2552,12 +2829,22 @@ app.conf.beat_schedule = {
         'task': 'worker.fetch_grok_topstocks',
         'schedule': crontab(hour=8, minute=20),  # täglich 08:20 UTC
     },
-    # Neuer automatischer Backfill Scanner alle 30 Minuten mit Offset (Minuten 7 und 37)
+    # Automatischer Gap-Scanner (Kalender-Raster statt Zeilenzählung) alle 30 Minuten mit Offset (Minuten 7 und 37)
     'auto-backfill-scan': {
-        'task': 'worker.scan_and_backfill_low_history',
+        'task': 'worker.scan_and_backfill_gaps',
         # Offset damit er nicht zeitgleich mit retrain-check (*/30 ab Minute :00 und :30) läuft
         'schedule': crontab(minute='7,37'),
     },
+    # Backfill-Queue Consumer (Sicherheitsnetz falls ein Trigger verloren geht)
+    'backfill-queue-drain': {
+        'task': 'worker.drain_backfill_queue',
+        'schedule': crontab(minute='*/5'),
+    },
+    # Feature Store inkrementell + Retention (generate_predictions/train_model ziehen zusätzlich selbst nach)
+    'feature-store-update': {
+        'task': 'worker.update_feature_store',
+        'schedule': crontab(minute='10,40'),
+    },
     # Prediction Quality Aggregation alle 30 Minuten (gleichmäßiger Rhythmus)
     'prediction-quality-metrics': {
         'task': 'worker.compute_prediction_quality_metrics',
@@ -3343,14 +3630,7 @@ def fetch_grok_topstocks():
                 pass
         if run_hook:
             r.set(hook_key, datetime.utcnow().isoformat())
-            status = _redis_json_get('retrain_status', {}) or {}
-            if not status.get('pending'):
-                status.update({'pending': True, 'trigger': 'grok_update'})
-                _redis_json_set('retrain_status', status)
-                try:
-                    train_model.delay('grok_update')
-                except Exception as e:
-                    logging.error(f"Retrain hook (topstocks) failed: {e}")
+            _request_retrain('grok_update')
     return items
 
 # ================= FRONTEND-BACKEND REDIS COMMUNICATION =================